@@ -0,0 +1,194 @@
+# Chave de acesso da NF-e/NFC-e lida direto da imagem (código de barras / QR)
+# Todo DANFE traz a chave de 44 dígitos num CODE-128 e o DANFE NFC-e num QR
+# code. Ler o código (OpenCV) é mais rápido e confiável que procurar a chave
+# no texto do OCR. O QR usa o detector do OpenCV; o CODE-128 é localizado por
+# morfologia (gradiente horizontal) e decodificado pelas larguras das barras.
+
+import re
+
+ACCESS_KEY_LENGTH = 44
+ACCESS_KEY_MODELS = ('55', '65')  # NF-e e NFC-e
+
+# Padrões CODE-128 (larguras barra/espaço em módulos) -> valor do símbolo
+_CODE128_PATTERNS = (
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232',
+)
+_CODE128_VALUES = {pattern: value for value, pattern in enumerate(_CODE128_PATTERNS)}
+_CODE128_STOP = '2331112'
+_START_A, _START_B, _START_C = 103, 104, 105
+_CODE_A, _CODE_B, _CODE_C = 101, 100, 99
+# Largura mínima (px) da região do CODE-128 da chave (~280 módulos) para decodificar
+MIN_BARCODE_WIDTH = 1200
+
+
+def check_digit(digits):
+    """Dígito verificador (módulo 11, pesos 2 a 9 da direita para a esquerda) dos 43 primeiros dígitos"""
+    total = 0
+    weight = 2
+    for digit in reversed(digits):
+        total += int(digit) * weight
+        weight = 2 if weight == 9 else weight + 1
+    remainder = total % 11
+    return 0 if remainder < 2 else 11 - remainder
+
+
+def is_valid_access_key(key):
+    """Chave com 44 dígitos, UF/mês/modelo plausíveis e dígito verificador correto"""
+    if not key or len(key) != ACCESS_KEY_LENGTH or not key.isdigit():
+        return False
+    if not 11 <= int(key[0:2]) <= 53 or not 1 <= int(key[4:6]) <= 12:
+        return False
+    if key[20:22] not in ACCESS_KEY_MODELS:
+        return False
+    return check_digit(key[:43]) == int(key[43])
+
+
+def access_keys_in(payload):
+    """Chaves válidas contidas no conteúdo de um código (CODE-128 puro ou URL do QR da NFC-e)"""
+    candidates = re.findall(r'(?<!\d)\d{44}(?!\d)', payload or '')
+    return [key for key in candidates if is_valid_access_key(key)]
+
+
+def _runs(row):
+    """Larguras alternadas barra/espaço de uma linha binária (True = barra), a partir da 1ª barra"""
+    import numpy as np
+
+    changes = np.flatnonzero(np.diff(row.astype(np.int8))) + 1
+    bounds = np.concatenate(([0], changes, [len(row)]))
+    widths = np.diff(bounds)
+    if row[0] == 0:
+        widths = widths[1:]
+    if len(widths) and (len(widths) % 2 == 0):
+        widths = widths[:-1]  # Termina em barra (descarta a margem branca final)
+    return widths.tolist()
+
+
+def _symbol(widths):
+    """Símbolo CODE-128 a partir de 6 larguras (normalizadas para 11 módulos)"""
+    module = sum(widths) / 11
+    pattern = ''.join(str(min(4, max(1, round(width / module)))) for width in widths)
+    return _CODE128_VALUES.get(pattern)
+
+
+def decode_code128(widths):
+    """Decodificar uma sequência de larguras CODE-128 (com checksum); None se inválida"""
+    for start in range(0, max(0, len(widths) - 18), 2):
+        values = []
+        position = start
+        while position + 6 <= len(widths):
+            if position + 7 <= len(widths):
+                chunk = widths[position:position + 7]
+                module = sum(chunk) / 13
+                if ''.join(str(min(4, max(1, round(w / module)))) for w in chunk) == _CODE128_STOP:
+                    break
+            value = _symbol(widths[position:position + 6])
+            if value is None:
+                values = None
+                break
+            values.append(value)
+            position += 6
+        else:
+            values = None
+
+        if not values or len(values) < 3 or values[0] not in (_START_A, _START_B, _START_C):
+            continue
+        *data, checksum = values
+        if (data[0] + sum(i * value for i, value in enumerate(data[1:], 1))) % 103 != checksum:
+            continue
+
+        text = []
+        code_set = data[0]
+        for value in data[1:]:
+            if code_set == _START_C and value < 100:
+                text.append(f'{value:02d}')
+            elif value == _CODE_C:
+                code_set = _START_C
+            elif value == _CODE_B and code_set != _START_B:
+                code_set = _START_B
+            elif value == _CODE_A and code_set != _START_A:
+                code_set = _START_A
+            elif code_set == _START_B and value < 96:
+                text.append(chr(value + 32))
+            elif code_set == _START_A and value < 96:
+                text.append(chr(value + 32) if value < 64 else chr(value - 64))
+        return ''.join(text)
+    return None
+
+
+def find_barcode_regions(gray, max_regions=8):
+    """Regiões candidatas a código de barras linear: gradiente horizontal forte e vertical fraco"""
+    import cv2
+    import numpy as np
+
+    grad_x = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=-1)
+    grad_y = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=-1)
+    gradient = cv2.convertScaleAbs(cv2.subtract(np.abs(grad_x), np.abs(grad_y)))
+    gradient = cv2.blur(gradient, (5, 5))
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (41, 7)))
+    mask = cv2.dilate(cv2.erode(mask, None, iterations=2), None, iterations=2)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = [cv2.boundingRect(contour) for contour in contours]
+    boxes = [box for box in boxes if box[2] >= 3 * box[3] and box[2] >= 100]
+    return sorted(boxes, key=lambda box: box[2] * box[3], reverse=True)[:max_regions]
+
+
+def read_barcode(gray, box, scanlines=7):
+    """Ler o CODE-128 da região em algumas linhas horizontais (e de trás para frente)"""
+    import cv2
+    import numpy as np
+
+    height, width = gray.shape[:2]
+    x, y, w, h = box
+    margin = max(10, w // 20)
+    region = gray[y:y + h, max(0, x - margin):min(width, x + w + margin)]
+    if region.shape[1] < MIN_BARCODE_WIDTH:
+        # Menos de ~2 px por módulo: ampliar antes de binarizar para separar as barras finas
+        scale = MIN_BARCODE_WIDTH / region.shape[1]
+        region = cv2.resize(region, None, fx=scale, fy=1, interpolation=cv2.INTER_CUBIC)
+    _, binary = cv2.threshold(region, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    for fraction in np.linspace(0.2, 0.8, scanlines):
+        row = binary[int(fraction * (h - 1))] > 0
+        for widths in (_runs(row), _runs(row[::-1])):
+            text = decode_code128(widths)
+            if text:
+                return text
+    return None
+
+
+def decode_payloads(gray):
+    """Conteúdo dos códigos da imagem, sob demanda: CODE-128 (DANFE) primeiro, depois QR (NFC-e)"""
+    import cv2
+
+    for box in find_barcode_regions(gray):
+        text = read_barcode(gray, box)
+        if text:
+            yield text
+    found, decoded, _, _ = cv2.QRCodeDetector().detectAndDecodeMulti(gray)
+    if found:
+        yield from (text for text in decoded if text)
+
+
+def read_access_key(image_bytes):
+    """Chave de acesso válida lida do código de barras/QR da imagem, ou None (roda no pool de OCR)"""
+    import numpy as np
+
+    from ocr_pipeline import normalize_image
+
+    gray = np.asarray(normalize_image(image_bytes).convert('L'))
+    for payload in decode_payloads(gray):
+        keys = access_keys_in(payload)
+        if keys:
+            return keys[0]
+    return None
@@ -2,8 +2,9 @@
 # Substitui completamente a dependência de APIs externas como Gemini AI
 # Inclui OCR avançado, reconhecimento inteligente de produtos e cálculo preciso de pontos
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 from functools import wraps
 
@@ -43,32 +44,56 @@ except ImportError:
         "allowed_origins": os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://localhost:3000").split(",")
     }
 import base64
-import io
-import numpy as np
+import binascii
 import re
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 import json
 from datetime import datetime
 import uuid
+import zipfile
 import hashlib
 import logging
-from difflib import SequenceMatcher
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from product_matcher import NAME_SIMILARITY_THRESHOLD, similarity_score
+from ocr_pipeline import (
+    CV2_AVAILABLE, OCR_HIGH_CONFIDENCE, OCR_MIN_CONFIDENCE, OCR_MIN_PRODUCT_HITS, OCR_TARGET_MEGAPIXELS, PREPROCESSING_TIERS,
+    TESSERACT_AVAILABLE,
+    ImageTooLarge, advanced_image_preprocessing, config_fingerprint, open_image, run_ocr, warm_up
+)
+from ocr_pool import OCRPoolFull, OCRTimeout, OCRWorkerLost, create_pool_from_env
+from tesseract_engine import ENGINE_TESSEROCR, probe_tesseract, selected_engine
+from jobs import JOB_DONE, JOB_FAILED, JobQueueFull, JobStore
+from result_cache import ResultCache
+from perceptual_hash import NearDuplicateIndex, dhash
+from nfe_xml import invoice_from_nfe, iter_nfe_sources
+from access_key import read_access_key
+from document_store import DocumentStore
+from pdf_input import PAGE_TEXT, PDFTooLarge, is_pdf, iter_pdf_pages
+from line_tokenizer import parse_line
+from rate_limiter import client_address, create_limiter
+from catalog import CatalogManager, SnapshotSource, catalog_source_from_env
+from header_fields import extract_header
+from metrics import MetricsRegistry
 
-# Importações condicionais para OCR
-try:
-    import cv2
-    CV2_AVAILABLE = True
+# Importações condicionais para OCR (detectadas em ocr_pipeline)
+if CV2_AVAILABLE:
     print("✅ OpenCV disponível para pré-processamento avançado")
-except ImportError:
-    CV2_AVAILABLE = False
+else:
     print("⚠️ OpenCV não disponível - usando processamento básico")
 
-try:
-    import pytesseract
-    TESSERACT_AVAILABLE = True
-    print("✅ Tesseract OCR disponível")
-except ImportError:
+# Localizar o Tesseract: sonda barata (`--version`) com resultado em cache, sem rodar OCR no boot
+TESSERACT_PROBE = probe_tesseract() if TESSERACT_AVAILABLE else None
+if TESSERACT_AVAILABLE and not TESSERACT_PROBE and selected_engine() != ENGINE_TESSEROCR:
     TESSERACT_AVAILABLE = False
+
+if TESSERACT_AVAILABLE:
+    print(f"✅ Tesseract OCR disponível ({TESSERACT_PROBE['cmd'] if TESSERACT_PROBE else selected_engine()})")
+else:
     print("⚠️ Tesseract não disponível - usando simulação")
 
 # Configurar logging
@@ -77,6 +102,9 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Tamanho máximo do corpo da requisição (verificado pelo Flask antes da leitura)
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.getenv('MAX_UPLOAD_MB', '16')) * 1024 * 1024)
+
 # Configurações de segurança para o CORS
 cors_allowed_origins = API_SECURITY.get('allowed_origins', ['http://localhost:5173', 'http://localhost:3000'])
 CORS(app, origins=cors_allowed_origins, supports_credentials=True, methods=["GET", "POST"])
@@ -96,60 +124,139 @@ def require_api_key(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# Middleware de Rate Limiting
-request_counter = {}
-def rate_limit(max_requests=20, window_seconds=60):
-    @wraps
+def is_authenticated_request():
+    """Requisição com a API key configurada (sem chave configurada, nenhuma é autenticada)"""
+    expected_key = API_SECURITY.get('api_key', '')
+    return bool(expected_key) and request.headers.get('X-Api-Key', '') == expected_key
+
+# Middleware de Rate Limiting (token bucket por cliente, compartilhado entre workers)
+# Desligado por padrão: atrás de um proxy reverso, sem RATE_LIMIT_TRUSTED_PROXIES,
+# todos os clientes chegam com o IP do proxy e dividiriam um único balde
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'false').lower() == 'true'
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', '0'))
+if RATE_LIMIT_ENABLED and RATE_LIMIT_TRUSTED_PROXIES == 0:
+    logger.warning("⚠️ Limite de requisições por IP de conexão (RATE_LIMIT_TRUSTED_PROXIES=0): "
+                   "atrás de um proxy reverso todos os clientes dividem o mesmo limite")
+_rate_limiters = {}
+
+def rate_limit(max_requests=None, window_seconds=None):
+    max_requests = max_requests or int(os.getenv('RATE_LIMIT_REQUESTS', '20'))
+    window_seconds = window_seconds or int(os.getenv('RATE_LIMIT_WINDOW', '60'))
+    
     def decorator(f):
+        if (max_requests, window_seconds) not in _rate_limiters:
+            _rate_limiters[(max_requests, window_seconds)] = create_limiter(max_requests, window_seconds)
+        limiter = _rate_limiters[(max_requests, window_seconds)]
+        # Limites diferentes usam baldes diferentes para o mesmo cliente
+        namespace = f"{max_requests}/{window_seconds}"
+        
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # IP do cliente
-            client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-            
-            # Verificar limite de requisições
-            current_time = datetime.now().timestamp()
-            if client_ip not in request_counter:
-                request_counter[client_ip] = {'count': 0, 'window_start': current_time}
+            if not RATE_LIMIT_ENABLED:
+                return f(*args, **kwargs)
             
-            # Reset contador se janela expirou
-            if current_time - request_counter[client_ip]['window_start'] > window_seconds:
-                request_counter[client_ip] = {'count': 0, 'window_start': current_time}
-                
-            # Incrementar contador
-            request_counter[client_ip]['count'] += 1
+            # IP do cliente (X-Forwarded-For só atrás de proxies confiáveis)
+            client_ip = client_address(request.remote_addr, request.headers.get('X-Forwarded-For'),
+                                       RATE_LIMIT_TRUSTED_PROXIES)
             
             # Verificar se excedeu limite
-            if request_counter[client_ip]['count'] > max_requests:
-                return jsonify({"error": "Taxa de requisições excedida"}), 429
+            allowed, retry_after = limiter.check(f"{namespace}:{client_ip}")
+            if not allowed:
+                response = jsonify({"error": "Taxa de requisições excedida"})
+                response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+                return response, 429
                 
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
-# Configurar Tesseract automaticamente
-if TESSERACT_AVAILABLE:
-    try:
-        possible_paths = [
-            r'C:\Program Files\Tesseract-OCR\tesseract.exe',
-            r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
-            r'C:\Users\Public\Tesseract-OCR\tesseract.exe',
-            'tesseract'  # Se estiver no PATH
-        ]
-        
-        for path in possible_paths:
-            try:
-                pytesseract.pytesseract.tesseract_cmd = path
-                pytesseract.image_to_string(Image.new('RGB', (100, 100), 'white'))
-                print(f"✅ Tesseract configurado em: {path}")
-                break
-            except:
-                continue
-        else:
-            print("⚠️ Tesseract não encontrado nos caminhos padrão")
-            TESSERACT_AVAILABLE = False
-    except Exception as e:
-        print(f"⚠️ Erro ao configurar Tesseract: {e}")
-        TESSERACT_AVAILABLE = False
+# Pool de processos para pré-processamento + OCR (iniciado no primeiro uso)
+OCR_POOL = create_pool_from_env(TESSERACT_PROBE['cmd'] if TESSERACT_PROBE else None)
+
+# Prontidão (/ready): com OCR_WARMUP, só depois de um OCR de aquecimento em cada worker do pool
+OCR_WARMUP = os.getenv('OCR_WARMUP', 'false').lower() == 'true'
+READINESS = {'ready': not (OCR_WARMUP and TESSERACT_AVAILABLE), 'warmup': None, 'warmupMs': None}
+
+# Jobs assíncronos de processamento (SQLite com TTL, compartilhado entre os workers do gunicorn)
+JOB_STORE = JobStore(
+    workers=OCR_POOL.workers,
+    ttl_seconds=int(os.getenv('JOB_RESULT_TTL', '900')),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', '100')),
+    db_path=os.getenv('JOB_STORE_DB', os.path.join(tempfile.gettempdir(), 'fast_jobs.sqlite3')),
+    error_response=lambda e: process_order_error(e)
+)
+
+# Cache de OCR por hash da imagem: LRU em memória + SQLite em disco
+RESULT_CACHE = ResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', '256')),
+    max_bytes=int(float(os.getenv('RESULT_CACHE_MAX_MB', '32')) * 1024 * 1024),
+    ttl_seconds=int(os.getenv('RESULT_CACHE_TTL', '86400')),
+    db_path=os.getenv('RESULT_CACHE_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_cache.sqlite3'))
+)
+
+# Métricas Prometheus (/metrics): latência por etapa e por endpoint, filas, cache e fallback do OCR.
+# No gunicorn (vários workers) os valores de cada processo são somados via SQLite em qualquer scrape
+METRICS = MetricsRegistry(db_path=os.getenv('METRICS_DB') or (
+    os.path.join(tempfile.gettempdir(), 'fast_metrics.sqlite3')
+    if os.getenv('PREFORK_SERVER', 'false').lower() == 'true' else None
+))
+STAGE_SECONDS = METRICS.histogram(
+    'fast_stage_duration_seconds', 'Duração das etapas do processamento da nota', labels=('stage',)
+)
+REQUEST_SECONDS = METRICS.histogram(
+    'fast_request_duration_seconds', 'Duração das requisições HTTP por endpoint', labels=('endpoint',)
+)
+REQUESTS_TOTAL = METRICS.counter(
+    'fast_requests_total', 'Requisições HTTP por endpoint e status', labels=('endpoint', 'status')
+)
+OCR_FALLBACKS = METRICS.counter(
+    'fast_ocr_fallback_total', 'Notas respondidas com o texto simulado em vez do OCR', labels=('reason',)
+)
+for reason in ('unavailable', 'error'):
+    OCR_FALLBACKS.inc(0, reason=reason)  # Séries exportadas desde o início, com zero
+METRICS.gauge('fast_ocr_queue_depth', 'Tarefas no pool de OCR ainda não concluídas', lambda: OCR_POOL.queue_depth)
+METRICS.gauge('fast_jobs_pending', 'Jobs assíncronos aguardando ou em execução', lambda: JOB_STORE.pending)
+METRICS.counter('fast_result_cache_hits_total', 'Acertos do cache de OCR', collect=lambda: RESULT_CACHE.hits)
+METRICS.counter('fast_result_cache_misses_total', 'Faltas do cache de OCR', collect=lambda: RESULT_CACHE.misses)
+METRICS.gauge('fast_result_cache_hit_ratio', 'Taxa de acerto do cache de OCR', shared=True, collect=lambda: cache_hit_ratio())
+
+def cache_hit_ratio():
+    """Taxa de acerto do cache de OCR somando acertos e faltas de todos os workers"""
+    hits = METRICS.total('fast_result_cache_hits_total')
+    total = hits + METRICS.total('fast_result_cache_misses_total')
+    return hits / total if total else 0.0
+
+# Tempos por etapa no corpo da resposta: sempre (RESPONSE_TIMINGS) ou com ?timings=true
+RESPONSE_TIMINGS = os.getenv('RESPONSE_TIMINGS', 'false').lower() == 'true'
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+
+# Notas quase duplicadas (hash perceptual): 'flag' roda o OCR e marca para revisão
+# quando número e valor batem com a nota parecida; 'off' desativa. O OCR nunca é
+# reaproveitado pelo dHash: notas diferentes do mesmo modelo ficam a poucos bits
+# (7 medidos, abaixo do limite), e devolveriam itens e pontos de outra nota
+NEAR_DUPLICATE_MODE = os.getenv('NEAR_DUPLICATE_MODE', 'flag').lower()
+if NEAR_DUPLICATE_MODE not in ('flag', 'off'):
+    logger.warning(f"⚠️ NEAR_DUPLICATE_MODE='{NEAR_DUPLICATE_MODE}' não suportado, usando 'flag'")
+    NEAR_DUPLICATE_MODE = 'flag'
+NEAR_DUPLICATE_INDEX = NearDuplicateIndex(
+    max_distance=int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', '12')),
+    capacity=int(os.getenv('NEAR_DUPLICATE_CAPACITY', '512'))
+)
+
+# Chave de acesso lida do código de barras/QR antes do OCR; NF-e já conhecidas
+# (XMLs enviados com a API key ou diretório NFE_XML_DIR) saem do armazenamento local sem OCR
+ACCESS_KEY_FAST_PATH = os.getenv('ACCESS_KEY_FAST_PATH', 'true').lower() == 'true'
+DOCUMENT_STORE = DocumentStore(
+    db_path=os.getenv('NFE_STORE_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nfe_documents.sqlite3')),
+    xml_dir=os.getenv('NFE_XML_DIR') or None
+)
+
+# Lotes: cada imagem do lote roda numa thread que aguarda o pool de OCR
+BATCH_MAX_IMAGES = int(os.getenv('BATCH_MAX_IMAGES', '20'))
+BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=OCR_POOL.workers, thread_name_prefix='invoice-batch')
+
+# PDFs: páginas escaneadas vão ao OCR em paralelo (threads que aguardam o pool de OCR)
+PDF_EXECUTOR = ThreadPoolExecutor(max_workers=OCR_POOL.workers, thread_name_prefix='pdf-page')
 
 # Base de conhecimento completa de produtos Fast Sistemas
 PRODUTOS_FAST_DATABASE = {
@@ -231,117 +338,202 @@ PRODUTOS_FAST_DATABASE = {
     }
 }
 
-# Padrões para limpeza de texto OCR
-OCR_CORRECTIONS = {
-    # Correções comuns de OCR
-    'O': '0',  # O maiúsculo -> zero
-    'l': '1',  # l minúsculo -> um
-    'I': '1',  # I maiúsculo -> um
-    'PLAGA': 'PLACA',
-    'GLASROG': 'GLASROC',
-    'PLAGOMIX': 'PLACOMIX',
-    'DW0O': 'DW00',
-    'GR0O': 'GR00',
-    'BC0O': 'BC00',
-    'MT0O': 'MT00',
-    'PM0O': 'PM00'
-}
+# Catálogo de produtos elegíveis: tabela produtos_elegiveis (Supabase) ou snapshot
+# local, recompilado em segundo plano quando muda; o catálogo acima é a base
+# (keywords e padrões de código) e o fallback sem rede
+CATALOG_SNAPSHOT = SnapshotSource(os.getenv(
+    'CATALOG_SNAPSHOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog_snapshot.json')
+))
+CATALOG = CatalogManager(
+    PRODUTOS_FAST_DATABASE,
+    source=catalog_source_from_env(get_supabase_config(), CATALOG_SNAPSHOT),
+    snapshot=CATALOG_SNAPSHOT,
+    refresh_seconds=int(os.getenv('CATALOG_REFRESH_SECONDS', '300')),
+    similarity_threshold=float(os.getenv('NAME_SIMILARITY_THRESHOLD', str(NAME_SIMILARITY_THRESHOLD)))
+)
 
 def clean_ocr_text(text):
     """Limpar e corrigir erros comuns de OCR"""
-    cleaned_text = text.upper()
-    
-    # Aplicar correções comuns
-    for error, correction in OCR_CORRECTIONS.items():
-        cleaned_text = cleaned_text.replace(error, correction)
+    return CATALOG.current.corrector.correct(text.upper())
+
+def record_stage(timings, stage, elapsed_ms):
+    """Somar a duração (ms) da etapa em `timings` e registrar no histograma de /metrics"""
+    STAGE_SECONDS.observe(elapsed_ms / 1000, stage=stage)
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0) + elapsed_ms, 2)
+
+@contextmanager
+def timed_stage(timings, stage):
+    """Registrar em `timings` a duração (ms) de uma etapa do processamento"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(timings, stage, (time.perf_counter() - start) * 1000)
+
+def read_image_from_request():
+    """Ler a imagem (ou PDF) da requisição: multipart, binário (octet-stream/image/*/pdf) ou JSON base64"""
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image') or next(iter(request.files.values()), None)
+        return upload.read() if upload else None
     
-    # Corrigir códigos específicos
-    cleaned_text = re.sub(r'DW0+(\d)', r'DW00\1', cleaned_text)
-    cleaned_text = re.sub(r'([A-Z]{2})0+(\d)', r'\g<1>00\2', cleaned_text)
+    if request.mimetype in ('application/octet-stream', 'application/pdf') or request.mimetype.startswith('image/'):
+        return request.get_data(cache=False) or None
     
-    return cleaned_text
+    # Contrato original: JSON com a imagem em base64
+    data = request.get_json(silent=True) or {}
+    return data.get('image')
 
-def advanced_image_preprocessing(image):
-    """Pré-processamento avançado de imagem para OCR"""
-    try:
-        if CV2_AVAILABLE:
-            # Converter PIL para OpenCV
-            cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
-            # Redimensionar se muito pequena
-            height, width = cv_image.shape[:2]
-            if height < 1000:
-                scale = 1000 / height
-                new_width = int(width * scale)
-                cv_image = cv2.resize(cv_image, (new_width, 1000))
-            
-            # Converter para escala de cinza
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            # Redução de ruído
-            denoised = cv2.fastNlMeansDenoising(gray)
-            
-            # Aumento de contraste
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(denoised)
-            
-            # Binarização adaptativa
-            binary = cv2.adaptiveThreshold(enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-            
-            # Converter de volta para PIL
-            return Image.fromarray(binary)
-        else:
-            # Processamento básico com PIL
-            if image.mode != 'L':
-                image = image.convert('L')
-            
-            # Melhorar contraste
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(2.0)
-            
-            # Filtro de nitidez
-            image = image.filter(ImageFilter.SHARPEN)
-            
-            return image
-            
-    except Exception as e:
-        logger.error(f"Erro no pré-processamento: {e}")
-        return image
+class InvalidImageData(ValueError):
+    """Campo da imagem ausente do formato esperado (string base64 ou bytes)"""
 
-def extract_text_with_ocr(image_data):
-    """Extrair texto da imagem usando OCR avançado"""
+def decode_image_data(image_data):
+    """Bytes da imagem a partir de base64 (com ou sem prefixo data:) ou bytes já binários"""
+    if isinstance(image_data, (bytes, bytearray)):
+        return image_data
+    if not isinstance(image_data, str):
+        raise InvalidImageData("Campo 'image' deve ser uma string base64")
     try:
-        # Decodificar base64
         if ',' in image_data:
-            image_data = base64.b64decode(image_data.split(',')[1])
-        else:
-            image_data = base64.b64decode(image_data)
-            
-        image = Image.open(io.BytesIO(image_data))
+            return base64.b64decode(image_data.split(',')[1])
+        return base64.b64decode(image_data)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidImageData(f"Imagem base64 inválida: {e}") from None
+
+def image_cache_key(image_bytes):
+    """Chave do cache de OCR: SHA-256 da configuração de OCR + bytes da imagem"""
+    digest = hashlib.sha256(config_fingerprint().encode('utf-8'))
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+def run_tiered_ocr(image_bytes, timings=None):
+    """OCR em níveis: começa pelo pré-processamento barato e só sobe de nível se necessário.
+    Retorna (resultado do OCR, nota já processada do texto escolhido) para o chamador não reprocessar"""
+    best_result = None
+    best_invoice = None
+    tiers_tried = []
+    for tier in PREPROCESSING_TIERS:
+        result = OCR_POOL.run(run_ocr, image_bytes, tier=tier, timeout=OCR_POOL.task_timeout)
+        # Etapas medidas dentro do worker (normalize, preprocess, tesseract), somadas entre os níveis
+        for stage, elapsed_ms in result.pop('timings', {}).items():
+            record_stage(timings, stage, elapsed_ms)
+        invoice_data = process_invoice_text(clean_ocr_text(result['text']))
+        result['productHits'] = len(invoice_data['eligible_products'])
+        tiers_tried.append(tier)
+        
+        if best_result is None or (result['productHits'], result['confidence']) > (best_result['productHits'], best_result['confidence']):
+            best_result = result
+            best_invoice = invoice_data
+        
+        if result['confidence'] >= OCR_MIN_CONFIDENCE and result['productHits'] >= OCR_MIN_PRODUCT_HITS:
+            break
+        # Leitura nítida sem produtos: nota sem itens Fast, outro nível não vai achar nenhum
+        if result['confidence'] >= OCR_HIGH_CONFIDENCE:
+            logger.info(f"✔️ Nível '{tier}' com confiança {result['confidence']}, sem produtos elegíveis")
+            break
+        logger.info(f"🔼 Nível '{tier}' abaixo dos limiares (confiança {result['confidence']}, "
+                    f"{result['productHits']} produtos)")
+    
+    best_result['tiersTried'] = tiers_tried
+    return best_result, best_invoice
+
+def cached_ocr_result(image_bytes, timings=None):
+    """(chave do cache, resultado de OCR já em cache ou None) da imagem"""
+    with timed_stage(timings, 'cache'):
+        cache_key = image_cache_key(image_bytes)
+        cached = RESULT_CACHE.get(cache_key)
+    return cache_key, json.loads(cached) if cached is not None else None
+
+def extract_text_with_ocr(image_data, timings=None, ocr_info=None, cached=None):
+    """Extrair texto da imagem usando OCR avançado (`cached`: consulta ao cache já feita pelo chamador)"""
+    ocr_info = {} if ocr_info is None else ocr_info
+    ocr_info['fromCache'] = False
+    ocr_info['nearDuplicate'] = None
+    ocr_info['tier'] = None
+    ocr_info['confidence'] = None
+    ocr_info['invoice'] = None
+    try:
+        # Decodificar base64 (uploads binários e process_order_image já passam bytes)
+        if not isinstance(image_data, (bytes, bytearray)):
+            with timed_stage(timings, 'decode'):
+                image_data = decode_image_data(image_data)
+        
+        # Validar a imagem pelo cabeçalho (rejeita dimensões acima do limite antes de decodificar)
+        open_image(image_data)
         
         if not TESSERACT_AVAILABLE:
             logger.warning("Tesseract não disponível, usando dados simulados")
+            OCR_FALLBACKS.inc(reason='unavailable')
             return generate_realistic_simulated_text()
         
-        # Pré-processar imagem
-        processed_image = advanced_image_preprocessing(image)
+        # Mesma imagem já processada: reutilizar o resultado sem rodar o OCR
+        cache_key, ocr_result = cached or cached_ocr_result(image_data, timings)
         
-        # Configuração otimizada do Tesseract para português e documentos
-        custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÀÁÂÃÄÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝàáâãäçèéêëìíîïñòóôõöùúûüý.,/:;-+*()[]{}|\\@#$%&<>="\' '
+        if ocr_result is not None:
+            ocr_info['fromCache'] = True
+            logger.info("♻️ Texto de OCR servido do cache")
+        
+        # Mesma nota fotografada de novo: candidata pelo hash perceptual, confirmada depois do OCR
+        image_hash = None
+        near_duplicate = None
+        if ocr_result is None and NEAR_DUPLICATE_MODE != 'off':
+            with timed_stage(timings, 'phash'):
+                image_hash = dhash(open_image(image_data))
+                near_duplicate = NEAR_DUPLICATE_INDEX.find(image_hash)
+        
+        if ocr_result is None:
+            # Pré-processamento + OCR no pool de processos (fora da thread da requisição)
+            with timed_stage(timings, 'ocr'):
+                ocr_result, ocr_info['invoice'] = run_tiered_ocr(image_data, timings)
+            RESULT_CACHE.set(cache_key, json.dumps(ocr_result))
+            if image_hash is not None:
+                NEAR_DUPLICATE_INDEX.add(image_hash, ocr_result)
+            
+            # O dHash só aponta o candidato (notas do mesmo modelo ficam a poucos bits);
+            # a nota é marcada quando o número e o valor total também coincidem
+            if near_duplicate and same_invoice_header(near_duplicate[1]['text'], ocr_result['text']):
+                ocr_info['nearDuplicate'] = {'distance': near_duplicate[0], 'reviewRequired': True}
+                logger.warning(f"🔁 Nota repetida (distância {near_duplicate[0]}, mesmo número e valor)")
         
-        # Extrair texto
-        raw_text = pytesseract.image_to_string(processed_image, lang='por+eng', config=custom_config)
+        ocr_info['tier'] = ocr_result['tier']
+        ocr_info['confidence'] = ocr_result['confidence']
         
         # Limpar texto extraído
-        cleaned_text = clean_ocr_text(raw_text)
+        with timed_stage(timings, 'clean'):
+            cleaned_text = clean_ocr_text(ocr_result['text'])
         
-        logger.info(f"OCR extraído {len(cleaned_text)} caracteres")
+        logger.info(f"OCR extraído {len(cleaned_text)} caracteres (nível '{ocr_result['tier']}', confiança {ocr_result['confidence']})")
         return cleaned_text
         
+    except (OCRPoolFull, OCRTimeout, OCRWorkerLost, ImageTooLarge, InvalidImageData):
+        # Falha do servidor ou da requisição, não da imagem: responder com erro em vez de inventar a nota
+        raise
     except Exception as e:
         logger.error(f"Erro na extração OCR: {e}")
+        OCR_FALLBACKS.inc(reason='error')
+        ocr_info['invoice'] = None
         return generate_realistic_simulated_text()
 
+def same_invoice_header(text, other_text):
+    """Número e valor total da nota presentes e iguais nos dois textos de OCR"""
+    header, _ = extract_header(clean_ocr_text(text))
+    other_header, _ = extract_header(clean_ocr_text(other_text))
+    return all(header[field] is not None and header[field] == other_header[field]
+               for field in ('numero_nota', 'valor_total_nota'))
+
+def find_access_key(image_bytes, timings=None):
+    """Chave de acesso lida do código de barras/QR da imagem (antes do OCR), ou None"""
+    if not ACCESS_KEY_FAST_PATH or not CV2_AVAILABLE:
+        return None
+    try:
+        with timed_stage(timings, 'barcode'):
+            return OCR_POOL.run(read_access_key, image_bytes)
+    except (OCRPoolFull, OCRTimeout, ImageTooLarge):
+        raise
+    except Exception as e:
+        logger.warning(f"⚠️ Leitura do código de barras falhou: {e}")
+        return None
+
 def generate_realistic_simulated_text():
     """Gerar texto simulado realista para demonstração"""
     return """
@@ -369,131 +561,60 @@ VALOR LÍQUIDO: R$ 3.302,50
 Fast Sistemas - Qualidade em Steel Frame e Drywall
 """
 
-def similarity_score(a, b):
-    """Calcular similaridade entre duas strings"""
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
-
 def identify_fast_product(line, context_lines):
     """Identificar produto Fast na linha com base no contexto"""
-    line_upper = line.upper()
-    
-    # Buscar por cada produto na base de dados
-    best_match = None
-    best_score = 0
-    
-    for product_key, product_info in PRODUTOS_FAST_DATABASE.items():
-        score = 0
-        
-        # Verificar keywords
-        for keyword in product_info['keywords']:
-            if keyword.upper() in line_upper:
-                score += 0.4
-        
-        # Verificar padrões de código
-        for pattern in product_info['codigo_patterns']:
-            if re.search(pattern, line_upper):
-                score += 0.6
-        
-        # Verificar similaridade de nome
-        name_similarity = similarity_score(line, product_info['nome'])
-        if name_similarity > 0.6:
-            score += name_similarity * 0.3
-        
-        # Bonus por contexto (linhas próximas)
-        for context_line in context_lines:
-            context_upper = context_line.upper()
-            for keyword in product_info['keywords']:
-                if keyword.upper() in context_upper:
-                    score += 0.1
-        
-        if score > best_score and score > 0.3:  # Threshold mínimo
-            best_score = score
-            best_match = (product_key, product_info, score)
-    
-    return best_match
+    return CATALOG.current.matcher.identify(line, context_lines)
 
 def extract_numeric_values(line):
     """Extrair valores numéricos de uma linha"""
+    fields = parse_line(line)
     values = {}
-    
-    # Padrão para quantidade (número seguido de UN, PC, M, etc.)
-    qty_pattern = r'(\d+(?:[,\.]\d+)?)\s*(?:UN|PC|M|ML|M2|KG|SC|RL|CX)'
-    qty_match = re.search(qty_pattern, line, re.IGNORECASE)
-    if qty_match:
-        values['quantidade'] = float(qty_match.group(1).replace(',', '.'))
-    
-    # Padrão para valores monetários
-    money_patterns = [
-        r'R\$\s*(\d+(?:[,\.]\d{3})*[,\.]\d{2})',  # R$ 123.456,78
-        r'(\d+(?:[,\.]\d{3})*[,\.]\d{2})',        # 123.456,78
-        r'(\d+[,\.]\d{2})'                        # 123,78
-    ]
-    
-    money_values = []
-    for pattern in money_patterns:
-        matches = re.findall(pattern, line)
-        for match in matches:
-            # Converter para float
-            value_str = match.replace('.', '').replace(',', '.')
-            try:
-                money_values.append(float(value_str))
-            except ValueError:
-                continue
-    
-    # Identificar valor unitário e total
-    if len(money_values) >= 2:
-        values['valor_unitario'] = money_values[-2]  # Penúltimo valor
-        values['valor_total'] = money_values[-1]     # Último valor
-    elif len(money_values) == 1:
-        values['valor_total'] = money_values[0]
-    
+    if fields['quantity'] is not None:
+        values['quantidade'] = fields['quantity']
+    if fields['unit_price'] is not None:
+        values['valor_unitario'] = fields['unit_price']
+    if fields['total'] is not None:
+        values['valor_total'] = fields['total']
     return values
 
 def process_invoice_text(text):
     """Processar texto da nota fiscal e extrair informações"""
     lines = text.split('\n')
     
-    # Informações básicas
-    order_info = {
-        'numero_nota': extract_order_number(text),
-        'data_emissao': extract_date(text),
-        'cliente': extract_customer(text),
-        'valor_total_nota': extract_total_value(text)
-    }
+    # Informações básicas (cabeçalho e rodapé lidos numa única passada)
+    order_info = extract_order_info(text)
     
     # Produtos identificados
     products_found = []
     eligible_products = []
     
+    # Keywords por linha e bônus de contexto calculados uma única vez por nota
+    scan = CATALOG.current.matcher.scan_lines(lines)
+    
     for i, line in enumerate(lines):
         line = line.strip()
         if not line or len(line) < 10:
             continue
         
-        # Obter contexto (linhas próximas)
-        context_lines = []
-        for j in range(max(0, i-2), min(len(lines), i+3)):
-            if j != i:
-                context_lines.append(lines[j])
+        # Verificar se é produto Fast (contexto = linhas próximas)
+        product_match = scan.identify(i, line)
+        is_item_line = any(keyword in line.upper() for keyword in ['UN', 'PC', 'KG', 'M', 'R$']) and len(line) > 20
         
-        # Verificar se é produto Fast
-        product_match = identify_fast_product(line, context_lines)
+        # Linha tokenizada uma única vez; os campos servem às duas listas
+        fields = parse_line(line) if product_match or is_item_line else None
         
         if product_match:
             product_key, product_info, confidence = product_match
             
-            # Extrair valores numéricos
-            values = extract_numeric_values(line)
-            
             # Criar produto identificado
             product = {
                 'name': product_info['nome'],
                 'product_name': product_info['nome'],
-                'product_code': extract_product_code(line),
-                'quantity': values.get('quantidade', 1),
-                'unit_price': values.get('valor_unitario', 0),
-                'value': values.get('valor_total', 0),
-                'total_value': values.get('valor_total', 0),
+                'product_code': fields['code'] or 'N/A',
+                'quantity': fields['quantity'] or 1,
+                'unit_price': fields['unit_price'] or 0,
+                'value': fields['total'] or 0,
+                'total_value': fields['total'] or 0,
                 'category': product_info['categoria'],
                 'points_per_real': product_info['pontosPorReal'],
                 'confidence': confidence,
@@ -509,15 +630,13 @@ def process_invoice_text(text):
             eligible_products.append(product)
             
         # Adicionar à lista geral de produtos
-        if any(keyword in line.upper() for keyword in ['UN', 'PC', 'KG', 'M', 'R$']) and len(line) > 20:
-            values = extract_numeric_values(line)
-            if values.get('valor_total', 0) > 0:
-                products_found.append({
-                    'description': line,
-                    'value': values.get('valor_total', 0),
-                    'quantity': values.get('quantidade', 1),
-                    'unit_price': values.get('valor_unitario', 0)
-                })
+        if is_item_line and (fields['total'] or 0) > 0:
+            products_found.append({
+                'description': line,
+                'value': fields['total'],
+                'quantity': fields['quantity'] or 1,
+                'unit_price': fields['unit_price'] or 0
+            })
     
     return {
         'order_info': order_info,
@@ -527,98 +646,76 @@ def process_invoice_text(text):
         'processing_method': 'python_advanced_ocr'
     }
 
+def extract_order_info(text):
+    """Número, data, cliente e valor total da nota, com a confiança de cada campo"""
+    header, confidence = extract_header(text)
+    return {
+        'numero_nota': header['numero_nota'] or f"PYTHON-{int(datetime.now().timestamp())}",
+        'data_emissao': header['data_emissao'] or datetime.now().strftime('%Y-%m-%d'),
+        'cliente': header['cliente'] or "Cliente Python",
+        'valor_total_nota': header['valor_total_nota'] or 0.0,
+        'field_confidence': confidence
+    }
+
 def extract_order_number(text):
     """Extrair número da nota fiscal"""
-    patterns = [
-        r'NOTA\s+FISCAL[^\d]*(\d+)',
-        r'NF[^\d]*(\d+)',
-        r'N[FºFª°]\s*(\d+)',
-        r'NÚMERO[^\d]*(\d+)'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return f"NF-{match.group(1)}"
-    
-    return f"PYTHON-{int(datetime.now().timestamp())}"
+    return extract_order_info(text)['numero_nota']
 
 def extract_date(text):
     """Extrair data da nota fiscal"""
-    patterns = [
-        r'(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{4})',
-        r'(\d{4}[\/\-]\d{1,2}[\/\-]\d{1,2})',
-        r'DATA[:\s]*(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{4})'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            date_str = match.group(1)
-            try:
-                # Tentar diferentes formatos
-                for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%Y-%m-%d']:
-                    try:
-                        parsed_date = datetime.strptime(date_str, fmt)
-                        return parsed_date.strftime('%Y-%m-%d')
-                    except ValueError:
-                        continue
-            except:
-                pass
-    
-    return datetime.now().strftime('%Y-%m-%d')
+    return extract_order_info(text)['data_emissao']
 
 def extract_customer(text):
     """Extrair nome do cliente"""
-    patterns = [
-        r'CLIENTE[:\s]+([^\n\r]+)',
-        r'RAZÃO\s+SOCIAL[:\s]+([^\n\r]+)',
-        r'CNPJ[:\s]+[\d\.\-\/]+\s+([^\n\r]+)'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            customer = match.group(1).strip()
-            if len(customer) > 5:  # Nome válido
-                return customer
-    
-    return "Cliente Python"
+    return extract_order_info(text)['cliente']
 
 def extract_total_value(text):
     """Extrair valor total da nota"""
-    patterns = [
-        r'TOTAL[:\s]*R?\$?\s*(\d+(?:[,\.]\d{3})*[,\.]\d{2})',
-        r'VALOR\s+TOTAL[:\s]*R?\$?\s*(\d+(?:[,\.]\d{3})*[,\.]\d{2})',
-        r'LÍQUIDO[:\s]*R?\$?\s*(\d+(?:[,\.]\d{3})*[,\.]\d{2})'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            value_str = match.group(1).replace('.', '').replace(',', '.')
-            try:
-                return float(value_str)
-            except ValueError:
-                continue
-    
-    return 0.0
+    return extract_order_info(text)['valor_total_nota']
 
 def extract_product_code(line):
     """Extrair código do produto da linha"""
-    # Padrões comuns de código
-    patterns = [
-        r'([A-Z]{2}\d{5})',   # DW00057
-        r'([A-Z]{2}\d{3})',   # GR001
-        r'(\d{4,6})',         # Código numérico
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, line.upper())
-        if match:
-            return match.group(1)
-    
-    return "N/A"
+    return parse_line(line)['code'] or "N/A"
+
+@app.before_request
+def start_request():
+    """Id da requisição (X-Request-Id do cliente/proxy ou um novo) para correlacionar logs e tempos"""
+    request_id = request.headers.get('X-Request-Id', '')
+    g.request_id = request_id if REQUEST_ID_PATTERN.match(request_id) else uuid.uuid4().hex
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def finish_request(response):
+    """Devolver o id da requisição e registrar a latência do endpoint"""
+    response.headers['X-Request-Id'] = g.request_id
+    endpoint = request.endpoint or 'not_found'
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    REQUESTS_TOTAL.inc(endpoint=endpoint, status=response.status_code)
+    try:
+        METRICS.flush()
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Falha ao gravar métricas compartilhadas: {e}")
+    return response
+
+def wants_timings():
+    return RESPONSE_TIMINGS or request.args.get('timings', '').lower() in ('1', 'true')
+
+def timed_response(payload, timings):
+    """Serializar a resposta medindo a etapa 'serialize'; com ?timings=true, tempos no corpo e em Server-Timing"""
+    include_timings = wants_timings()
+    if include_timings:
+        payload = {**payload, 'requestId': g.request_id, 'timings': timings}
+    with timed_stage(timings, 'serialize'):
+        response = jsonify(payload)
+    logger.info(f"⏱️ [{g.request_id}] " + ', '.join(f"{stage} {ms} ms" for stage, ms in timings.items()))
+    if include_timings:
+        response.headers['Server-Timing'] = ', '.join(f"{stage};dur={ms}" for stage, ms in timings.items())
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas no formato texto do Prometheus (somadas entre os workers do gunicorn)"""
+    return METRICS.render(), 200, {'Content-Type': METRICS.content_type}
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -627,98 +724,447 @@ def health_check():
         'status': 'ok',
         'service': 'fast-python-complete-processor',
         'ocr_available': TESSERACT_AVAILABLE,
+        'ocr_engine': selected_engine(),
         'opencv_available': CV2_AVAILABLE,
-        'products_database': len(PRODUTOS_FAST_DATABASE),
+        'products_database': len(CATALOG.current.catalog),
+        'catalog': CATALOG.current.describe(),
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Pronto para receber tráfego (após o aquecimento opcional do OCR)"""
+    return jsonify({
+        **READINESS,
+        'ocr_available': TESSERACT_AVAILABLE,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if READINESS['ready'] else 503
+
+def run_warm_up():
+    """OCR de aquecimento em cada worker do pool (imports pesados + modelo do Tesseract) e liberar /ready"""
+    start = time.perf_counter()
+    try:
+        tasks = [OCR_POOL.submit(warm_up) for _ in range(OCR_POOL.workers)]
+        for task in tasks:
+            task.result()
+        READINESS['warmup'] = 'ok'
+    except Exception as e:
+        logger.warning(f"⚠️ Aquecimento do OCR falhou: {e}")
+        READINESS['warmup'] = f'falhou: {e}'
+    finally:
+        READINESS['warmupMs'] = round((time.perf_counter() - start) * 1000, 2)
+        READINESS['ready'] = True
+        logger.info(f"🔥 Aquecimento do OCR concluído em {READINESS['warmupMs']} ms")
+
+def start_warm_up():
+    """Iniciar o aquecimento em segundo plano (o servidor já atende /health enquanto isso)"""
+    if not READINESS['ready']:
+        threading.Thread(target=run_warm_up, name='ocr-warmup', daemon=True).start()
+
+def process_order_image(image_data, timings=None):
+    """Executar OCR + análise da nota e montar a resposta de /process-order"""
+    logger.info("🔍 Iniciando processamento completo com Python...")
+    
+    # Base64 decodificado uma única vez; as etapas seguintes recebem os bytes
+    with timed_stage(timings, 'decode'):
+        image_bytes = decode_image_data(image_data)
+    
+    # PDF (DANFE enviado por e-mail): camada de texto direto, OCR só nas páginas escaneadas
+    if is_pdf(image_bytes):
+        return process_order_pdf(image_bytes, timings)
+    
+    # Imagem já processada: o OCR em cache dispensa também a leitura do código de barras
+    cached = cached_ocr_result(image_bytes, timings) if TESSERACT_AVAILABLE else None
+    
+    # Chave de acesso no código de barras/QR: NF-e no armazenamento local dispensa o OCR
+    access_key = find_access_key(image_bytes, timings) if not (cached and cached[1]) else None
+    document = DOCUMENT_STORE.get(access_key) if access_key else None
+    if document:
+        logger.info(f"🔑 NF-e {access_key} encontrada pela chave de acesso, OCR dispensado")
+        with timed_stage(timings, 'parse'):
+            invoice_data = invoice_from_nfe(document, CATALOG.current.matcher)
+        return {
+            'success': True,
+            'data': {
+                **order_data(invoice_data, 'python-nfe-access-key'),
+                'ocrAvailable': TESSERACT_AVAILABLE,
+                'accessKey': access_key,
+                'fromCache': False,
+                'nearDuplicate': None,
+                'preprocessingTier': None,
+                'ocrConfidence': None
+            }
+        }
+    
+    # Extrair texto da imagem
+    ocr_info = {}
+    text = extract_text_with_ocr(image_bytes, timings, ocr_info, cached)
+    logger.info(f"📝 Texto extraído: {len(text)} caracteres")
+    
+    # Processar nota fiscal (o OCR em níveis já processou o texto escolhido; cache e simulação não)
+    invoice_data = ocr_info['invoice']
+    if invoice_data is None:
+        with timed_stage(timings, 'parse'):
+            invoice_data = process_invoice_text(text)
+    
+    logger.info(f"✅ Produtos elegíveis encontrados: {len(invoice_data['eligible_products'])}")
+    logger.info(f"📊 Total de pontos: {invoice_data['total_eligible_points']}")
+    
+    # Preparar resposta no formato esperado pelo frontend
+    return {
+        'success': True,
+        'data': {
+            **order_data(invoice_data, 'python-complete-ocr'),
+            'ocrAvailable': TESSERACT_AVAILABLE,
+            'accessKey': access_key,
+            'fromCache': ocr_info['fromCache'],
+            'nearDuplicate': ocr_info['nearDuplicate'],
+            'preprocessingTier': ocr_info['tier'],
+            'ocrConfidence': ocr_info['confidence']
+        }
+    }
+
+def ocr_pdf_page(image_bytes):
+    """OCR de uma página escaneada do PDF (mesmo fluxo em níveis das imagens)"""
+    if not TESSERACT_AVAILABLE:
+        logger.warning("Tesseract não disponível, página escaneada do PDF ignorada")
+        return {'text': '', 'confidence': 0.0, 'words': 0, 'tier': None}
+    return run_tiered_ocr(image_bytes)[0]
+
+def process_order_pdf(pdf_bytes, timings=None):
+    """Processar nota fiscal em PDF e montar a resposta de /process-order"""
+    logger.info("📄 Processando nota fiscal em PDF...")
+    
+    page_texts = []
+    pages = []
+    with timed_stage(timings, 'pdf'):
+        for page in iter_pdf_pages(pdf_bytes, ocr_pdf_page, PDF_EXECUTOR, max_inflight=OCR_POOL.workers,
+                                   target_megapixels=OCR_TARGET_MEGAPIXELS):
+            # Texto embutido no PDF é exato: só o texto de OCR passa pelas correções
+            text = page['text'] if page['source'] == PAGE_TEXT else clean_ocr_text(page['text'])
+            page_texts.append(text)
+            pages.append({
+                'page': page['page'],
+                'source': page['source'],
+                'characters': len(text),
+                'ocrConfidence': page['ocr']['confidence'] if page['ocr'] else None
+            })
+    
+    ocr_pages = [page for page in pages if page['source'] != PAGE_TEXT]
+    logger.info(f"📄 PDF com {len(pages)} páginas ({len(ocr_pages)} por OCR)")
+    
+    with timed_stage(timings, 'parse'):
+        invoice_data = process_invoice_text('\n'.join(page_texts))
+    invoice_data['processing_method'] = 'pdf_ocr' if ocr_pages else 'pdf_text_layer'
+    
+    return {
+        'success': True,
+        'data': {
+            **order_data(invoice_data, 'python-pdf'),
+            'ocrAvailable': TESSERACT_AVAILABLE,
+            'accessKey': None,
+            'fromCache': False,
+            'nearDuplicate': None,
+            'preprocessingTier': None,
+            'ocrConfidence': (round(sum(page['ocrConfidence'] for page in ocr_pages) / len(ocr_pages), 2)
+                              if ocr_pages else None),
+            'pages': pages
+        }
+    }
+
+def order_data(invoice_data, processed_by):
+    """Dados da nota no formato esperado pelo frontend"""
+    return {
+        'products': invoice_data['eligible_products'],
+        'totalPoints': invoice_data['total_eligible_points'],
+        'orderNumber': invoice_data['order_info']['numero_nota'],
+        'orderDate': invoice_data['order_info']['data_emissao'],
+        'totalValue': invoice_data['order_info']['valor_total_nota'],
+        'customer': invoice_data['order_info']['cliente'],
+        'fieldConfidence': invoice_data['order_info'].get('field_confidence'),
+        'processedBy': processed_by,
+        'allProducts': invoice_data['all_products'],
+        'processingMethod': invoice_data['processing_method'],
+        'productsDatabaseSize': len(CATALOG.current.catalog)
+    }
+
+def process_order_error(e):
+    """Resposta de erro de /process-order (payload, status HTTP)"""
+    if isinstance(e, InvalidImageData):
+        return {'success': False, 'error': str(e)}, 400
+    
+    if isinstance(e, (OCRPoolFull, JobQueueFull)):
+        logger.warning(f"⏳ {e}")
+        return {'success': False, 'error': 'Servidor ocupado, tente novamente em instantes'}, 503
+    
+    if isinstance(e, OCRTimeout):
+        logger.warning(f"⏱️ {e}")
+        return {'success': False, 'error': 'Tempo limite do OCR excedido, tente novamente'}, 504
+    
+    if isinstance(e, OCRWorkerLost):
+        logger.error(f"💥 {e}")
+        return {'success': False, 'error': 'Falha no processamento do OCR, tente novamente'}, 503
+    
+    if isinstance(e, RequestEntityTooLarge):
+        max_mb = app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024)
+        return {'success': False, 'error': f'Imagem excede o tamanho máximo de {max_mb:g} MB'}, 413
+    
+    if isinstance(e, (ImageTooLarge, PDFTooLarge)):
+        logger.warning(f"🚫 {e}")
+        return {'success': False, 'error': str(e)}, 413
+    
+    logger.error(f"❌ Erro no processamento: {e}")
+    return {
+        'success': False,
+        'error': str(e),
+        'fallback_data': {
+            'products': [],
+            'totalPoints': 0,
+            'orderNumber': f"ERROR-{int(datetime.now().timestamp())}",
+            'orderDate': datetime.now().strftime('%Y-%m-%d'),
+            'totalValue': 0,
+            'customer': 'Erro no processamento',
+            'processedBy': 'python-error-handler'
+        }
+    }, 500
+
 @app.route('/process-order', methods=['POST'])
+@rate_limit()
 def process_order():
     """Endpoint principal para processar nota fiscal"""
     try:
-        data = request.json
-        base64_image = data.get('image')
+        image_data = read_image_from_request()
         
-        if not base64_image:
+        if not image_data:
             return jsonify({'success': False, 'error': 'Imagem não fornecida'}), 400
         
-        logger.info("🔍 Iniciando processamento completo com Python...")
+        timings = {}
+        return timed_response(process_order_image(image_data, timings), timings)
+        
+    except Exception as e:
+        payload, status = process_order_error(e)
+        return jsonify(payload), status
+
+def process_batch_item(index, image_data):
+    """Processar uma imagem do lote sem deixar o erro derrubar o lote inteiro"""
+    try:
+        if not image_data:
+            payload = {'success': False, 'error': 'Imagem não fornecida'}
+        else:
+            payload = process_order_image(image_data)
+    except Exception as e:
+        payload, _ = process_order_error(e)
+    return {'index': index, **payload}
+
+def batch_summary(results, count_key='images'):
+    """Totais de um lote de notas (só as processadas com sucesso); `count_key` nomeia o total de itens"""
+    succeeded = [result for result in results if result['success']]
+    return {
+        count_key: len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'totalPoints': sum(result['data']['totalPoints'] for result in succeeded),
+        'eligibleProducts': sum(len(result['data']['products']) for result in succeeded),
+        'totalValue': round(sum(result['data']['totalValue'] for result in succeeded), 2)
+    }
+
+@app.route('/process-batch', methods=['POST'])
+@rate_limit()
+def process_batch():
+    """Processar várias notas fiscais numa única requisição"""
+    try:
+        if request.mimetype == 'multipart/form-data':
+            images = [upload.read() for upload in request.files.getlist('images')]
+        else:
+            images = (request.get_json(silent=True) or {}).get('images')
+        
+        if not images or not isinstance(images, list):
+            return jsonify({'success': False, 'error': 'Lista de imagens não fornecida'}), 400
         
-        # Extrair texto da imagem
-        text = extract_text_with_ocr(base64_image)
-        logger.info(f"📝 Texto extraído: {len(text)} caracteres")
+        if len(images) > BATCH_MAX_IMAGES:
+            return jsonify({
+                'success': False,
+                'error': f'Lote excede o limite de {BATCH_MAX_IMAGES} imagens'
+            }), 400
         
-        # Processar nota fiscal
-        invoice_data = process_invoice_text(text)
+        logger.info(f"📚 Processando lote com {len(images)} imagens...")
         
-        logger.info(f"✅ Produtos elegíveis encontrados: {len(invoice_data['eligible_products'])}")
-        logger.info(f"📊 Total de pontos: {invoice_data['total_eligible_points']}")
+        # Distribuir as imagens entre os núcleos (via pool de OCR)
+        futures = [BATCH_EXECUTOR.submit(process_batch_item, index, image)
+                   for index, image in enumerate(images)]
+        results = [future.result() for future in futures]
         
-        # Preparar resposta no formato esperado pelo frontend
-        response = {
-            'success': True,
-            'data': {
-                'products': invoice_data['eligible_products'],
-                'totalPoints': invoice_data['total_eligible_points'],
-                'orderNumber': invoice_data['order_info']['numero_nota'],
-                'orderDate': invoice_data['order_info']['data_emissao'],
-                'totalValue': invoice_data['order_info']['valor_total_nota'],
-                'customer': invoice_data['order_info']['cliente'],
-                'processedBy': 'python-complete-ocr',
-                'allProducts': invoice_data['all_products'],
-                'processingMethod': invoice_data['processing_method'],
-                'ocrAvailable': TESSERACT_AVAILABLE,
-                'productsDatabaseSize': len(PRODUTOS_FAST_DATABASE)
-            }
-        }
+        summary = batch_summary(results)
+        
+        logger.info(f"✅ Lote concluído: {summary['succeeded']}/{summary['images']} imagens, {summary['totalPoints']} pontos")
         
-        return jsonify(response)
+        return jsonify({'success': True, 'results': results, 'summary': summary})
         
+    except RequestEntityTooLarge as e:
+        payload, status = process_order_error(e)
+        return jsonify(payload), status
     except Exception as e:
-        logger.error(f"❌ Erro no processamento: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'fallback_data': {
-                'products': [],
-                'totalPoints': 0,
-                'orderNumber': f"ERROR-{int(datetime.now().timestamp())}",
-                'orderDate': datetime.now().strftime('%Y-%m-%d'),
-                'totalValue': 0,
-                'customer': 'Erro no processamento',
-                'processedBy': 'python-error-handler'
-            }
-        }), 500
+        logger.error(f"❌ Erro no processamento do lote: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/process-nfe', methods=['POST'])
+@rate_limit()
+def process_nfe():
+    """Processar XMLs de NF-e (um, vários ou pacote ZIP) direto, sem OCR"""
+    try:
+        if request.mimetype == 'multipart/form-data':
+            uploads = [(upload.filename or 'documento.xml', upload.stream)
+                       for upload in request.files.values()]
+        else:
+            uploads = [('documento.xml', request.stream)]
+        
+        results = []
+        timings = {}
+        # Só XMLs de clientes com a API key são gravados: o atalho do código de barras em
+        # /process-order confia no armazenamento, e um XML anônimo pode ter itens inventados
+        store_documents = is_authenticated_request()
+        with timed_stage(timings, 'parse'):
+            for upload_name, stream in uploads:
+                for source, document in iter_nfe_sources(stream, upload_name):
+                    result = {'index': len(results), 'source': source}
+                    if isinstance(document, Exception):
+                        result.update({'success': False, 'error': str(document)})
+                    else:
+                        stored = store_documents and DOCUMENT_STORE.put(document, replace=True)
+                        invoice_data = invoice_from_nfe(document, CATALOG.current.matcher)
+                        result.update({
+                            'success': True,
+                            'accessKey': document['access_key'],
+                            'stored': stored,
+                            'data': order_data(invoice_data, 'python-nfe-xml')
+                        })
+                    results.append(result)
+        
+        if not results:
+            return jsonify({'success': False, 'error': 'Nenhum XML de NF-e fornecido'}), 400
+        
+        summary = batch_summary(results, count_key='documents')
+        logger.info(f"🧾 NF-e XML: {summary['succeeded']}/{summary['documents']} documentos, "
+                    f"{summary['totalPoints']} pontos em {timings['parse']} ms")
+        
+        return jsonify({'success': True, 'results': results, 'summary': summary})
+        
+    except RequestEntityTooLarge as e:
+        payload, status = process_order_error(e)
+        return jsonify(payload), status
+    except (zipfile.BadZipFile, OSError) as e:
+        logger.error(f"❌ Pacote de NF-e inválido: {e}")
+        return jsonify({'success': False, 'error': f'Pacote ZIP inválido: {e}'}), 400
+    except Exception as e:
+        logger.error(f"❌ Erro no processamento de NF-e: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/nfe/<access_key>', methods=['GET'])
+def consult_nfe(access_key):
+    """Consulta da NF-e pela chave de acesso no armazenamento local (substituto da SEFAZ)"""
+    result = DOCUMENT_STORE.consult(access_key)
+    status = {'100': 200, '217': 404}.get(result['cStat'], 400)
+    return jsonify(result), status
+
+def process_order_job(image_bytes, timings=None):
+    """Job assíncrono: processar a nota e gravar as métricas (o job termina fora de uma requisição)"""
+    try:
+        return process_order_image(image_bytes, timings)
+    finally:
+        try:
+            METRICS.flush()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Falha ao gravar métricas compartilhadas: {e}")
+
+@app.route('/jobs', methods=['POST'])
+@rate_limit()
+def submit_job():
+    """Submeter nota fiscal para processamento assíncrono (retorna o id do job)"""
+    try:
+        image_data = read_image_from_request()
+        
+        if not image_data:
+            return jsonify({'success': False, 'error': 'Imagem não fornecida'}), 400
+        
+        # Payload inválido recusado na submissão; a fila guarda os bytes, não o base64
+        job_id = JOB_STORE.submit(process_order_job, decode_image_data(image_data))
+        logger.info(f"📥 Job {job_id} enfileirado")
+        
+        return jsonify({'success': True, 'jobId': job_id, 'status': 'queued'}), 202
+        
+    except Exception as e:
+        payload, status = process_order_error(e)
+        return jsonify(payload), status
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Consultar status do job (queued, running, done, failed) e tempos por etapa"""
+    job = JOB_STORE.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job não encontrado ou expirado'}), 404
+    
+    return jsonify({'success': True, **JobStore.describe(job)})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Obter o resultado do job (mesmo payload de /process-order)"""
+    job = JOB_STORE.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job não encontrado ou expirado'}), 404
+    
+    if job['status'] == JOB_DONE:
+        return jsonify(job['result'])
+    
+    if job['status'] == JOB_FAILED:
+        payload, status = job['error_response']
+        return jsonify(payload), status
+    
+    return jsonify({'success': False, **JobStore.describe(job)}), 202
 
 @app.route('/test-ocr', methods=['POST'])
+@rate_limit()
 def test_ocr():
     """Endpoint para testar apenas o OCR"""
     try:
-        data = request.json
-        base64_image = data.get('image')
+        image_data = read_image_from_request()
         
-        if not base64_image:
+        if not image_data:
             return jsonify({'success': False, 'error': 'Imagem não fornecida'}), 400
         
-        text = extract_text_with_ocr(base64_image)
+        ocr_info = {}
+        timings = {}
+        text = extract_text_with_ocr(image_data, timings, ocr_info)
         
-        return jsonify({
+        return timed_response({
             'success': True,
             'text': text,
             'length': len(text),
             'lines': len(text.split('\n')),
-            'ocr_available': TESSERACT_AVAILABLE
-        })
+            'ocr_available': TESSERACT_AVAILABLE,
+            'from_cache': ocr_info['fromCache'],
+            'near_duplicate': ocr_info['nearDuplicate'],
+            'preprocessing_tier': ocr_info['tier'],
+            'ocr_confidence': ocr_info['confidence']
+        }, timings)
         
+    except (OCRPoolFull, OCRTimeout, OCRWorkerLost, RequestEntityTooLarge, ImageTooLarge, InvalidImageData) as e:
+        payload, status = process_order_error(e)
+        return jsonify(payload), status
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# No gunicorn (gunicorn.conf.py) o aquecimento roda em cada worker depois do fork
+if os.getenv('PREFORK_SERVER', 'false').lower() != 'true':
+    start_warm_up()
+
 if __name__ == '__main__':
     print("🐍 Iniciando servidor Python completo...")
     print("🚀 Recursos disponíveis:")
     print(f"   📝 OCR (Tesseract): {'✅' if TESSERACT_AVAILABLE else '❌'}")
     print(f"   🖼️ OpenCV: {'✅' if CV2_AVAILABLE else '❌'}")
-    print(f"   📦 Produtos cadastrados: {len(PRODUTOS_FAST_DATABASE)}")
-    print("🚀 Servidor rodando em http://localhost:5001")
+    print(f"   📦 Produtos cadastrados: {len(CATALOG.current.catalog)} (catálogo: {CATALOG.current.source})")
+    port = int(os.getenv('PORT', '5001'))
+    print(f"🚀 Servidor rodando em http://localhost:{port}")
+    print("   (servidor de desenvolvimento; em produção: gunicorn -c gunicorn.conf.py app_complete:app)")
     
-    app.run(debug=False, host='127.0.0.1', port=5001)
+    app.run(debug=False, host='127.0.0.1', port=port)
@@ -0,0 +1,350 @@
+# Benchmark reprodutível: corpus sintético de notas fiscais em imagem
+# Renderiza o texto simulado do processador e variações (mais itens, outros
+# produtos, outros layouts) com o PIL, em resolução, rotação, desfoque e ruído
+# controlados, e roda o fluxo completo extract_text_with_ocr → process_invoice_text.
+# Mede latência por etapa, imagens/s por núcleo, pico de memória (RSS) e a
+# acurácia de produtos/pontos contra o gabarito de cada nota. O corpus depende
+# só da semente: duas execuções com a mesma semente comparam o mesmo conjunto.
+#
+# Uso: python benchmarks/bench_invoice_corpus.py [--invoices 4] [--seed 42]
+#                                                [--layouts columns compact danfe] [--profiles clean scan photo]
+#                                                [--save-images dir] [--json saida.json]
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_pipeline import PIPELINE_VERSION  # noqa: E402
+
+# Sem cache de OCR e sem reaproveitar quase duplicadas: cada imagem passa pelo OCR.
+# Catálogo embutido por padrão, para o gabarito não depender do Supabase.
+os.environ.update({'RESULT_CACHE_SIZE': '0', 'RESULT_CACHE_DB': '', 'NEAR_DUPLICATE_MODE': 'off'})
+os.environ.setdefault('CATALOG_SOURCE', 'builtin')
+
+LAYOUTS = ('columns', 'compact', 'danfe')
+
+# Degradações: resolução (dpi), rotação máxima (graus), raio do desfoque e desvio do ruído
+PROFILES = {
+    'clean': {'dpi': 300, 'rotation': 0.0, 'blur': 0.0, 'noise': 0.0},
+    'scan': {'dpi': 200, 'rotation': 1.5, 'blur': 0.6, 'noise': 8.0},
+    'photo': {'dpi': 150, 'rotation': 4.0, 'blur': 1.2, 'noise': 18.0},
+}
+
+# Gabarito da nota de generate_realistic_simulated_text: (produto, valor total do item)
+SIMULATED_ITEMS = [
+    ('PLACA_GLASROC_X', 688.50), ('PLACA_RU', 650.00), ('BASECOAT_GLASROC_X', 719.20),
+    ('GUIA_DRYWALL', 187.20), ('MONTANTE_DRYWALL', 453.60), ('MALHA_GLASROC_X', 375.00),
+    ('PLACOMIX', 229.00),
+]
+
+# Itens fora do programa de pontos (não devem ser pontuados)
+OTHER_PRODUCTS = [
+    ('CIMENTO CP II 50KG', 'SC'), ('AREIA MEDIA LAVADA', 'M3'), ('TINTA ACRILICA BRANCA 18L', 'GL'),
+    ('FITA CREPE 48MM X 50M', 'RL'), ('PARAFUSO PHILLIPS CAIXA', 'CX'), ('LUVA DE PROTECAO', 'PR'),
+]
+UNITS = ('UN', 'UN', 'SC', 'RL', 'PC')
+CUSTOMERS = ('CONSTRUÇÕES ABC LTDA', 'OBRAS XYZ LTDA', 'CONSTRUTORA HORIZONTE LTDA', 'REFORMAS SILVA ME')
+
+
+def brl(value):
+    """Valor no formato brasileiro (1.234,56)"""
+    return f"{value:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def product_description(info, rng):
+    name = re.sub(r'\s*\(.*?\)', '', info['nome']).upper()
+    variant = rng.choice(info.get('variantes') or [''])
+    return f"{name} {variant.upper()}".strip()
+
+
+def supplier_code(info, index):
+    codes = [keyword.upper() for keyword in info['keywords'] if re.fullmatch(r'[a-z]{2}\d{5}', keyword)]
+    return codes[0] if codes else f"{index:06d}"
+
+
+def item_line(layout, index, item):
+    price, total = brl(item['unit_price']), brl(item['total'])
+    if layout == 'compact':
+        return f"{item['description']} {item['quantity']} {item['unit']} X {price} = {total}"
+    if layout == 'danfe':
+        return (f"{item['code']} {item['description']} 68091100 5102 {item['unit']} "
+                f"{item['quantity']},0000 {price} {total}")
+    return (f"{index:02d}  {item['description']:<30} {item['unit']:<4} {item['quantity']:>4}    "
+            f"R$ {price:>8}   R$ {total:>9}")
+
+
+def generate_invoice(catalog, layout, rng, min_items, max_items):
+    """Texto de uma nota sintética e o gabarito (produtos elegíveis, pontos, número e valor total)"""
+    items = []
+    for index in range(1, rng.randint(min_items, max_items) + 1):
+        quantity = rng.randint(1, 40)
+        unit_price = round(rng.uniform(5, 150), 2)
+        if rng.random() < 0.7:
+            key = rng.choice(sorted(catalog))
+            info = catalog[key]
+            item = {'key': key, 'description': product_description(info, rng), 'unit': rng.choice(UNITS),
+                    'code': supplier_code(info, index), 'points_per_real': info['pontosPorReal']}
+        else:
+            description, unit = rng.choice(OTHER_PRODUCTS)
+            item = {'key': None, 'description': description, 'unit': unit, 'code': f"{index:06d}"}
+        item.update({'quantity': quantity, 'unit_price': unit_price, 'total': round(quantity * unit_price, 2)})
+        items.append(item)
+
+    number = f"{rng.randint(1, 999999999):09d}"
+    date = f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2025"
+    customer = rng.choice(CUSTOMERS)
+    total_value = round(sum(item['total'] for item in items), 2)
+    if layout == 'danfe':
+        header = ['DANFE', 'DOCUMENTO AUXILIAR DA NOTA FISCAL ELETRÔNICA',
+                  f"NF-e Nº {number[:3]}.{number[3:6]}.{number[6:]} SÉRIE 1", f"DATA DA EMISSÃO: {date}",
+                  f"NOME/RAZÃO SOCIAL: {customer}", '', 'DADOS DOS PRODUTOS / SERVIÇOS']
+        footer = ['', f"VALOR TOTAL DA NOTA: R$ {brl(total_value)}"]
+    else:
+        header = ['FAST SISTEMAS CONSTRUTIVOS LTDA', 'CNPJ: 12.345.678/0001-90',
+                  f"NOTA FISCAL DE VENDA Nº {number}", f"DATA: {date}", '', f"CLIENTE: {customer}", '', 'PRODUTOS:']
+        footer = ['', f"VALOR TOTAL: R$ {brl(total_value)}", 'DESCONTO: R$ 0,00',
+                  f"VALOR LÍQUIDO: R$ {brl(total_value)}"]
+
+    lines = header + [item_line(layout, index, item) for index, item in enumerate(items, 1)] + footer
+    eligible = [item for item in items if item['key']]
+    truth = {
+        'products': [(catalog[item['key']]['categoria'], item['total']) for item in eligible],
+        'points': sum(int(item['total'] * item['points_per_real']) for item in eligible),
+        'order_number': number,
+        'total_value': total_value,
+    }
+    return '\n'.join(lines), truth
+
+
+def simulated_invoice(app_complete, catalog):
+    """Texto de generate_realistic_simulated_text e o gabarito correspondente"""
+    eligible = [(catalog[key], total) for key, total in SIMULATED_ITEMS if key in catalog]
+    truth = {
+        'products': [(info['categoria'], total) for info, total in eligible],
+        'points': sum(int(total * info['pontosPorReal']) for info, total in eligible),
+        'order_number': '000123456',
+        'total_value': 3302.50,
+    }
+    return app_complete.generate_realistic_simulated_text().strip('\n'), truth
+
+
+def load_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except (TypeError, OSError):
+        return ImageFont.load_default()  # Pillow sem FreeType: fonte bitmap fixa
+
+
+def render_invoice(text, profile, rng):
+    """PNG da nota com a resolução, rotação, desfoque e ruído do perfil"""
+    dpi = profile['dpi']
+    font = load_font(max(8, round(dpi * 10 / 72)))  # Corpo 10 pt
+    line_height = round(dpi * 15 / 72)
+    margin = round(dpi * 0.4)
+    lines = text.split('\n')
+    width = max(round(dpi * 8.27), margin * 2 + max(round(font.getlength(line)) for line in lines))
+    image = Image.new('L', (width, margin * 2 + line_height * len(lines)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((margin, margin + line_height * i), line, fill=0, font=font)
+
+    if profile['rotation']:
+        angle = rng.uniform(-profile['rotation'], profile['rotation'])
+        image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    if profile['blur']:
+        image = image.filter(ImageFilter.GaussianBlur(profile['blur']))
+    if profile['noise']:
+        noise = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, profile['noise'], (image.height, image.width))
+        image = Image.fromarray(np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', dpi=(dpi, dpi))
+    return buffer.getvalue()
+
+
+def build_corpus(app_complete, args):
+    """Lista de casos (cenário, texto, bytes da imagem, gabarito), determinística pela semente"""
+    rng = random.Random(args.seed)
+    catalog = app_complete.CATALOG.current.catalog
+    corpus = []
+    for profile_name in args.profiles:
+        texts = [('simulated', *simulated_invoice(app_complete, catalog))]
+        for layout in args.layouts:
+            for _ in range(args.invoices):
+                texts.append((layout, *generate_invoice(catalog, layout, rng, args.min_items, args.max_items)))
+        for layout, text, truth in texts:
+            corpus.append({
+                'scenario': f"{layout}/{profile_name}",
+                'text': text,
+                'image': render_invoice(text, PROFILES[profile_name], rng),
+                'truth': truth,
+            })
+    return corpus
+
+
+def run_pipeline(app_complete, case):
+    """OCR + análise de uma imagem do corpus, com os tempos por etapa"""
+    timings = {}
+    ocr_info = {}
+    start = time.perf_counter()
+    text = app_complete.extract_text_with_ocr(case['image'], timings, ocr_info)
+    with app_complete.timed_stage(timings, 'parse'):
+        invoice_data = app_complete.process_invoice_text(text)
+    timings['total'] = round((time.perf_counter() - start) * 1000, 2)
+    return {'timings': timings, 'fallback': ocr_info.get('tier') is None, 'invoice': invoice_data}
+
+
+def score(invoice_data, truth):
+    """Acertos de produtos (categoria + valor), pontos e cabeçalho contra o gabarito"""
+    predicted = Counter((product['category'], round(product['total_value'], 2))
+                        for product in invoice_data['eligible_products'])
+    expected = Counter((category, round(total, 2)) for category, total in truth['products'])
+    order_info = invoice_data['order_info']
+    return {
+        'true_positives': sum((predicted & expected).values()),
+        'predicted': sum(predicted.values()),
+        'expected': sum(expected.values()),
+        'points_exact': invoice_data['total_eligible_points'] == truth['points'],
+        'points_error': abs(invoice_data['total_eligible_points'] - truth['points']),
+        'order_number': re.sub(r'\D', '', str(order_info['numero_nota'])) == truth['order_number'],
+        'total_value': abs(order_info['valor_total_nota'] - truth['total_value']) < 0.005,
+    }
+
+
+def accuracy(scores):
+    true_positives = sum(s['true_positives'] for s in scores)
+    predicted = sum(s['predicted'] for s in scores)
+    expected = sum(s['expected'] for s in scores)
+    return {
+        'invoices': len(scores),
+        'product_precision': true_positives / predicted if predicted else None,
+        'product_recall': true_positives / expected if expected else None,
+        'points_exact_rate': sum(s['points_exact'] for s in scores) / len(scores),
+        'points_mean_abs_error': statistics.mean(s['points_error'] for s in scores),
+        'order_number_accuracy': sum(s['order_number'] for s in scores) / len(scores),
+        'total_value_accuracy': sum(s['total_value'] for s in scores) / len(scores),
+    }
+
+
+def stage_latencies(runs):
+    """Média, p50 e p95 (ms) de cada etapa nas imagens em que ela ocorreu"""
+    stages = {}
+    for run in runs:
+        for stage, elapsed in run['timings'].items():
+            stages.setdefault(stage, []).append(elapsed)
+    summary = {}
+    for stage, values in sorted(stages.items()):
+        ordered = sorted(values)
+        summary[stage] = {
+            'count': len(ordered),
+            'mean_ms': statistics.mean(ordered),
+            'p50_ms': ordered[len(ordered) // 2],
+            'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        }
+    return summary
+
+
+def peak_rss_mb(pid='self'):
+    """Pico de memória residente (VmHWM) de um processo, em MB (Linux)"""
+    try:
+        with open(f'/proc/{pid}/status', 'r', encoding='ascii') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == 'self':
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Corpus sintético de notas: latência, vazão, memória e acurácia')
+    parser.add_argument('--invoices', type=int, default=4, help='Notas geradas por layout e perfil')
+    parser.add_argument('--min-items', type=int, default=5)
+    parser.add_argument('--max-items', type=int, default=25)
+    parser.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=list(LAYOUTS))
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['clean', 'scan', 'photo'])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save-images', help='Gravar as imagens do corpus neste diretório')
+    parser.add_argument('--json', help='Gravar o resultado neste arquivo JSON')
+    args = parser.parse_args()
+
+    import app_complete
+    if not app_complete.TESSERACT_AVAILABLE:
+        print("⚠️ Tesseract não disponível: o pipeline devolve o texto simulado "
+              "e a acurácia não é significativa", file=sys.stderr)
+
+    corpus = build_corpus(app_complete, args)
+    if args.save_images:
+        os.makedirs(args.save_images, exist_ok=True)
+        for i, case in enumerate(corpus):
+            with open(os.path.join(args.save_images, f"{i:03d}_{case['scenario'].replace('/', '_')}.png"), 'wb') as f:
+                f.write(case['image'])
+
+    # Aquecimento fora da medição: processos do pool, imports pesados e modelo do Tesseract
+    if app_complete.TESSERACT_AVAILABLE:
+        app_complete.run_warm_up()
+
+    workers = app_complete.OCR_POOL.workers
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        runs = list(executor.map(lambda case: run_pipeline(app_complete, case), corpus))
+    elapsed = time.perf_counter() - start
+
+    # Acurácia do OCR e, como referência, da análise do texto original (sem erros de OCR)
+    scores = {}
+    text_scores = {}
+    for case, run in zip(corpus, runs):
+        scores.setdefault(case['scenario'], []).append(score(run['invoice'], case['truth']))
+        text_invoice = app_complete.process_invoice_text(app_complete.clean_ocr_text(case['text']))
+        text_scores.setdefault(case['scenario'].split('/')[0], []).append(score(text_invoice, case['truth']))
+
+    worker_rss = [peak_rss_mb(child.pid) for child in multiprocessing.active_children()]
+    worker_rss = [rss for rss in worker_rss if rss is not None]
+    result = {
+        'seed': args.seed,
+        'images': len(corpus),
+        'ocr_available': app_complete.TESSERACT_AVAILABLE,
+        'ocr_engine': app_complete.selected_engine(),
+        'pipeline_version': PIPELINE_VERSION,
+        'catalog': app_complete.CATALOG.current.describe(),
+        'cpus': os.cpu_count(),
+        'ocr_workers': workers,
+        'elapsed_s': elapsed,
+        'images_per_second': len(corpus) / elapsed,
+        'images_per_second_per_core': len(corpus) / elapsed / min(workers, os.cpu_count() or 1),
+        'ocr_fallbacks': sum(run['fallback'] for run in runs),
+        'peak_rss_mb': {
+            'server': peak_rss_mb(),
+            'ocr_worker_max': max(worker_rss) if worker_rss else None,
+        },
+        'stages': stage_latencies(runs),
+        'accuracy': accuracy([s for scenario_scores in scores.values() for s in scenario_scores]),
+        'scenarios': {scenario: accuracy(scenario_scores) for scenario, scenario_scores in sorted(scores.items())},
+        'text_only': {layout: accuracy(layout_scores) for layout, layout_scores in sorted(text_scores.items())},
+    }
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
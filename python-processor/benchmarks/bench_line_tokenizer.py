@@ -0,0 +1,103 @@
+# Benchmark: extract_numeric_values antigo (4 regex por chamada, até 2 chamadas por linha)
+# x tokenizador de uma passada (line_tokenizer.parse_line, uma vez por linha)
+#
+# Uso: python benchmarks/bench_line_tokenizer.py [--repeat 5] [--copies 200] [--json saida.json]
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from line_tokenizer import parse_line  # noqa: E402
+
+
+def legacy_extract_numeric_values(line):
+    """Implementação anterior, copiada como referência"""
+    values = {}
+    qty_match = re.search(r'(\d+(?:[,\.]\d+)?)\s*(?:UN|PC|M|ML|M2|KG|SC|RL|CX)', line, re.IGNORECASE)
+    if qty_match:
+        values['quantidade'] = float(qty_match.group(1).replace(',', '.'))
+    money_patterns = [
+        r'R\$\s*(\d+(?:[,\.]\d{3})*[,\.]\d{2})',
+        r'(\d+(?:[,\.]\d{3})*[,\.]\d{2})',
+        r'(\d+[,\.]\d{2})'
+    ]
+    money_values = []
+    for pattern in money_patterns:
+        for match in re.findall(pattern, line):
+            try:
+                money_values.append(float(match.replace('.', '').replace(',', '.')))
+            except ValueError:
+                continue
+    if len(money_values) >= 2:
+        values['valor_unitario'] = money_values[-2]
+        values['valor_total'] = money_values[-1]
+    elif len(money_values) == 1:
+        values['valor_total'] = money_values[0]
+    return values
+
+
+def load_lines(copies):
+    """Linhas da nota simulada (>= 10 caracteres), repetidas `copies` vezes"""
+    import app_complete
+    lines = [line.strip() for line in app_complete.generate_realistic_simulated_text().split('\n')]
+    return [line for line in lines if len(line) >= 10] * copies
+
+
+def legacy_pass(line):
+    # Produto elegível e lista geral: a mesma linha era analisada duas vezes
+    legacy_extract_numeric_values(line)
+    legacy_extract_numeric_values(line)
+
+
+def time_call(function, lines, repeat):
+    """Melhor tempo total (s) de `repeat` execuções sobre as linhas"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            function(line)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='extract_numeric_values antigo x tokenizador de linhas')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--copies', type=int, default=200)
+    parser.add_argument('--json', help='Gravar o resultado neste arquivo JSON')
+    args = parser.parse_args()
+
+    lines = load_lines(args.copies)
+    legacy_seconds = time_call(legacy_pass, lines, args.repeat)
+    tokenizer_seconds = time_call(parse_line, lines, args.repeat)
+
+    # Concordância de valor unitário/total com a implementação anterior
+    distinct = list(dict.fromkeys(lines))
+    agreement = 0
+    for line in distinct:
+        legacy = legacy_extract_numeric_values(line)
+        fields = parse_line(line)
+        agreement += (legacy.get('valor_unitario'), legacy.get('valor_total')) == (fields['unit_price'], fields['total'])
+
+    result = {
+        'lines': len(lines),
+        'legacy_us_per_line': legacy_seconds / len(lines) * 1e6,
+        'tokenizer_us_per_line': tokenizer_seconds / len(lines) * 1e6,
+        'speedup': legacy_seconds / tokenizer_seconds if tokenizer_seconds else None,
+        'distinct_lines': len(distinct),
+        'money_agreement': agreement / len(distinct),
+    }
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Benchmark: custo por requisição do limite de requisições (memória x SQLite)
+# Mede a latência de `check()` com muitos clientes distintos, o SQLite com
+# vários processos disputando o mesmo arquivo e o tamanho do estado depois de
+# uma rajada de IPs diferentes (que no dict antigo crescia para sempre).
+#
+# Uso: python benchmarks/bench_rate_limiter.py [--requests 20000] [--clients 5000] [--processes 4] [--json saida.json]
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import BACKEND_MEMORY, BACKEND_SQLITE, create_limiter  # noqa: E402
+
+
+def client_key(i, clients):
+    return f"10.{(i % clients) // 65536}.{(i % clients) // 256 % 256}.{i % 256}"
+
+
+def time_checks(limiter, requests, clients):
+    """Latências (µs) de `requests` chamadas alternando entre `clients` clientes"""
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        limiter.check(client_key(i, clients))
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        'mean_us': statistics.mean(ordered),
+        'p50_us': ordered[len(ordered) // 2],
+        'p99_us': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+def contended_worker(db_path, requests, clients, queue):
+    limiter = create_limiter(20, 60, backend=BACKEND_SQLITE, db_path=db_path)
+    start = time.perf_counter()
+    for i in range(requests):
+        limiter.check(client_key(i, clients))
+    queue.put(time.perf_counter() - start)
+
+
+def contended(db_path, processes, requests, clients):
+    """Requisições/s somadas de `processes` processos no mesmo arquivo SQLite"""
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=contended_worker, args=(db_path, requests, clients, queue))
+               for _ in range(processes)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    per_process = [queue.get() for _ in workers]
+    return {
+        'processes': processes,
+        'requests_per_second': processes * requests / elapsed,
+        'mean_us_per_request': statistics.mean(per_process) / requests * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Custo do limite de requisições por backend')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--max-clients', type=int, default=1000, help='Limite de estado (RATE_LIMIT_MAX_CLIENTS)')
+    parser.add_argument('--json', help='Gravar o resultado neste arquivo JSON')
+    args = parser.parse_args()
+
+    result = {'requests': args.requests, 'clients': args.clients, 'max_clients': args.max_clients}
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in (BACKEND_MEMORY, BACKEND_SQLITE):
+            limiter = create_limiter(20, 60, backend=backend, db_path=os.path.join(directory, f'{backend}.sqlite3'),
+                                     max_keys=args.max_clients)
+            result[backend] = summarize(time_checks(limiter, args.requests, args.clients))
+            if backend == BACKEND_SQLITE:
+                limiter.backend.evict()  # A limpeza periódica roda a cada 1000 requisições
+            result[backend]['clients_in_state'] = len(limiter.backend)
+
+        result['sqlite_contended'] = contended(os.path.join(directory, 'shared.sqlite3'), args.processes,
+                                               args.requests // args.processes, args.clients)
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
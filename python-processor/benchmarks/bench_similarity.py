@@ -0,0 +1,142 @@
+# Benchmark: SequenceMatcher (caminho antigo) x índice de trigramas
+# Compara custo por linha e a concordância de ranking/corte entre as duas medidas.
+# O corte antigo (0.6 na razão do SequenceMatcher) é fixo; --calibrate varre os
+# limiares do índice de trigramas e mostra qual reproduz melhor aquele corte.
+#
+# Uso: python benchmarks/bench_similarity.py [--repeat 5] [--lines 2000] [--calibrate] [--json saida.json]
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trigram_index import DEFAULT_SIMILARITY_THRESHOLD, TrigramIndex  # noqa: E402
+
+# Corte do caminho antigo (SequenceMatcher.ratio), referência da calibração
+LEGACY_SIMILARITY_THRESHOLD = 0.6
+
+
+def load_catalog():
+    """Catálogo e texto simulado do processador principal"""
+    import app_complete
+    return app_complete.PRODUTOS_FAST_DATABASE, app_complete.generate_realistic_simulated_text()
+
+
+def build_corpus(catalog, simulated_text, total_lines, seed=42):
+    """Linhas da nota simulada + linhas sintéticas com nomes, keywords e ruído"""
+    rng = random.Random(seed)
+    vocabulary = []
+    for info in catalog.values():
+        vocabulary.append(info['nome'])
+        vocabulary.extend(info['keywords'])
+    vocabulary.extend(['UN', 'SC', 'RL', 'R$ 45,90', 'R$ 1.234,56', '12MM', '3M', 'CNPJ', 'DESCONTO'])
+
+    corpus = [line.strip() for line in simulated_text.split('\n') if len(line.strip()) >= 10]
+    while len(corpus) < total_lines:
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(1, 6))]
+        corpus.append(' '.join(words))
+    return corpus[:total_lines]
+
+
+def sequence_matcher_scores(line, names):
+    """Caminho antigo: um SequenceMatcher por par (linha, nome)"""
+    line_lower = line.lower()
+    return [SequenceMatcher(None, line_lower, name.lower()).ratio() for name in names]
+
+
+def agreement(best_scores, threshold, legacy_threshold):
+    """Fração das linhas com a mesma decisão de corte nas duas medidas e total acima do limiar"""
+    same = 0
+    above = 0
+    for legacy_best, trigram_best in best_scores:
+        trigram_above = trigram_best > threshold
+        same += (legacy_best > legacy_threshold) == trigram_above
+        above += trigram_above
+    return same / len(best_scores), above
+
+
+def calibrate(best_scores, legacy_threshold, low=0.30, high=0.90, step=0.01):
+    """Limiar do índice de trigramas com maior concordância de corte (empate: o mais próximo do antigo)"""
+    candidates = []
+    for i in range(round((high - low) / step) + 1):
+        threshold = round(low + i * step, 2)
+        rate, above = agreement(best_scores, threshold, legacy_threshold)
+        candidates.append((rate, -abs(threshold - legacy_threshold), threshold, above))
+    rate, _, threshold, above = max(candidates)
+    return {'threshold': threshold, 'threshold_agreement': rate, 'lines_above_threshold_trigram_index': above}
+
+
+def time_call(function, corpus, repeat):
+    """Melhor tempo total (s) de `repeat` execuções sobre o corpus"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in corpus:
+            function(line)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SequenceMatcher x índice de trigramas')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--lines', type=int, default=2000)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLD,
+                        help='Limiar do índice de trigramas')
+    parser.add_argument('--legacy-threshold', type=float, default=LEGACY_SIMILARITY_THRESHOLD,
+                        help='Limiar do SequenceMatcher (referência)')
+    parser.add_argument('--calibrate', action='store_true',
+                        help='Varrer os limiares do índice contra o corte do SequenceMatcher')
+    parser.add_argument('--json', help='Gravar o resultado neste arquivo JSON')
+    args = parser.parse_args()
+
+    catalog, simulated_text = load_catalog()
+    names = [info['nome'] for info in catalog.values()]
+    index = TrigramIndex([[name] for name in names])
+    corpus = build_corpus(catalog, simulated_text, args.lines)
+
+    legacy_seconds = time_call(lambda line: sequence_matcher_scores(line, names), corpus, args.repeat)
+    index_seconds = time_call(index.similarities, corpus, args.repeat)
+
+    # Concordância: melhor nome e decisão de corte (acima/abaixo do limiar de cada medida)
+    top_agreement = 0
+    best_scores = []
+    for line in corpus:
+        legacy = sequence_matcher_scores(line, names)
+        trigram = index.similarities(line).tolist()
+        legacy_best = max(range(len(names)), key=legacy.__getitem__)
+        trigram_best = max(range(len(names)), key=trigram.__getitem__)
+        top_agreement += legacy_best == trigram_best
+        best_scores.append((legacy[legacy_best], trigram[trigram_best]))
+    cut_agreement, above_index = agreement(best_scores, args.threshold, args.legacy_threshold)
+    above_legacy = sum(legacy_best > args.legacy_threshold for legacy_best, _ in best_scores)
+
+    result = {
+        'lines': len(corpus),
+        'names': len(names),
+        'threshold': args.threshold,
+        'legacy_threshold': args.legacy_threshold,
+        'sequence_matcher_us_per_line': legacy_seconds / len(corpus) * 1e6,
+        'trigram_index_us_per_line': index_seconds / len(corpus) * 1e6,
+        'speedup': legacy_seconds / index_seconds if index_seconds else None,
+        'top1_agreement': top_agreement / len(corpus),
+        'threshold_agreement': cut_agreement,
+        'lines_above_threshold_sequence_matcher': above_legacy,
+        'lines_above_threshold_trigram_index': above_index,
+    }
+    if args.calibrate:
+        result['calibration'] = calibrate(best_scores, args.legacy_threshold)
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Benchmark: pytesseract (um processo por chamada) x motores tesserocr persistentes
+# Mede a latência por chamada num recibo pequeno, onde abrir o processo e
+# carregar o traineddata dominam o tempo, e numa página inteira.
+#
+# Uso: python benchmarks/bench_tesseract_engine.py [--calls 20] [--json saida.json]
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tesseract_engine  # noqa: E402
+from ocr_pipeline import TESSERACT_LANG, TESSERACT_PSM, TESSERACT_WHITELIST  # noqa: E402
+
+RECEIPT_LINES = [
+    'NOTA FISCAL DE VENDA N 000123456',
+    '01 PLACA GLASROC X 12MM UN 15 R$ 45,90',
+    'VALOR TOTAL: R$ 688,50',
+]
+
+
+def render_receipt(lines, width, line_height=40):
+    """Imagem sintética em preto e branco com as linhas informadas"""
+    image = Image.new('L', (width, line_height * (len(lines) + 2)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((20, line_height * (i + 1)), line, fill=0)
+    return image
+
+
+def time_calls(function, image, calls):
+    """Latências (ms) de `calls` chamadas, descartando a primeira (aquecimento)"""
+    function(image)
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        function(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        'mean_ms': statistics.mean(ordered),
+        'p50_ms': ordered[len(ordered) // 2],
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pytesseract x motores tesserocr persistentes')
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--json', help='Gravar o resultado neste arquivo JSON')
+    args = parser.parse_args()
+
+    images = {
+        'receipt': render_receipt(RECEIPT_LINES, 600),
+        'page': render_receipt(RECEIPT_LINES * 15, 1200),
+    }
+    engines = {}
+    if tesseract_engine.PYTESSERACT_AVAILABLE:
+        import pytesseract
+        config = tesseract_engine.tesseract_config(TESSERACT_PSM, TESSERACT_WHITELIST)
+        engines['pytesseract'] = lambda image: pytesseract.image_to_data(
+            image, lang=TESSERACT_LANG, config=config, output_type=pytesseract.Output.DICT)
+    if tesseract_engine.TESSEROCR_AVAILABLE:
+        pool = tesseract_engine.EnginePool(TESSERACT_LANG, {'tessedit_char_whitelist': TESSERACT_WHITELIST}, size=1)
+        engines['tesserocr'] = lambda image: pool.image_to_data(image, TESSERACT_PSM)
+    else:
+        print("⚠️ tesserocr não instalado: medindo só o pytesseract", file=sys.stderr)
+
+    result = {'calls': args.calls}
+    for image_name, image in images.items():
+        for engine_name, function in engines.items():
+            result[f'{engine_name}_{image_name}'] = summarize(time_calls(function, image, args.calls))
+        if len(engines) == 2:
+            result[f'overhead_saved_{image_name}_ms'] = (result[f'pytesseract_{image_name}']['mean_ms']
+                                                         - result[f'tesserocr_{image_name}']['mean_ms'])
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# Teste de carga: requisições/s e latência p95 de /process-order na nota simulada
+# Pode subir o servidor sozinho, para comparar o servidor de desenvolvimento
+# (app.run) com o gunicorn pré-fork (gunicorn.conf.py), ou medir um já rodando.
+# Os servidores iniciados aqui rodam sem limite de requisições e sem cache de
+# resultado, para medir o processamento e não o cache.
+#
+# Uso: python benchmarks/load_test.py [--server dev gunicorn] [--url http://127.0.0.1:5001]
+#                                     [--concurrency 8] [--duration 20] [--json saida.json]
+
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from PIL import Image, ImageDraw
+
+PROCESSOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROCESSOR_DIR)
+
+SERVER_COMMANDS = {
+    'dev': [sys.executable, 'app_complete.py'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app_complete:app'],
+}
+
+
+def simulated_invoice_png():
+    """Nota simulada do processador renderizada como PNG"""
+    import app_complete
+    lines = app_complete.generate_realistic_simulated_text().strip('\n').split('\n')
+    image = Image.new('L', (1200, 40 * (len(lines) + 2)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((40, 40 * (i + 1)), line, fill=0)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def post(url, body, timeout=120):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'image/png'}, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def wait_healthy(base_url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Servidor encerrou com código {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=2):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.3)
+    raise RuntimeError("Servidor não respondeu a /health")
+
+
+def run_load(base_url, body, concurrency, duration):
+    """`concurrency` clientes enviando a nota em sequência durante `duration` segundos"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            status = post(f"{base_url}/process-order", body)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'requests_per_second': len(ordered) / elapsed,
+        'mean_ms': statistics.mean(ordered) if ordered else None,
+        'p50_ms': ordered[len(ordered) // 2] if ordered else None,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else None,
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def measure_server(name, port, body, args):
+    """Subir o servidor, aquecer, medir e encerrar"""
+    env = dict(os.environ, PORT=str(port), RATE_LIMIT_ENABLED='false',
+               RESULT_CACHE_SIZE='0', RESULT_CACHE_DB='', NEAR_DUPLICATE_MODE='off')
+    process = subprocess.Popen(SERVER_COMMANDS[name], cwd=PROCESSOR_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_healthy(base_url, process)
+        run_load(base_url, body, args.concurrency, min(2, args.duration))  # Aquecimento
+        return run_load(base_url, body, args.concurrency, args.duration)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga de /process-order')
+    parser.add_argument('--server', nargs='*', choices=sorted(SERVER_COMMANDS), default=['dev', 'gunicorn'],
+                        help='Servidores a iniciar e medir (vazio: usar --url)')
+    parser.add_argument('--url', default='http://127.0.0.1:5001', help='Servidor já em execução')
+    parser.add_argument('--port', type=int, default=5091)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--json', help='Gravar o resultado neste arquivo JSON')
+    args = parser.parse_args()
+
+    body = simulated_invoice_png()
+    result = {'concurrency': args.concurrency, 'duration_s': args.duration, 'cpus': os.cpu_count()}
+    if args.server:
+        for name in args.server:
+            result[name] = measure_server(name, args.port, body, args)
+    else:
+        result['external'] = run_load(args.url.rstrip('/'), body, args.concurrency, args.duration)
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+# Catálogo de produtos elegíveis com recarga a quente
+# A fonte oficial é a tabela `produtos_elegiveis` (Supabase/PostgREST), editada
+# pelos administradores; offline, vale um snapshot local (JSON ou SQLite).
+# Cada versão do catálogo é compilada inteira (ProductMatcher + OCRCorrector)
+# numa thread de fundo e só então trocada atomicamente: requisições em
+# andamento continuam com o índice que já tinham, nunca um pela metade.
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+from ocr_corrections import OCRCorrector
+from product_matcher import EXACT_CODE_PATTERN, NAME_SIMILARITY_THRESHOLD, ProductMatcher, normalize_code
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TABLE = 'produtos_elegiveis'
+CATALOG_COLUMNS = ('codigo', 'nome', 'pontos_por_real', 'categoria', 'descricao', 'ativa', 'updated_at')
+
+SOURCE_BUILTIN = 'builtin'
+SOURCE_SUPABASE = 'supabase'
+SOURCE_SNAPSHOT = 'snapshot'
+
+
+def _is_active(row):
+    return row.get('ativa') not in (False, 0, '0', 'false', 'f')
+
+
+def rows_version(rows):
+    """Carimbo de versão: quantidade de linhas ativas + maior updated_at"""
+    active = [row for row in rows if _is_active(row)]
+    return f"{len(active)}:{max((str(row.get('updated_at') or '') for row in active), default='')}"
+
+
+class SupabaseSource:
+    """Tabela `produtos_elegiveis` pela API REST do Supabase (PostgREST)"""
+
+    name = SOURCE_SUPABASE
+
+    def __init__(self, url, key, table=CATALOG_TABLE, timeout=5):
+        self.endpoint = f"{url.rstrip('/')}/rest/v1/{table}"
+        self.headers = {'apikey': key, 'Authorization': f'Bearer {key}'}
+        self.timeout = timeout
+
+    def _get(self, columns):
+        import requests
+
+        response = requests.get(
+            self.endpoint,
+            params={'select': ','.join(columns), 'ativa': 'eq.true'},
+            headers=self.headers,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def version(self):
+        """Consulta leve (só codigo/updated_at) para saber se o catálogo mudou"""
+        return rows_version(self._get(('codigo', 'ativa', 'updated_at')))
+
+    def rows(self):
+        return self._get(CATALOG_COLUMNS)
+
+
+class SnapshotSource:
+    """Snapshot local do catálogo: JSON ({'version', 'rows'}) ou SQLite com a tabela `produtos_elegiveis`"""
+
+    name = SOURCE_SNAPSHOT
+
+    def __init__(self, path):
+        self.path = path
+        self.is_sqlite = os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3')
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def version(self):
+        if self.is_sqlite:
+            with sqlite3.connect(self.path) as db:
+                count, updated_at = db.execute(
+                    f'SELECT COUNT(*), MAX(updated_at) FROM {CATALOG_TABLE} WHERE ativa'
+                ).fetchone()
+            return f"{count}:{updated_at or ''}"
+        stat = os.stat(self.path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def rows(self):
+        if self.is_sqlite:
+            with sqlite3.connect(self.path) as db:
+                db.row_factory = sqlite3.Row
+                return [dict(row) for row in db.execute(f'SELECT * FROM {CATALOG_TABLE}')]
+        with open(self.path, 'r', encoding='utf-8') as snapshot:
+            return json.load(snapshot)['rows']
+
+    def write(self, rows, version):
+        """Gravar o snapshot JSON atomicamente (arquivo temporário + rename)"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.catalog-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as snapshot:
+                json.dump({'version': version, 'saved_at': time.time(), 'rows': rows}, snapshot, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+def catalog_from_rows(rows, base_catalog):
+    """Catálogo no formato interno a partir das linhas da tabela
+
+    Pontos, nome e categoria vêm da tabela. Keywords e padrões de código vêm do
+    catálogo embutido (pela chave ou por um código do fornecedor, como
+    DW00057); produtos novos recebem keywords derivadas do nome e do código.
+    """
+    base_by_code = {}
+    for key, info in base_catalog.items():
+        for keyword in info['keywords']:
+            code = normalize_code(keyword)
+            if EXACT_CODE_PATTERN.match(code):
+                base_by_code.setdefault(code, key)
+
+    catalog = {}
+    for row in rows:
+        if not _is_active(row) or not row.get('codigo'):
+            continue
+        code = normalize_code(row['codigo'])
+        base_key = code if code in base_catalog else base_by_code.get(code)
+        base = base_catalog.get(base_key, {})
+        name = row.get('nome') or base.get('nome') or code
+
+        keywords = list(base.get('keywords') or [name.lower()])
+        if EXACT_CODE_PATTERN.match(code) and code.lower() not in keywords:
+            keywords.append(code.lower())
+
+        catalog[base_key or code] = {
+            'nome': name,
+            'codigo': code,
+            'pontosPorReal': float(row.get('pontos_por_real') or base.get('pontosPorReal') or 1.0),
+            'categoria': row.get('categoria') or base.get('categoria') or code.lower(),
+            'keywords': keywords,
+            'codigo_patterns': list(base.get('codigo_patterns') or [r'\s+'.join(map(re.escape, name.upper().split()))]),
+            'variantes': list(base.get('variantes', [])),
+            'aliases': list(base.get('aliases', [])),
+        }
+    return catalog
+
+
+class CatalogIndex:
+    """Catálogo e todas as estruturas compiladas a partir dele (imutável depois de criado)"""
+
+    def __init__(self, catalog, version, source, similarity_threshold):
+        self.catalog = catalog
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+        # Catálogo da tabela: keyword ou código na própria linha é obrigatório
+        self.matcher = ProductMatcher(catalog, similarity_threshold=similarity_threshold,
+                                      require_line_hit=source != SOURCE_BUILTIN)
+        self.corrector = OCRCorrector(catalog)
+
+    def describe(self):
+        return {'version': self.version, 'source': self.source, 'products': len(self.catalog),
+                'loadedAt': self.loaded_at}
+
+
+class CatalogManager:
+    """Índice atual do catálogo + thread de fundo que detecta mudanças e troca o índice"""
+
+    def __init__(self, base_catalog, source=None, snapshot=None, refresh_seconds=300,
+                 similarity_threshold=NAME_SIMILARITY_THRESHOLD):
+        self.base_catalog = base_catalog
+        self.source = source
+        self.snapshot = snapshot
+        self.refresh_seconds = refresh_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread_pid = None
+        self._source_version = None
+
+        # Índice inicial sem rede: snapshot local (se houver) ou catálogo embutido
+        self._index = self._build(base_catalog, SOURCE_BUILTIN, SOURCE_BUILTIN)
+        if source is not None and snapshot is not None and snapshot.exists():
+            try:
+                self._load(snapshot)
+            except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+                logger.warning(f"⚠️ Snapshot do catálogo ilegível ({snapshot.path}): {e}")
+
+    @property
+    def current(self):
+        """Índice em uso (a troca é uma atribuição: leitores nunca veem um índice incompleto)"""
+        self.start()
+        return self._index
+
+    def warm_up(self, sample_text):
+        """Exercitar o índice atual num texto de exemplo (caches internos de regex), sem iniciar a thread"""
+        index = self._index
+        lines = index.corrector.correct(sample_text.upper()).split('\n')
+        scan = index.matcher.scan_lines(lines)
+        for i, line in enumerate(lines):
+            scan.identify(i, line.strip())
+
+    def _build(self, catalog, version, source_name):
+        return CatalogIndex(catalog, version, source_name, self.similarity_threshold)
+
+    def _load(self, source, version=None):
+        version = version or source.version()
+        rows = source.rows()
+        catalog = catalog_from_rows(rows, self.base_catalog)
+        if not catalog:
+            # Tabela vazia (ou bloqueada por RLS) não derruba a pontuação: manter o índice atual
+            logger.warning(f"⚠️ Catálogo '{source.name}' sem produtos ativos; mantendo a versão {self._index.version}")
+            return False
+        index = self._build(catalog, version, source.name)
+        self._index = index
+        self._source_version = version
+        logger.info(f"📦 Catálogo '{source.name}' versão {version} carregado ({len(catalog)} produtos)")
+        if source is not self.snapshot and self.snapshot is not None and not self.snapshot.is_sqlite:
+            try:
+                self.snapshot.write(rows, version)
+            except OSError as e:
+                logger.warning(f"⚠️ Não foi possível gravar o snapshot do catálogo: {e}")
+        return True
+
+    def refresh(self):
+        """Recarregar se a versão da fonte mudou (True quando o índice foi trocado)"""
+        if self.source is None:
+            return False
+        with self._lock:
+            try:
+                version = self.source.version()
+                if version == self._source_version:
+                    return False
+                return self._load(self.source, version)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao atualizar o catálogo ({self.source.name}): {e}")
+                return False
+
+    def _run(self):
+        while True:
+            self.refresh()
+            if self._stop.wait(self.refresh_seconds):
+                return
+
+    def start(self):
+        """Iniciar a thread de atualização (uma por processo, inclusive após fork)"""
+        pid = os.getpid()
+        if self.source is None or self.refresh_seconds <= 0 or self._thread_pid == pid:
+            return
+        with self._start_lock:
+            if self._thread_pid == pid:
+                return
+            if self._thread_pid is not None:
+                # Processo filho: a trava herdada do pai pode ter sido copiada fechada
+                self._lock = threading.Lock()
+            self._thread_pid = pid
+            threading.Thread(target=self._run, name='catalog-refresh', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def catalog_source_from_env(supabase_config, snapshot):
+    """Fonte do catálogo conforme CATALOG_SOURCE (auto | supabase | snapshot | builtin)"""
+    mode = os.getenv('CATALOG_SOURCE', 'auto').lower()
+    url = (supabase_config or {}).get('url')
+    key = (supabase_config or {}).get('anon_key')
+    if mode in ('auto', SOURCE_SUPABASE) and url and key:
+        return SupabaseSource(url, key, timeout=float(os.getenv('CATALOG_TIMEOUT', '5')))
+    if mode == SOURCE_SUPABASE:
+        logger.warning("⚠️ CATALOG_SOURCE=supabase sem URL/chave do Supabase: usando o catálogo embutido")
+    if mode in ('auto', SOURCE_SNAPSHOT) and snapshot is not None and snapshot.exists():
+        return snapshot
+    return None
@@ -0,0 +1,131 @@
+# Armazenamento local de NF-e por chave de acesso (substituto local da consulta à SEFAZ)
+# As NF-e recebidas em XML (/process-nfe, só de clientes com a API key) ficam
+# gravadas em SQLite já estruturadas; um diretório opcional com os XMLs autorizados (<chave>.xml,
+# <chave>-nfe.xml ou <chave>-procNFe.xml) também é consultado. Com a chave lida
+# do código de barras, a nota sai daqui sem OCR.
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from access_key import is_valid_access_key
+from nfe_xml import InvalidNFe, iter_nfe
+
+logger = logging.getLogger(__name__)
+
+# Códigos de status no formato da consulta de situação da SEFAZ
+STATUS_AUTHORIZED = ('100', 'Autorizado o uso da NF-e')
+STATUS_NOT_FOUND = ('217', 'NF-e não consta na base de dados')
+STATUS_INVALID_KEY = ('236', 'Chave de acesso com dígito verificador inválido')
+
+_XML_FILE_NAMES = ('{key}.xml', '{key}-nfe.xml', '{key}-procNFe.xml')
+
+
+class DocumentStore:
+    """NF-e estruturadas por chave de acesso: SQLite + diretório de XMLs opcional"""
+
+    def __init__(self, db_path=None, xml_dir=None):
+        self.db_path = db_path
+        self.xml_dir = xml_dir
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    def _connection(self):
+        """Conexão SQLite do processo atual (aberta no primeiro uso, inclusive após fork)"""
+        if not self.db_path:
+            return None
+        if self._db_pid != os.getpid():
+            self._db_pid = os.getpid()
+            try:
+                self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS nfe_documents ('
+                    'access_key TEXT PRIMARY KEY, document TEXT NOT NULL, created_at REAL NOT NULL)'
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Armazenamento de NF-e indisponível ({self.db_path}): {e}")
+                self._db = None
+        return self._db
+
+    def put(self, document, replace=False):
+        """Gravar uma NF-e estruturada (ignorada se não tiver chave de acesso válida)
+
+        Sem `replace`, uma chave já gravada não é sobrescrita. Só grave documentos de
+        origem confiável (API key ou diretório do operador): o atalho do código de
+        barras devolve o que estiver aqui sem OCR.
+        """
+        if not is_valid_access_key(document.get('access_key')):
+            return False
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return False
+            try:
+                cursor = db.execute(
+                    f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO nfe_documents "
+                    '(access_key, document, created_at) VALUES (?, ?, ?)',
+                    (document['access_key'], json.dumps(document), time.time())
+                )
+                db.commit()
+                return cursor.rowcount > 0
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Erro ao gravar NF-e {document['access_key']}: {e}")
+                return False
+
+    def _from_xml_dir(self, access_key):
+        """NF-e do diretório de XMLs, se existir arquivo para a chave"""
+        if not self.xml_dir:
+            return None
+        for file_name in _XML_FILE_NAMES:
+            path = os.path.join(self.xml_dir, file_name.format(key=access_key))
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, 'rb') as xml_file:
+                    for document in iter_nfe(xml_file):
+                        if document['access_key'] == access_key:
+                            return document
+            except (OSError, InvalidNFe) as e:
+                logger.warning(f"⚠️ XML da NF-e {access_key} ilegível: {e}")
+        return None
+
+    def get(self, access_key):
+        """NF-e estruturada pela chave de acesso, ou None
+
+        O diretório de XMLs (autorizados, mantido pelo operador) tem precedência
+        sobre os XMLs recebidos pela API e substitui o que estiver gravado.
+        """
+        document = self._from_xml_dir(access_key)
+        if document:
+            self.put(document, replace=True)
+            return document
+
+        with self._lock:
+            db = self._connection()
+            if db is not None:
+                try:
+                    row = db.execute(
+                        'SELECT document FROM nfe_documents WHERE access_key = ?', (access_key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Erro ao ler NF-e {access_key}: {e}")
+                    row = None
+                if row:
+                    return json.loads(row[0])
+        return None
+
+    def consult(self, access_key):
+        """Situação da NF-e no formato da consulta da SEFAZ (cStat/xMotivo), a partir do armazenamento local"""
+        if not is_valid_access_key(access_key):
+            status, reason = STATUS_INVALID_KEY
+            document = None
+        else:
+            document = self.get(access_key)
+            status, reason = STATUS_AUTHORIZED if document else STATUS_NOT_FOUND
+        return {'chNFe': access_key, 'cStat': status, 'xMotivo': reason, 'document': document}
@@ -0,0 +1,56 @@
+# Modo de produção: gunicorn pré-fork com a aplicação pré-carregada no master
+# O catálogo, o índice de produtos e as regex são compilados uma vez no master
+# e herdados pelos workers via copy-on-write; cada worker reinicia depois de
+# N requisições (com jitter, para não reiniciarem todos juntos).
+#
+# Uso: gunicorn -c gunicorn.conf.py app_complete:app
+
+import gc
+import multiprocessing
+import os
+
+CPU_COUNT = multiprocessing.cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', f"{os.getenv('HOST', '127.0.0.1')}:{os.getenv('PORT', '5001')}")
+
+# Poucos processos com várias threads: as requisições passam a maior parte do
+# tempo esperando o pool de OCR, que é quem usa as CPUs
+workers = int(os.getenv('WEB_CONCURRENCY', str(max(2, CPU_COUNT // 2))))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Cada worker tem o próprio pool de OCR: dividir as CPUs entre eles em vez de multiplicar
+os.environ.setdefault('OCR_POOL_WORKERS', str(max(1, CPU_COUNT // workers)))
+# O aquecimento do OCR roda em cada worker (post_fork), não no master
+os.environ['PREFORK_SERVER'] = 'true'
+
+preload_app = True
+
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', str(max_requests // 10)))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    import app_complete
+
+    # Métricas somadas entre os workers começam do zero a cada subida do servidor
+    app_complete.METRICS.reset()
+    # Caches de regex do índice de produtos preenchidos antes do fork
+    app_complete.CATALOG.warm_up(app_complete.generate_realistic_simulated_text())
+    # Objetos do preload fora da coleta de lixo: a GC não toca nas páginas herdadas pelos workers
+    gc.freeze()
+    server.log.info(f"🚀 {workers} workers × {threads} threads, "
+                    f"{os.environ['OCR_POOL_WORKERS']} processos de OCR por worker")
+
+
+def post_fork(server, worker):
+    import app_complete
+    app_complete.start_warm_up()
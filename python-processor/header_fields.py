@@ -0,0 +1,116 @@
+# Campos do cabeçalho da nota (número, data de emissão, cliente, valor total)
+# Uma regex pré-compilada com grupos nomeados percorre o texto uma única vez e
+# preenche todos os campos. Só as faixas de cabeçalho e rodapé do documento
+# são lidas: o corpo com os itens (a maior parte de notas longas) é ignorado.
+
+import os
+import re
+from datetime import datetime
+
+# Faixas lidas: as primeiras e as últimas linhas (o maior entre o mínimo e a fração do documento)
+HEADER_BAND_LINES = int(os.getenv('HEADER_BAND_LINES', '15'))
+HEADER_BAND_RATIO = float(os.getenv('HEADER_BAND_RATIO', '0.2'))
+
+# Confiança do campo conforme o padrão que o encontrou
+_GROUP_FIELDS = {
+    'numero_nf': ('numero_nota', 0.9),
+    'numero_nfe': ('numero_nota', 0.7),
+    'numero_symbol': ('numero_nota', 0.6),
+    'numero_label': ('numero_nota', 0.6),
+    'data_emissao': ('data_emissao', 0.95),
+    'data_label': ('data_emissao', 0.9),
+    'data_br': ('data_emissao', 0.6),
+    'data_iso': ('data_emissao', 0.5),
+    'cliente_label': ('cliente', 0.9),
+    'cliente_razao': ('cliente', 0.8),
+    'cliente_cnpj': ('cliente', 0.5),
+    'total_nota': ('valor_total_nota', 0.95),
+    'total_valor': ('valor_total_nota', 0.9),
+    'total_liquido': ('valor_total_nota', 0.8),
+    'total': ('valor_total_nota', 0.6),
+}
+
+# Campo encontrado fora da faixa esperada (total no cabeçalho, número no rodapé) vale menos
+OUT_OF_BAND_FACTOR = 0.8
+_HEADER_FIELDS = ('numero_nota', 'data_emissao', 'cliente')
+
+_MONEY = r'(?:\d{1,3}(?:[.,]\d{3})+|\d+)[.,]\d{2}'
+# Número da nota, também no formato do DANFE (000.123.456)
+_NUMBER = r'\d+(?:\.\d{3})*'
+_DATE_BR = r'\d{1,2}[/-]\d{1,2}[/-]\d{4}'
+
+_HEADER_PATTERN = re.compile(rf"""
+    NOTA\s+FISCAL[^\d\n]*(?P<numero_nf>{_NUMBER})
+  | \bNF(?:-?E)?\b[^\d\n]*(?P<numero_nfe>{_NUMBER})
+  | \bN[º°ª]\.?\s*(?P<numero_symbol>{_NUMBER})
+  | N[ÚU]MERO[^\d\n]*(?P<numero_label>{_NUMBER})
+  | (?:DATA\s+D[AE]\s+)?EMISS[ÃA]O[^\d\n]{{0,30}}(?P<data_emissao>{_DATE_BR})
+  | DATA[^\d\n]{{0,30}}(?P<data_label>{_DATE_BR})
+  | (?<!\d)(?P<data_br>{_DATE_BR})(?!\d)
+  | (?<!\d)(?P<data_iso>\d{{4}}[/-]\d{{1,2}}[/-]\d{{1,2}})(?!\d)
+  | \bCLIENTE\b[:\t ]*\n?[\t ]*(?P<cliente_label>[^\n\r]+)
+  | RAZ[ÃA]O\s+SOCIAL[:\t ]*\n?[\t ]*(?P<cliente_razao>[^\n\r]+)
+  | CNPJ[:\t ]+[\d./-]+[\t ]+(?P<cliente_cnpj>[^\n\r]+)
+  | VALOR\s+TOTAL\s+DA\s+NOTA[^\d\n]*?(?P<total_nota>{_MONEY})
+  | VALOR\s+TOTAL[^\d\n]*?(?P<total_valor>{_MONEY})
+  | L[ÍI]QUIDO[^\d\n]*?(?P<total_liquido>{_MONEY})
+  | TOTAL[:\s]*R?\$?\s*(?P<total>{_MONEY})
+""", re.IGNORECASE | re.VERBOSE)
+
+
+def _parse_date(text):
+    """'30/06/2025' ou '2025-06-30' -> '2025-06-30' (None se a data não existir)"""
+    parts = [int(part) for part in re.split(r'[/-]', text)]
+    year, month, day = parts if parts[0] > 31 else parts[::-1]
+    try:
+        return datetime(year, month, day).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _parse_money(text):
+    return float(re.sub(r'[.,]', '', text[:-3]) + '.' + text[-2:])
+
+
+def _value(field, text):
+    if field == 'data_emissao':
+        return _parse_date(text)
+    if field == 'valor_total_nota':
+        return _parse_money(text)
+    if field == 'numero_nota':
+        return f"NF-{text.replace('.', '')}"
+    customer = text.strip()
+    return customer if len(customer) > 5 else None  # Nome válido
+
+
+def bands(text):
+    """Faixas de cabeçalho e rodapé do texto ((nome, trecho), ...)"""
+    lines = text.split('\n')
+    size = max(HEADER_BAND_LINES, int(len(lines) * HEADER_BAND_RATIO))
+    if len(lines) <= 2 * size:
+        return [('header', text)]
+    return [('header', '\n'.join(lines[:size])), ('footer', '\n'.join(lines[-size:]))]
+
+
+def extract_header(text):
+    """Campos do cabeçalho e a confiança de cada um ({campo: valor}, {campo: confiança})
+
+    Campos não encontrados ficam None, com confiança 0.0.
+    """
+    fields = dict.fromkeys(('numero_nota', 'data_emissao', 'cliente', 'valor_total_nota'))
+    confidence = dict.fromkeys(fields, 0.0)
+
+    band_texts = bands(text)
+    for band, band_text in band_texts:
+        for match in _HEADER_PATTERN.finditer(band_text):
+            field, score = _GROUP_FIELDS[match.lastgroup]
+            if len(band_texts) > 1 and (band == 'footer') == (field in _HEADER_FIELDS):
+                score *= OUT_OF_BAND_FACTOR
+            if score <= confidence[field]:
+                continue  # Empate: vale a primeira ocorrência
+            value = _value(field, match.group(match.lastgroup))
+            if value is not None:
+                fields[field] = value
+                confidence[field] = round(score, 2)
+
+    return fields, confidence
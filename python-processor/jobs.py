@@ -0,0 +1,187 @@
+# Fila de jobs assíncronos para processamento de notas fiscais
+# O cliente submete a imagem, recebe um id na hora e consulta status/resultado.
+# Jobs e resultados ficam numa tabela SQLite com TTL, compartilhada entre os
+# workers do gunicorn: o GET pode cair num worker diferente do POST, e o
+# resultado sobrevive à reciclagem do worker (max_requests). A execução fica no
+# worker que recebeu o job; se ele morrer antes de concluir, o job aparece como
+# falho em vez de ficar "running" para sempre.
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+_COLUMNS = ('id', 'status', 'owner', 'created_at', 'started_at', 'finished_at', 'timings', 'result', 'error',
+            'error_response')
+_JSON_COLUMNS = ('timings', 'result', 'error_response')
+
+
+class JobQueueFull(Exception):
+    """Muitos jobs aguardando execução"""
+
+
+def default_error_response(error):
+    """Resposta (payload, status HTTP) de um job que falhou"""
+    return {'success': False, 'error': str(error)}, 500
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """Executor de jobs (threads do worker) + tabela SQLite de jobs com expiração (TTL)"""
+
+    def __init__(self, workers=2, ttl_seconds=900, max_pending=100, db_path=':memory:',
+                 error_response=default_error_response):
+        self.ttl_seconds = ttl_seconds
+        self.max_pending = max_pending
+        self.db_path = db_path
+        # Exceções não atravessam processos: a resposta de erro é gravada na falha
+        self.error_response = error_response
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self._workers = workers
+        self._executor = None
+        self._executor_pid = None
+
+    def _connection(self):
+        """Conexão SQLite do processo atual (aberta no primeiro uso, inclusive após fork; chamado com o lock)"""
+        if self._db_pid != os.getpid():
+            self._db_pid = os.getpid()
+            self._db = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT NOT NULL, owner TEXT NOT NULL, created_at REAL NOT NULL, '
+                'started_at REAL, finished_at REAL, timings TEXT NOT NULL, result TEXT, error TEXT, '
+                'error_response TEXT)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)')
+        return self._db
+
+    def _get_executor(self):
+        """Executor do processo atual (threads não sobrevivem ao fork; chamado com o lock)"""
+        if self._executor_pid != os.getpid():
+            self._executor_pid = os.getpid()
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='invoice-job')
+            self._pending = 0
+        return self._executor
+
+    @staticmethod
+    def owner():
+        """Identificação do processo que executa o job (máquina:pid)"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _update(self, job_id, **fields):
+        values = [json.dumps(value) if name in _JSON_COLUMNS else value for name, value in fields.items()]
+        with self._lock:
+            self._connection().execute(
+                f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?", (*values, job_id)
+            )
+
+    def submit(self, func, *args):
+        """Enfileirar `func(*args, timings=...)` e retornar o id do job"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            executor = self._get_executor()
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"Fila de jobs cheia ({self.max_pending} pendentes)")
+            db = self._connection()
+            self._purge_expired(db)
+            db.execute(
+                'INSERT INTO jobs (id, status, owner, created_at, timings) VALUES (?, ?, ?, ?, ?)',
+                (job_id, JOB_QUEUED, self.owner(), time.time(), '{}')
+            )
+            self._pending += 1
+
+        executor.submit(self._run, job_id, func, args)
+        return job_id
+
+    def _run(self, job_id, func, args):
+        timings = {}
+        try:
+            with self._lock:
+                row = self._connection().execute('SELECT created_at FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            started_at = time.time()
+            timings['queue'] = round((started_at - row[0]) * 1000, 2)
+            self._update(job_id, status=JOB_RUNNING, started_at=started_at, timings=timings)
+            try:
+                result = func(*args, timings=timings)
+            except Exception as e:
+                logger.error(f"❌ Job {job_id} falhou: {e}")
+                self._update(job_id, status=JOB_FAILED, finished_at=time.time(), timings=timings,
+                             error=str(e), error_response=list(self.error_response(e)))
+            else:
+                self._update(job_id, status=JOB_DONE, finished_at=time.time(), timings=timings, result=result)
+        except sqlite3.Error as e:
+            logger.error(f"❌ Job {job_id}: falha ao gravar o estado: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    @property
+    def pending(self):
+        """Jobs deste processo aguardando ou em execução"""
+        return self._pending
+
+    def _purge_expired(self, db):
+        """Remover jobs concluídos há mais de `ttl_seconds` (chamado com o lock)"""
+        db.execute('DELETE FROM jobs WHERE finished_at < ?', (time.time() - self.ttl_seconds,))
+
+    def get(self, job_id):
+        """Job pelo id (criado em qualquer worker), ou None se não existir/expirado"""
+        with self._lock:
+            db = self._connection()
+            self._purge_expired(db)
+            row = db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        for name in _JSON_COLUMNS:
+            job[name] = json.loads(job[name]) if job[name] is not None else None
+
+        if job['status'] in (JOB_QUEUED, JOB_RUNNING) and self._orphaned(job['owner']):
+            # Worker reciclado ou morto com o job em andamento: o resultado não virá mais
+            error = 'Job interrompido: o worker que o executava foi encerrado'
+            job.update(status=JOB_FAILED, finished_at=time.time(), error=error,
+                       error_response=[{'success': False, 'error': f'{error}, envie a nota novamente'}, 503])
+            self._update(job_id, **{name: job[name] for name in ('status', 'finished_at', 'error', 'error_response')})
+        return job
+
+    def _orphaned(self, owner):
+        host, _, pid = owner.rpartition(':')
+        return host == socket.gethostname() and not _process_alive(int(pid))
+
+    @staticmethod
+    def describe(job):
+        """Status público do job (sem o resultado)"""
+        return {
+            'jobId': job['id'],
+            'status': job['status'],
+            'timings': dict(job['timings']),
+            'createdAt': job['created_at'],
+            'startedAt': job['started_at'],
+            'finishedAt': job['finished_at'],
+            'error': job['error']
+        }
@@ -0,0 +1,160 @@
+# Detecção de layout da nota fiscal por morfologia (OpenCV)
+# Encontra os blocos de texto (e a tabela de itens) na imagem binarizada para
+# que o Tesseract leia só essas regiões, descartando logotipos, carimbos,
+# códigos de barras e margens. As linhas lidas em cada região são remontadas
+# em ordem de leitura pela posição vertical, reproduzindo a estrutura de
+# linhas da leitura da página inteira.
+
+import statistics
+
+import cv2
+
+# Modos de segmentação do Tesseract usados por tipo de região
+PSM_SINGLE_COLUMN = 4
+PSM_BLOCK = 6
+PSM_SINGLE_LINE = 7
+
+REGION_TABLE = 'table'
+REGION_BLOCK = 'block'
+REGION_LINE = 'line'
+
+_REGION_PSM = {
+    REGION_TABLE: PSM_SINGLE_COLUMN,
+    REGION_BLOCK: PSM_BLOCK,
+    REGION_LINE: PSM_SINGLE_LINE,
+}
+
+# Regiões com mais tinta que isso são logotipos ou carimbos preenchidos
+MAX_INK_DENSITY = 0.45
+
+
+def detect_text_regions(binary, min_area_ratio=0.0005, padding=4):
+    """Regiões de texto da imagem binarizada (texto escuro sobre fundo claro) em ordem de leitura"""
+    height, width = binary.shape[:2]
+    _, ink = cv2.threshold(binary, 127, 255, cv2.THRESH_BINARY_INV)
+
+    # Linhas de texto: fechar na horizontal junta caracteres e palavras
+    line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(15, width // 50), 3))
+    lines_mask = cv2.morphologyEx(ink, cv2.MORPH_CLOSE, line_kernel)
+    contours, _ = cv2.findContours(lines_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    line_boxes = [box for box in map(cv2.boundingRect, contours) if box[2] >= 10 and box[3] >= 6]
+    if not line_boxes:
+        return []
+    line_height = statistics.median(box[3] for box in line_boxes)
+
+    # Blocos: dilatar ~1,5 linha na vertical junta linhas consecutivas; ~3 caracteres
+    # na horizontal junta as colunas da tabela de itens na mesma região
+    block_kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(15, int(line_height * 3)), max(3, int(line_height * 1.6) + 1))
+    )
+    blocks_mask = cv2.dilate(lines_mask, block_kernel)
+    contours, _ = cv2.findContours(blocks_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    regions = []
+    min_area = min_area_ratio * width * height
+    for x, y, w, h in map(cv2.boundingRect, contours):
+        if w * h < min_area or h < line_height * 0.5 or w < line_height:
+            continue
+        if ink[y:y + h, x:x + w].mean() / 255 > MAX_INK_DENSITY:
+            continue
+
+        inside = [(ly, lh) for lx, ly, lw, lh in line_boxes
+                  if x <= lx + lw / 2 <= x + w and y <= ly + lh / 2 <= y + h]
+        if not inside:
+            continue
+        # Uma única "linha" muito mais alta que o texto: código de barras, assinatura ou carimbo
+        if len(inside) == 1 and inside[0][1] > line_height * 2.5:
+            continue
+        # Linhas de texto distintas (as colunas da mesma linha ficam na mesma faixa)
+        line_count = len({round((ly + lh / 2) / line_height) for ly, lh in inside})
+        x0, y0 = max(0, x - padding), max(0, y - padding)
+        x1, y1 = min(width, x + w + padding), min(height, y + h + padding)
+        regions.append({
+            'box': (x0, y0, x1 - x0, y1 - y0),
+            'lines': line_count,
+            'kind': REGION_LINE if line_count == 1 else REGION_BLOCK
+        })
+
+    # Tabela de itens: o bloco com mais linhas de texto (pelo menos 3)
+    multiline = [region for region in regions if region['kind'] == REGION_BLOCK and region['lines'] >= 3]
+    if multiline:
+        max(multiline, key=lambda region: region['lines'])['kind'] = REGION_TABLE
+
+    for region in regions:
+        region['psm'] = _REGION_PSM[region['kind']]
+
+    regions.sort(key=lambda region: (region['box'][1], region['box'][0]))
+    return regions
+
+
+def lines_from_data(data, offset=(0, 0)):
+    """Linhas (topo, altura, esquerda, texto, confianças, bloco) da saída por palavra do Tesseract"""
+    offset_x, offset_y = offset
+    lines = {}
+    for i, word in enumerate(data['text']):
+        word = (word or '').strip()
+        if int(data['level'][i]) != 5 or not word:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        left = int(data['left'][i]) + offset_x
+        top = int(data['top'][i]) + offset_y
+        bottom = top + int(data['height'][i])
+        line = lines.setdefault(key, {'top': top, 'bottom': bottom, 'left': left, 'words': [], 'conf': [],
+                                      'block': (offset, data['block_num'][i])})
+        line['top'] = min(line['top'], top)
+        line['bottom'] = max(line['bottom'], bottom)
+        line['left'] = min(line['left'], left)
+        line['words'].append((left, word))
+        confidence = float(data['conf'][i])
+        if confidence >= 0:
+            line['conf'].append(confidence)
+
+    return [{
+        'top': line['top'],
+        'height': line['bottom'] - line['top'],
+        'left': line['left'],
+        'text': ' '.join(word for _, word in sorted(line['words'])),
+        'conf': line['conf'],
+        'block': line['block']
+    } for line in lines.values()]
+
+
+def merge_lines(lines):
+    """Remontar as linhas de todas as regiões em ordem de leitura (mesma altura = mesma linha).
+    Linha em branco na troca de bloco, como no image_to_string (o contexto de ±2 linhas conta com ela)"""
+    if not lines:
+        return []
+    tolerance = statistics.median(line['height'] for line in lines) * 0.5
+
+    rows = []
+    for line in sorted(lines, key=lambda line: line['top'] + line['height'] / 2):
+        center = line['top'] + line['height'] / 2
+        if rows and abs(center - rows[-1]['center']) <= tolerance:
+            rows[-1]['lines'].append(line)
+            rows[-1]['blocks'].add(line['block'])
+        else:
+            rows.append({'center': center, 'lines': [line], 'blocks': {line['block']}})
+
+    merged = []
+    for i, row in enumerate(rows):
+        if i and not row['blocks'] & rows[i - 1]['blocks']:
+            merged.append('')
+        merged.append(' '.join(line['text'] for line in sorted(row['lines'], key=lambda line: line['left'])))
+    return merged
+
+
+def crop_region(image, region):
+    """Recortar a região (PIL) para OCR"""
+    x, y, w, h = region['box']
+    return image.crop((x, y, x + w, y + h))
+
+
+def regions_bounding_box(regions):
+    """Retângulo que envolve todas as regiões"""
+    x0 = min(region['box'][0] for region in regions)
+    y0 = min(region['box'][1] for region in regions)
+    x1 = max(region['box'][0] + region['box'][2] for region in regions)
+    y1 = max(region['box'][1] + region['box'][3] for region in regions)
+    return {'box': (x0, y0, x1 - x0, y1 - y0), 'lines': sum(r['lines'] for r in regions),
+            'kind': REGION_BLOCK, 'psm': PSM_BLOCK}
+
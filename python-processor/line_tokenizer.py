@@ -0,0 +1,129 @@
+# Tokenizador de linhas de item da nota fiscal
+# Cada linha é percorrida uma única vez por um padrão pré-compilado, que emite
+# tokens tipados (código, unidade, quantidade, valores monetários...). Os
+# campos do item (código, descrição, unidade, quantidade, valor unitário e
+# total) saem desses tokens e são reaproveitados por todas as etapas do parser.
+
+import re
+
+# Unidades comerciais reconhecidas como coluna (palavra isolada, não "12MM")
+UNITS = frozenset({'UN', 'PC', 'M', 'ML', 'M2', 'KG', 'SC', 'RL', 'CX'})
+
+TOKEN_CURRENCY = 'currency'
+TOKEN_MONEY = 'money'
+TOKEN_NUMBER = 'number'
+TOKEN_DIMENSION = 'dimension'
+TOKEN_UNIT = 'unit'
+TOKEN_CODE = 'code'
+TOKEN_WORD = 'word'
+
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<currency>R\$)
+    # 1.234,56 | 1234,56 | 45.90 (nunca o meio de um número maior, como um CNPJ)
+  | (?P<money>(?<![\d.,])(?:\d{1,3}(?:[.,]\d{3})+|\d+)[.,]\d{2}(?![.,]?\d))
+    # 15 | 12.345.678, com sufixo opcional (12MM, 20KG, 150G/M²)
+  | (?P<number>\d+(?:[.,]\d+)*)(?P<suffix>[^\W\d_][\w/]*)?
+  | (?P<word>[^\W\d_][\w/]*)
+""", re.VERBOSE)
+
+_LETTER_CODE = re.compile(r'[A-Z]{2}\d{3,}')  # DW00057, GR001
+_NUMERIC_CODE = re.compile(r'\d{4,6}')
+
+
+def _money_value(text):
+    """'3.302,50' / '45.90' -> float (os dois últimos dígitos são os centavos)"""
+    return float(re.sub(r'[.,]', '', text[:-3]) + '.' + text[-2:])
+
+
+def _number_value(text):
+    try:
+        return float(text.replace(',', '.'))
+    except ValueError:
+        return None  # 12.345.678 (documento, não quantidade)
+
+
+def tokenize(line):
+    """Tokens (tipo, texto, valor, início, fim) da linha, numa única passada"""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(line):
+        kind = match.lastgroup
+        text = match.group()
+        value = None
+        if kind == 'money':
+            kind, value = TOKEN_MONEY, _money_value(text)
+        elif kind == 'currency':
+            kind = TOKEN_CURRENCY
+        elif match.group('number') is not None:
+            if match.group('suffix'):
+                kind = TOKEN_DIMENSION
+            else:
+                kind = TOKEN_NUMBER
+                value = _number_value(text)
+        else:
+            upper = text.upper()
+            if upper in UNITS:
+                kind, value = TOKEN_UNIT, upper
+            elif _LETTER_CODE.fullmatch(upper):
+                kind, value = TOKEN_CODE, upper
+            else:
+                kind = TOKEN_WORD
+        tokens.append((kind, text, value, match.start(), match.end()))
+    return tokens
+
+
+def _product_code(tokens):
+    """Código alfanumérico (DW00057) ou, na falta, numérico de 4 a 6 dígitos"""
+    for kind, text, value, _, _ in tokens:
+        if kind == TOKEN_CODE:
+            return value
+    for kind, text, value, _, _ in tokens:
+        if kind == TOKEN_NUMBER and _NUMERIC_CODE.fullmatch(text):
+            return text
+    return None
+
+
+def _quantity(tokens, money_count):
+    """(unidade, quantidade, índice do token): número logo após a unidade (UN 15) ou logo antes (15 UN)"""
+    for i, (kind, _, unit, _, _) in enumerate(tokens):
+        if kind != TOKEN_UNIT:
+            continue
+        if i + 1 < len(tokens):
+            next_kind, _, next_value, _, _ = tokens[i + 1]
+            if next_kind == TOKEN_NUMBER and next_value is not None:
+                return unit, next_value, i + 1
+            # "UN 15,00 R$ 45,90 R$ 688,50": com três valores, o primeiro é a quantidade
+            if next_kind == TOKEN_MONEY and money_count > 2:
+                return unit, next_value, i + 1
+        if i > 0 and tokens[i - 1][0] == TOKEN_NUMBER and tokens[i - 1][2] is not None:
+            return unit, tokens[i - 1][2], i - 1
+    return None, None, None
+
+
+def parse_line(line):
+    """Campos do item: code, description, unit, quantity, unit_price, total (None quando ausentes)"""
+    tokens = tokenize(line)
+    money_count = sum(1 for token in tokens if token[0] == TOKEN_MONEY)
+    unit, quantity, quantity_index = _quantity(tokens, money_count)
+    money = [value for index, (kind, _, value, _, _) in enumerate(tokens)
+             if kind == TOKEN_MONEY and index != quantity_index]
+
+    # Descrição: do fim do nº do item/código até a primeira unidade ou valor
+    start = 0
+    end = len(line)
+    for index, (kind, text, value, token_start, token_end) in enumerate(tokens):
+        if kind in (TOKEN_UNIT, TOKEN_CURRENCY, TOKEN_MONEY):
+            end = token_start
+            break
+        if index == start and (kind == TOKEN_CODE or kind == TOKEN_NUMBER
+                               and (len(text) <= 3 or _NUMERIC_CODE.fullmatch(text))):
+            start = index + 1
+    description_start = tokens[start][3] if start < len(tokens) else len(line)
+
+    return {
+        'code': _product_code(tokens),
+        'description': line[description_start:end].strip(' -:') if description_start < end else '',
+        'unit': unit,
+        'quantity': quantity,
+        'unit_price': money[-2] if len(money) >= 2 else None,
+        'total': money[-1] if money else None,
+    }
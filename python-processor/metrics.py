@@ -0,0 +1,305 @@
+# Métricas do processador no formato texto do Prometheus (exposto em /metrics)
+# Contadores, histogramas e gauges em memória, seguros entre threads. Gauges
+# podem ser calculados na hora da coleta (profundidade de fila, taxa de acerto
+# do cache). Com `db_path`, cada processo (worker do gunicorn) grava os próprios
+# valores acumulados numa tabela SQLite compartilhada e /metrics, em qualquer
+# worker, exporta a soma: contadores e histogramas somam todos os processos
+# (inclusive os já reciclados), gauges somam só os processos vivos.
+
+import json
+import math
+import os
+import sqlite3
+import threading
+
+# Limites (segundos) dos histogramas de latência: de 1 ms (parse) a 60 s (OCR em fila)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Linhas de processos encerrados são somadas neste pid (contadores continuam monotônicos)
+ARCHIVED_PID = 0
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name}: rótulos esperados {self.label_names}, recebidos {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def export(self):
+        """Valores acumulados deste processo: {(rótulos, campo): valor}"""
+        with self._lock:
+            return {(key, 'value'): value for key, value in self._values.items()}
+
+    def render(self, values):
+        """Texto da métrica a partir dos valores (deste processo ou somados entre processos)"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples(values))
+        return '\n'.join(lines)
+
+    def _samples(self, values):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                for (key, _), value in sorted(values.items())]
+
+
+class Counter(_Metric):
+    """Contador monotônico (opcionalmente lido de uma função na coleta)"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        super().__init__(name, documentation, labels)
+        self._collect = collect
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def export(self):
+        if self._collect is not None:
+            return {((), 'value'): self._collect()}
+        return super().export()
+
+
+class Gauge(_Metric):
+    """Valor instantâneo calculado na coleta por `collect()`
+
+    `shared=True`: `collect()` já devolve o valor do serviço inteiro (calculado
+    a partir de outras métricas somadas) e não é somado entre processos.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, collect, shared=False):
+        super().__init__(name, documentation)
+        self._collect = collect
+        self.shared = shared
+
+    def export(self):
+        return {((), 'value'): self._collect()}
+
+
+class Histogram(_Metric):
+    """Histograma cumulativo (buckets + soma + contagem) por combinação de rótulos"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def export(self):
+        values = {}
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    values[(key, _format_value(bound))] = bucket_count
+                values[(key, 'sum')] = total
+                values[(key, 'count')] = count
+        return values
+
+    def _samples(self, values):
+        samples = []
+        for key in sorted({key for key, _ in values}):
+            cumulative = 0
+            for bound in self.buckets:
+                le = _format_value(bound)
+                cumulative += values.get((key, le), 0)
+                labels = _format_labels(self.label_names, key, [('le', le)])
+                samples.append(f'{self.name}_bucket{labels} {_format_value(cumulative)}')
+            labels = _format_labels(self.label_names, key)
+            samples.append(f'{self.name}_sum{labels} {_format_value(values.get((key, "sum"), 0.0))}')
+            samples.append(f'{self.name}_count{labels} {_format_value(values.get((key, "count"), 0))}')
+        return samples
+
+
+class MetricsRegistry:
+    """Conjunto de métricas do processo, na ordem de registro
+
+    Sem `db_path` exporta só o próprio processo. Com `db_path`, `flush()` grava
+    os valores do processo (chamado ao fim de cada requisição) e `render()`
+    soma os valores de todos os processos que usam o mesmo arquivo.
+    """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica já registrada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=(), collect=None):
+        return self._register(Counter(name, documentation, labels, collect))
+
+    def gauge(self, name, documentation, collect, shared=False):
+        return self._register(Gauge(name, documentation, collect, shared))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def _connection(self):
+        """Conexão do processo atual (chamado com o lock); no primeiro uso num pid, arquiva o antecessor"""
+        if self._db_pid != os.getpid():
+            db = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS metric_samples ('
+                'metric TEXT NOT NULL, labels TEXT NOT NULL, field TEXT NOT NULL, pid INTEGER NOT NULL, '
+                'kind TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (metric, labels, field, pid)) WITHOUT ROWID'
+            )
+            # Linhas com o pid atual são de um processo anterior que teve o mesmo pid
+            self._archive(db, [os.getpid()])
+            self._db = db
+            self._db_pid = os.getpid()
+        return self._db
+
+    @staticmethod
+    def _archive(db, pids):
+        """Somar contadores/histogramas dos processos encerrados no pid arquivado e descartar os gauges"""
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            for pid in pids:
+                db.execute(
+                    'INSERT INTO metric_samples (metric, labels, field, pid, kind, value) '
+                    'SELECT metric, labels, field, ?, kind, value FROM metric_samples '
+                    "WHERE pid = ? AND kind != 'gauge' "
+                    'ON CONFLICT (metric, labels, field, pid) DO UPDATE SET value = value + excluded.value',
+                    (ARCHIVED_PID, pid)
+                )
+                db.execute('DELETE FROM metric_samples WHERE pid = ?', (pid,))
+            db.execute('COMMIT')
+        except BaseException:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+
+    def reset(self):
+        """Apagar o arquivo compartilhado (na subida do servidor, antes de criar os workers)"""
+        if not self.db_path:
+            return
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.db_path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def _local_values(self, metrics):
+        return {metric.name: metric.export() for metric in metrics
+                if not (isinstance(metric, Gauge) and metric.shared)}
+
+    def flush(self):
+        """Gravar os valores acumulados deste processo no arquivo compartilhado"""
+        if not self.db_path:
+            return
+        with self._lock:
+            metrics = list(self._metrics.values())
+        rows = [(name, json.dumps(key), field, os.getpid(), self._metrics[name].kind, value)
+                for name, values in self._local_values(metrics).items()
+                for (key, field), value in values.items()]
+        with self._lock:
+            db = self._connection()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.executemany('INSERT OR REPLACE INTO metric_samples (metric, labels, field, pid, kind, value) '
+                               'VALUES (?, ?, ?, ?, ?, ?)', rows)
+                db.execute('COMMIT')
+            except BaseException:
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+                raise
+
+    def _merged_values(self):
+        """Valores somados entre os processos: {métrica: {(rótulos, campo): valor}}"""
+        self.flush()
+        with self._lock:
+            db = self._connection()
+            pids = [row[0] for row in db.execute('SELECT DISTINCT pid FROM metric_samples')]
+            dead = [pid for pid in pids if pid != ARCHIVED_PID and not _process_alive(pid)]
+            if dead:
+                self._archive(db, dead)
+            rows = db.execute('SELECT metric, labels, field, value FROM metric_samples').fetchall()
+        merged = {}
+        for name, labels, field, value in rows:
+            values = merged.setdefault(name, {})
+            key = (tuple(json.loads(labels)), field)
+            values[key] = values.get(key, 0) + value
+        return merged
+
+    def total(self, name):
+        """Soma de todas as séries de um contador (entre os processos, com `db_path`)"""
+        metric = self._metrics[name]
+        values = self._merged_values().get(name, {}) if self.db_path else metric.export()
+        return sum(values.values())
+
+    def render(self):
+        """Todas as métricas no formato de exposição texto (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        merged = self._merged_values() if self.db_path else self._local_values(metrics)
+        blocks = []
+        for metric in metrics:
+            if isinstance(metric, Gauge) and metric.shared:
+                values = metric.export()
+            else:
+                values = merged.get(metric.name, {})
+            blocks.append(metric.render(values))
+        return '\n'.join(blocks) + '\n'
@@ -0,0 +1,208 @@
+# Leitura direta do XML da NF-e (nfeProc), sem OCR
+# Parser em streaming (iterparse): cada <det> é lido e descartado, e pacotes ZIP
+# são lidos membro a membro, sem carregar o arquivo inteiro na memória.
+# O resultado tem a mesma estrutura de `process_invoice_text`.
+
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Limites para pacotes ZIP (proteção contra "zip bombs")
+NFE_MAX_DOCUMENTS = int(os.getenv('NFE_MAX_DOCUMENTS', '500'))
+NFE_MAX_XML_BYTES = int(float(os.getenv('NFE_MAX_XML_MB', '10')) * 1024 * 1024)
+
+ZIP_MAGIC = b'PK\x03\x04'
+
+
+class InvalidNFe(Exception):
+    """Documento que não é um XML de NF-e válido"""
+
+
+def _local(tag):
+    """Nome da tag sem o namespace ({http://www.portalfiscal.inf.br/nfe}det -> det)"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child(elem, *path):
+    """Descendente pelo caminho de nomes locais (ignorando namespace), ou None"""
+    for name in path:
+        if elem is None:
+            return None
+        elem = next((child for child in elem if _local(child.tag) == name), None)
+    return elem
+
+
+def _text(elem, *path, default=''):
+    found = _child(elem, *path)
+    return (found.text or '').strip() if found is not None and found.text else default
+
+
+def _number(elem, *path):
+    value = _text(elem, *path)
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def iter_nfe(fileobj):
+    """Ler as NF-e de um XML (nfeProc, NFe ou lote com várias NFe), uma por vez"""
+    document = None
+    try:
+        for event, elem in ET.iterparse(fileobj, events=('start', 'end')):
+            name = _local(elem.tag)
+            if event == 'start':
+                if name == 'infNFe':
+                    document = {
+                        'access_key': (elem.get('Id') or '').replace('NFe', '') or None,
+                        'numero': None,
+                        'data_emissao': None,
+                        'cliente': None,
+                        'cliente_documento': None,
+                        'valor_total': 0.0,
+                        'items': []
+                    }
+                continue
+
+            if document is None:
+                continue
+            if name == 'det':
+                prod = _child(elem, 'prod')
+                if prod is not None:
+                    document['items'].append({
+                        'code': _text(prod, 'cProd'),
+                        'description': _text(prod, 'xProd'),
+                        'quantity': _number(prod, 'qCom'),
+                        'unit': _text(prod, 'uCom'),
+                        'unit_price': _number(prod, 'vUnCom'),
+                        'total': _number(prod, 'vProd')
+                    })
+                elem.clear()
+            elif name == 'ide':
+                document['numero'] = _text(elem, 'nNF') or None
+                # dhEmi (NF-e 3.10+) tem hora e fuso; dEmi (2.00) só a data
+                document['data_emissao'] = (_text(elem, 'dhEmi') or _text(elem, 'dEmi'))[:10] or None
+                elem.clear()
+            elif name == 'dest':
+                document['cliente'] = _text(elem, 'xNome') or None
+                document['cliente_documento'] = _text(elem, 'CNPJ') or _text(elem, 'CPF') or None
+                elem.clear()
+            elif name == 'ICMSTot':
+                document['valor_total'] = _number(elem, 'vNF')
+            elif name == 'infNFe':
+                yield document
+                document = None
+                elem.clear()
+    except ET.ParseError as e:
+        raise InvalidNFe(f"XML inválido: {e}") from None
+
+
+def spool_stream(stream, max_memory=1024 * 1024):
+    """Copiar um stream não posicionável para arquivo temporário (memória até `max_memory`)"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    shutil.copyfileobj(stream, spooled, 64 * 1024)
+    spooled.seek(0)
+    return spooled
+
+
+def iter_nfe_sources(fileobj, name='documento.xml'):
+    """(origem, NF-e ou exceção) de um XML ou de um pacote ZIP com vários XMLs"""
+    if not fileobj.seekable():
+        fileobj = spool_stream(fileobj)
+    start = fileobj.tell()
+    magic = fileobj.read(len(ZIP_MAGIC))
+    fileobj.seek(start)
+
+    if magic != ZIP_MAGIC:
+        yield from _iter_xml(fileobj, name)
+        return
+
+    documents = 0
+    with zipfile.ZipFile(fileobj) as bundle:
+        for member in bundle.infolist():
+            if member.is_dir() or not member.filename.lower().endswith('.xml'):
+                continue
+            if documents >= NFE_MAX_DOCUMENTS:
+                yield member.filename, InvalidNFe(f"Pacote excede o limite de {NFE_MAX_DOCUMENTS} documentos")
+                return
+            documents += 1
+            if member.file_size > NFE_MAX_XML_BYTES:
+                yield member.filename, InvalidNFe(f"XML excede {NFE_MAX_XML_BYTES // (1024 * 1024)} MB")
+                continue
+            # Descompactado em streaming: só o trecho em leitura fica na memória
+            with bundle.open(member) as xml_file:
+                yield from _iter_xml(xml_file, member.filename)
+
+
+def _iter_xml(fileobj, name):
+    found = False
+    try:
+        for document in iter_nfe(fileobj):
+            found = True
+            yield name, document
+    except InvalidNFe as e:
+        yield name, e
+        return
+    if not found:
+        yield name, InvalidNFe('XML não contém NF-e (infNFe)')
+
+
+def invoice_from_nfe(document, matcher):
+    """Converter a NF-e para a estrutura de `process_invoice_text` (produtos pelo código primeiro)"""
+    eligible_products = []
+    products_found = []
+    for item in document['items']:
+        source_line = f"{item['code']} {item['description']}".strip()
+        products_found.append({
+            'description': source_line,
+            'value': item['total'],
+            'quantity': item['quantity'],
+            'unit_price': item['unit_price']
+        })
+
+        product_match = matcher.identify_item(item['code'], item['description'])
+        if not product_match:
+            continue
+        product_key, product_info, confidence = product_match
+        product = {
+            'name': product_info['nome'],
+            'product_name': product_info['nome'],
+            'product_code': item['code'] or 'N/A',
+            'quantity': item['quantity'],
+            'unit_price': item['unit_price'],
+            'value': item['total'],
+            'total_value': item['total'],
+            'category': product_info['categoria'],
+            'points_per_real': product_info['pontosPorReal'],
+            'confidence': confidence,
+            'source_line': source_line
+        }
+        product['points'] = int(product['total_value'] * product['points_per_real']) if product['total_value'] > 0 else 0
+        eligible_products.append(product)
+
+    # Campos ausentes no XML: mesmos padrões de `extract_order_info` (o frontend espera todos preenchidos)
+    return {
+        'order_info': {
+            'numero_nota': f"NF-{document['numero']}" if document['numero'] else f"PYTHON-{int(datetime.now().timestamp())}",
+            'data_emissao': document['data_emissao'] or datetime.now().strftime('%Y-%m-%d'),
+            'cliente': document['cliente'] or "Cliente Python",
+            'valor_total_nota': document['valor_total'],
+            # Campos lidos do XML autorizado: confiança total quando presentes
+            'field_confidence': {
+                'numero_nota': 1.0 if document['numero'] else 0.0,
+                'data_emissao': 1.0 if document['data_emissao'] else 0.0,
+                'cliente': 1.0 if document['cliente'] else 0.0,
+                'valor_total_nota': 1.0
+            }
+        },
+        'eligible_products': eligible_products,
+        'all_products': products_found,
+        'total_eligible_points': sum(p['points'] for p in eligible_products),
+        'processing_method': 'nfe_xml'
+    }
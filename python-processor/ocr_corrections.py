@@ -0,0 +1,109 @@
+# Correção de erros de OCR numa única passada
+# Uma regex combinada encontra, de uma vez, os tokens com formato de código do
+# fornecedor (DW0OO57) e as palavras do catálogo lidas com letras trocadas
+# (PLAGA), além dos números (preço, quantidade, data) com O/I no lugar de 0/1
+# (R$ 65O,OO, 3O/O6/2O25). Só códigos e números recebem a tabela de confusão
+# letra -> dígito; as palavras comuns ("NOTA FISCAL") ficam intactas.
+
+import re
+
+from product_matcher import EXACT_CODE_PATTERN
+
+# Leituras trocadas de dígitos nos códigos (aplicadas só depois do prefixo)
+CODE_DIGIT_CONFUSIONS = str.maketrans({'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1'})
+
+# Nos números só O/I: L e D são unidade ou sufixo de medida (18L, 3D)
+NUMBER_DIGIT_CONFUSIONS = str.maketrans({'O': '0', 'I': '1'})
+
+# Token numérico: dígitos, O/I e separadores, sem letra ou dígito colado
+NUMBER_TOKEN = r'(?P<number>(?<![\w.,/])[0-9OI](?:[0-9OI.,/]*[0-9OI])?(?![\w]))'
+
+# Formatos aceitos depois da tradução: valor (1.234,56 / 32,50), quantidade, data
+NUMBER_SHAPE = re.compile(r'\d{1,3}(?:\.\d{3})*,\d{2}|\d+(?:[.,]\d{1,3})?|\d{2}/\d{2}/\d{2,4}')
+
+# Trocas comuns do OCR em palavras: letra correta -> leituras erradas
+WORD_CONFUSIONS = {
+    'C': 'G',
+    'G': 'C',
+    'O': '0Q',
+    'I': '1L',
+    'L': '1I',
+    'S': '5',
+    'B': '8',
+}
+
+MIN_WORD_LENGTH = 4
+
+
+def _words(text):
+    return [word for word in re.findall(r'[^\W\d_]+', text.upper()) if len(word) >= MIN_WORD_LENGTH]
+
+
+def _variants(word):
+    """Leituras erradas da palavra com uma troca de caractere"""
+    for i, char in enumerate(word):
+        for wrong in WORD_CONFUSIONS.get(char, ''):
+            yield word[:i] + wrong + word[i + 1:]
+
+
+def build_word_corrections(catalog):
+    """Dicionário leitura errada -> palavra, derivado dos nomes e keywords do catálogo"""
+    names = {word for info in catalog.values() for word in _words(info['nome'])}
+    name_variants = {variant for word in names for variant in _variants(word)}
+    # Keywords também valem como palavra correta, exceto as que já são erro de OCR (plaga, glasrog)
+    keywords = {word for info in catalog.values() for keyword in info['keywords'] for word in _words(keyword)}
+    vocabulary = names | (keywords - name_variants)
+
+    corrections = {}
+    for word in sorted(vocabulary):
+        for variant in _variants(word):
+            if variant not in vocabulary:
+                corrections.setdefault(variant, word)
+    return corrections
+
+
+def code_prefixes(catalog):
+    """Prefixos dos códigos do fornecedor presentes no catálogo (DW, GR, MT...)"""
+    prefixes = set()
+    for info in catalog.values():
+        for keyword in info['keywords']:
+            code = keyword.upper().replace(' ', '')
+            if EXACT_CODE_PATTERN.match(code):
+                prefixes.add(code[:2])
+    return prefixes
+
+
+class OCRCorrector:
+    """Correções de OCR compiladas a partir do catálogo (uma regex, uma passada)"""
+
+    def __init__(self, catalog):
+        self.word_corrections = build_word_corrections(catalog)
+        self.prefixes = sorted(code_prefixes(catalog))
+        alternatives = []
+        if self.prefixes:
+            alternatives.append(r'(?P<code>(?:%s)[0-9OQDIL]{3,6})' % '|'.join(map(re.escape, self.prefixes)))
+        if self.word_corrections:
+            # Mais longas primeiro para a alternância não parar num prefixo
+            words = sorted(self.word_corrections, key=len, reverse=True)
+            alternatives.append(r'(?P<word>%s)' % '|'.join(map(re.escape, words)))
+        alternatives.append(NUMBER_TOKEN)
+        self._pattern = re.compile(r'\b(?:%s)\b' % '|'.join(alternatives))
+
+    def _replace(self, match):
+        number = match.group('number')
+        if number is not None:
+            if not any(char.isdigit() for char in number):
+                return number  # "O", "IO": sem dígito real não é número
+            fixed = number.translate(NUMBER_DIGIT_CONFUSIONS)
+            return fixed if NUMBER_SHAPE.fullmatch(fixed) else number
+        code = match.group('code') if self.prefixes else None
+        if code is not None:
+            body = code[2:]
+            if not any(char.isdigit() for char in body):
+                return code  # Palavra comum com o mesmo prefixo, não código
+            return code[:2] + body.translate(CODE_DIGIT_CONFUSIONS)
+        return self.word_corrections[match.group('word')]
+
+    def correct(self, text):
+        """Aplicar as correções ao texto (já em maiúsculas)"""
+        return self._pattern.sub(self._replace, text)
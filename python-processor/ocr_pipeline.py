@@ -0,0 +1,257 @@
+# Etapa de pré-processamento de imagem + OCR (Tesseract)
+# Módulo sem dependência do Flask: é importado pelos processos do pool de OCR,
+# que não devem carregar o servidor inteiro. OpenCV e o detector de layout só
+# são importados no primeiro uso (dentro dos workers), não no boot do servidor.
+
+import importlib.util
+import io
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageOps
+
+# Importações condicionais para OCR
+CV2_AVAILABLE = importlib.util.find_spec('cv2') is not None
+
+from tesseract_engine import PYTESSERACT_AVAILABLE as TESSERACT_AVAILABLE
+from tesseract_engine import image_to_data, selected_engine, tesseract_config
+
+logger = logging.getLogger(__name__)
+
+# Versão do pré-processamento: incrementar ao mudar a etapa (invalida o cache de OCR)
+PIPELINE_VERSION = '5'
+
+# Normalização: orçamento de megapixels para o OCR e limite rígido contra "decompression bombs"
+OCR_TARGET_MEGAPIXELS = float(os.getenv('OCR_TARGET_MEGAPIXELS', '5'))
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', '50000000'))
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Configuração otimizada do Tesseract para português e documentos
+TESSERACT_LANG = 'por+eng'
+TESSERACT_WHITELIST = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÀÁÂÃÄÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝàáâãäçèéêëìíîïñòóôõöùúûüý.,/:;-+*()[]{}|\\@#$%&<>="\' '
+TESSERACT_PSM = 6
+TESSERACT_CONFIG = tesseract_config(TESSERACT_PSM, TESSERACT_WHITELIST)
+
+# Níveis de pré-processamento, do mais barato ao mais caro
+TIER_FAST = 'fast'          # Escala de cinza + Otsu
+TIER_CONTRAST = 'contrast'  # CLAHE + binarização adaptativa
+TIER_FULL = 'full'          # Redução de ruído + CLAHE + binarização adaptativa
+TIER_BASIC = 'basic'        # Sem OpenCV: contraste + nitidez com PIL
+PREPROCESSING_TIERS = (TIER_FAST, TIER_CONTRAST, TIER_FULL) if CV2_AVAILABLE else (TIER_BASIC,)
+
+# Limiares para subir de nível: confiança média das palavras (0-100) e produtos reconhecidos
+OCR_MIN_CONFIDENCE = float(os.getenv('OCR_MIN_CONFIDENCE', '70'))
+OCR_MIN_PRODUCT_HITS = int(os.getenv('OCR_MIN_PRODUCT_HITS', '1'))
+# Confiança a partir da qual a leitura é aceita mesmo sem produtos (nota sem itens Fast)
+OCR_HIGH_CONFIDENCE = float(os.getenv('OCR_HIGH_CONFIDENCE', '85'))
+
+# Layout: OCR só nas regiões de texto detectadas, em paralelo (threads dentro do worker)
+OCR_LAYOUT_REGIONS = os.getenv('OCR_LAYOUT_REGIONS', 'true').lower() == 'true' and CV2_AVAILABLE
+OCR_REGION_THREADS = int(os.getenv('OCR_REGION_THREADS', '4'))
+# Acima disso cada região custaria mais que ler a página de uma vez: lê-se o retângulo que envolve todas
+OCR_MAX_REGIONS = int(os.getenv('OCR_MAX_REGIONS', '12'))
+
+
+def config_fingerprint():
+    """Identificação da configuração de pré-processamento/OCR (parte da chave do cache)"""
+    return (f"{PIPELINE_VERSION}|{OCR_TARGET_MEGAPIXELS}|{','.join(PREPROCESSING_TIERS)}|"
+            f"{OCR_MIN_CONFIDENCE}|{OCR_MIN_PRODUCT_HITS}|{OCR_HIGH_CONFIDENCE}|{TESSERACT_LANG}|{TESSERACT_CONFIG}|"
+            f"{OCR_LAYOUT_REGIONS}|{OCR_MAX_REGIONS}|{selected_engine()}")
+
+
+class ImageTooLarge(Exception):
+    """Imagem com mais pixels que o limite permitido"""
+
+
+def open_image(image_bytes, max_pixels=MAX_IMAGE_PIXELS):
+    """Abrir a imagem lendo só o cabeçalho e rejeitar dimensões acima do limite antes de alocar"""
+    image = Image.open(io.BytesIO(image_bytes))
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"Imagem com {width}x{height} pixels excede o limite de {max_pixels}")
+    return image
+
+
+def normalize_image(image_bytes, target_megapixels=OCR_TARGET_MEGAPIXELS):
+    """Decodificar já em escala reduzida, aplicar a orientação EXIF e limitar os megapixels"""
+    image = open_image(image_bytes)
+    target_pixels = target_megapixels * 1_000_000
+    width, height = image.size
+
+    if width * height > target_pixels:
+        # JPEG: o decodificador reduz direto na DCT (1/2, 1/4, 1/8), sem decodificar a foto inteira.
+        # draft() escolhe a maior redução que ainda cobre o tamanho-alvo; o resize abaixo apara o resto.
+        scale = math.sqrt(target_pixels / (width * height))
+        image.draft('RGB', (max(1, int(width * scale)), max(1, int(height * scale))))
+
+    image = ImageOps.exif_transpose(image)
+
+    width, height = image.size
+    if width * height > target_pixels:
+        scale = math.sqrt(target_pixels / (width * height))
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS, reducing_gap=3.0)
+
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    return image
+
+
+def advanced_image_preprocessing(image, tier=TIER_FULL):
+    """Pré-processamento avançado de imagem para OCR no nível informado"""
+    try:
+        if CV2_AVAILABLE and tier != TIER_BASIC:
+            import cv2
+            import numpy as np
+
+            # Converter PIL para OpenCV
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+            # Redimensionar se muito pequena
+            height, width = cv_image.shape[:2]
+            if height < 1000:
+                scale = 1000 / height
+                new_width = int(width * scale)
+                cv_image = cv2.resize(cv_image, (new_width, 1000))
+
+            # Converter para escala de cinza
+            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+
+            if tier == TIER_FAST:
+                # Binarização global de Otsu: suficiente para scans limpos
+                _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                return Image.fromarray(binary)
+
+            # Redução de ruído (etapa mais cara, só no nível completo)
+            if tier == TIER_FULL:
+                gray = cv2.fastNlMeansDenoising(gray)
+
+            # Aumento de contraste
+            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
+            enhanced = clahe.apply(gray)
+
+            # Binarização adaptativa
+            binary = cv2.adaptiveThreshold(enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+
+            # Converter de volta para PIL
+            return Image.fromarray(binary)
+        else:
+            # Processamento básico com PIL
+            if image.mode != 'L':
+                image = image.convert('L')
+
+            # Melhorar contraste
+            enhancer = ImageEnhance.Contrast(image)
+            image = enhancer.enhance(2.0)
+
+            # Filtro de nitidez
+            image = image.filter(ImageFilter.SHARPEN)
+
+            return image
+
+    except Exception as e:
+        logger.error(f"Erro no pré-processamento: {e}")
+        return image
+
+
+def _text_from_data(data):
+    """Remontar o texto e a confiança média a partir da saída por palavra do Tesseract"""
+    lines = []
+    current_key = None
+    current_block = None
+    confidences = []
+    for i, word in enumerate(data['text']):
+        word = (word or '').strip()
+        if int(data['level'][i]) != 5 or not word:
+            continue
+
+        confidence = float(data['conf'][i])
+        if confidence >= 0:
+            confidences.append(confidence)
+
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        if key != current_key:
+            if current_block is not None and data['block_num'][i] != current_block:
+                lines.append('')  # Linha em branco entre blocos, como no image_to_string
+            lines.append(word)
+            current_key = key
+            current_block = data['block_num'][i]
+        else:
+            lines[-1] += ' ' + word
+
+    mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return '\n'.join(lines), round(mean_confidence, 2), len(confidences)
+
+
+def _ocr_region(image, region, timeout):
+    """OCR de uma região com o modo de segmentação adequado; linhas em coordenadas da página"""
+    import layout
+    data = image_to_data(layout.crop_region(image, region), TESSERACT_LANG, region['psm'],
+                         TESSERACT_WHITELIST, timeout)
+    return layout.lines_from_data(data, offset=region['box'][:2])
+
+
+def _ocr_regions(image, timeout):
+    """OCR por regiões de layout em ordem de leitura; None se nenhuma região for encontrada"""
+    import numpy as np
+
+    import layout
+    try:
+        regions = layout.detect_text_regions(np.asarray(image.convert('L')))
+    except Exception as e:
+        logger.warning(f"⚠️ Detecção de layout falhou, lendo a página inteira: {e}")
+        return None
+    if not regions:
+        return None
+    if len(regions) > OCR_MAX_REGIONS:
+        regions = [layout.regions_bounding_box(regions)]
+
+    if len(regions) == 1 or OCR_REGION_THREADS <= 1:
+        region_lines = [_ocr_region(image, region, timeout) for region in regions]
+    else:
+        # Cada chamada ao Tesseract é um subprocesso: as threads só esperam (sem disputar o GIL)
+        with ThreadPoolExecutor(max_workers=min(OCR_REGION_THREADS, len(regions))) as executor:
+            region_lines = list(executor.map(lambda region: _ocr_region(image, region, timeout), regions))
+
+    lines = [line for lines in region_lines for line in lines]
+    confidences = [confidence for line in lines for confidence in line['conf']]
+    mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return '\n'.join(layout.merge_lines(lines)), round(mean_confidence, 2), len(confidences), len(regions)
+
+
+def run_ocr(image_bytes, tier=TIER_FULL, timeout=0):
+    """Decodificar, pré-processar e extrair texto + confiança da imagem com o Tesseract"""
+    start = time.perf_counter()
+    image = normalize_image(image_bytes)
+    normalized = time.perf_counter()
+    processed_image = advanced_image_preprocessing(image, tier)
+    preprocessed = time.perf_counter()
+
+    result = _ocr_regions(processed_image, timeout) if OCR_LAYOUT_REGIONS and tier != TIER_BASIC else None
+    if result is not None:
+        text, confidence, words, regions = result
+    else:
+        data = image_to_data(processed_image, TESSERACT_LANG, TESSERACT_PSM, TESSERACT_WHITELIST, timeout)
+        text, confidence, words = _text_from_data(data)
+        regions = 0
+    # Tempos (ms) das etapas dentro do worker, para as métricas do servidor
+    timings = {
+        'normalize': round((normalized - start) * 1000, 2),
+        'preprocess': round((preprocessed - normalized) * 1000, 2),
+        'tesseract': round((time.perf_counter() - preprocessed) * 1000, 2),
+    }
+    return {'text': text, 'confidence': confidence, 'words': words, 'tier': tier, 'regions': regions,
+            'timings': timings}
+
+
+def warm_up():
+    """OCR de uma imagem pequena: carrega OpenCV, o layout e o motor do Tesseract no processo"""
+    image = Image.new('L', (320, 80), 255)
+    ImageDraw.Draw(image).text((10, 30), 'FAST 123', fill=0)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return run_ocr(buffer.getvalue(), PREPROCESSING_TIERS[0])['words']
@@ -0,0 +1,210 @@
+# Pool de processos para a etapa de pré-processamento + OCR
+# Tira o trabalho pesado (OpenCV/Tesseract) da thread da requisição Flask e
+# usa todos os núcleos. Fila limitada, timeout por tarefa e reciclagem de
+# workers após N tarefas para conter o crescimento de memória do Tesseract/OpenCV.
+
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+class OCRPoolFull(Exception):
+    """Fila do pool de OCR cheia: o cliente deve tentar novamente mais tarde"""
+
+
+class OCRTimeout(Exception):
+    """Tarefa de OCR excedeu o tempo limite"""
+
+
+class OCRWorkerLost(Exception):
+    """O processo que executava a tarefa morreu (falha de segmentação, OOM, os._exit)"""
+
+
+def _init_worker(tesseract_cmd):
+    """Inicializar o processo worker com o executável do Tesseract detectado"""
+    if tesseract_cmd:
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+class OCRTask:
+    """Tarefa submetida ao pool (resultado obtido com `result()`)"""
+
+    def __init__(self, pool, executor, future, timeout):
+        self._pool = pool
+        self._executor = executor
+        self._future = future
+        self.timeout = timeout
+
+    def ready(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        """Aguardar o resultado; levanta OCRTimeout se o prazo estourar e OCRWorkerLost se o worker morrer"""
+        try:
+            return self._future.result(timeout or self.timeout)
+        except FuturesTimeout:
+            self._pool._abandon(self._executor, self._future)
+            raise OCRTimeout(f"OCR excedeu {timeout or self.timeout}s") from None
+        except BrokenProcessPool as e:
+            self._pool._discard(self._executor)
+            raise OCRWorkerLost(f"Processo de OCR encerrado durante a tarefa: {e}") from None
+
+
+class OCRProcessPool:
+    """Pool de processos gerenciado para tarefas de OCR
+
+    Cada tarefa ocupa uma vaga da fila até terminar, falhar, estourar o prazo ou
+    o executor quebrar (worker morto): a vaga é devolvida uma única vez em
+    qualquer desses casos. Um executor com worker morto ou tarefa travada é
+    descartado e o próximo `submit` cria outro.
+    """
+
+    def __init__(self, workers=None, max_queue=None, task_timeout=60,
+                 max_tasks_per_worker=50, tesseract_cmd=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue or self.workers * 4
+        self.task_timeout = task_timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.tesseract_cmd = tesseract_cmd
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_tasks = 0
+        self._pid = None
+        self._reset_queue()
+
+    def _reset_queue(self):
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self._inflight = set()
+
+    def _check_process(self):
+        """Processo filho (fork): o executor e as tarefas do pai não pertencem a este processo"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = None
+                self._pid = os.getpid()
+                self._reset_queue()
+
+    def _get_executor(self):
+        """Executor atual, criado no primeiro uso (e novamente após falha ou reciclagem)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.tesseract_cmd,)
+                )
+                self._executor_tasks = 0
+                logger.info(f"🧵 Pool de OCR iniciado com {self.workers} processos")
+            return self._executor
+
+    def _count_task(self, executor):
+        """Reciclar os workers após N tarefas cada (memória do Tesseract/OpenCV): o executor
+        atual termina as tarefas que já recebeu e as próximas vão para um novo"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor_tasks += 1
+            if not self.max_tasks_per_worker or self._executor_tasks < self.max_tasks_per_worker * self.workers:
+                return
+            self._executor = None
+        executor.shutdown(wait=False)
+
+    def _release_slot(self, future):
+        with self._lock:
+            if future not in self._inflight:
+                return
+            self._inflight.discard(future)
+        self._slots.release()
+
+    def _discard(self, executor):
+        """Deixar de usar um executor quebrado (as tarefas dele já falharam com BrokenProcessPool)"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _abandon(self, executor, future):
+        """Tarefa que estourou o prazo: liberar a vaga e matar o worker que a executa"""
+        self._release_slot(future)
+        if future.cancel():
+            return  # Ainda não tinha começado: nenhum worker ocupado
+        logger.warning("⏱️ Tarefa de OCR travada: reiniciando os processos do pool")
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        self._terminate(executor)
+
+    @staticmethod
+    def _terminate(executor):
+        """Encerrar os processos do executor sem esperar as tarefas em andamento"""
+        # O executor não expõe como interromper uma tarefa em andamento: encerrar os processos
+        # dele faz as demais tarefas em andamento falharem com BrokenProcessPool (vagas liberadas)
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def queue_depth(self):
+        """Tarefas submetidas e ainda não concluídas"""
+        return len(self._inflight)
+
+    def submit(self, func, *args, **kwargs):
+        """Submeter uma tarefa sem bloquear; levanta OCRPoolFull se a fila estiver cheia"""
+        self._check_process()
+        if not self._slots.acquire(blocking=False):
+            raise OCRPoolFull(f"Fila de OCR cheia ({self.max_queue} tarefas)")
+
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(func, *args, **kwargs)
+            except BrokenProcessPool:
+                # Worker morto fora de uma tarefa: tentar uma vez num executor novo
+                self._discard(executor)
+                executor = self._get_executor()
+                future = executor.submit(func, *args, **kwargs)
+            except RuntimeError:
+                # Executor aposentado pela reciclagem (outra thread) entre a escolha e o submit
+                executor = self._get_executor()
+                future = executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        self._count_task(executor)
+
+        with self._lock:
+            self._inflight.add(future)
+        # A vaga só é liberada quando a tarefa termina de fato (ou falha, ou é abandonada)
+        future.add_done_callback(self._release_slot)
+        return OCRTask(self, executor, future, self.task_timeout)
+
+    def run(self, func, *args, **kwargs):
+        """Submeter e aguardar o resultado da tarefa"""
+        return self.submit(func, *args, **kwargs).result()
+
+    def shutdown(self):
+        """Encerrar os processos do pool"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            self._terminate(executor)
+
+
+def create_pool_from_env(tesseract_cmd=None):
+    """Criar o pool de OCR com parâmetros das variáveis de ambiente"""
+    pool = OCRProcessPool(
+        workers=int(os.getenv('OCR_POOL_WORKERS', '0')) or None,
+        max_queue=int(os.getenv('OCR_POOL_MAX_QUEUE', '0')) or None,
+        task_timeout=float(os.getenv('OCR_TASK_TIMEOUT', '60')),
+        max_tasks_per_worker=int(os.getenv('OCR_WORKER_MAX_TASKS', '50')),
+        tesseract_cmd=tesseract_cmd
+    )
+    atexit.register(pool.shutdown)
+    return pool
@@ -0,0 +1,89 @@
+# Entrada em PDF (DANFE enviado por e-mail)
+# Páginas com camada de texto utilizável vão direto para o parser, sem OCR.
+# Só as páginas escaneadas são rasterizadas e enviadas ao OCR, várias em
+# paralelo. Os resultados saem página a página por um gerador, com no máximo
+# `max_inflight` páginas renderizadas ao mesmo tempo.
+
+import io
+import logging
+import math
+import os
+import re
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF'
+
+# Caracteres visíveis mínimos para considerar a camada de texto da página utilizável
+PDF_MIN_TEXT_CHARS = int(os.getenv('PDF_MIN_TEXT_CHARS', '50'))
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '50'))
+PDF_MAX_OCR_DPI = int(os.getenv('PDF_MAX_OCR_DPI', '300'))
+
+PAGE_TEXT = 'text'
+PAGE_OCR = 'ocr'
+
+
+class PDFTooLarge(Exception):
+    """PDF com mais páginas que o limite permitido"""
+
+
+def is_pdf(data):
+    return isinstance(data, (bytes, bytearray)) and data[:len(PDF_MAGIC)] == PDF_MAGIC
+
+
+def usable_text(text, min_chars=PDF_MIN_TEXT_CHARS):
+    """Camada de texto com conteúdo suficiente (e não só glifos sem mapeamento, `(cid:N)`)"""
+    visible = re.sub(r'\s+', '', re.sub(r'\(cid:\d+\)', '', text or ''))
+    return len(visible) >= min_chars
+
+
+def render_page(page, target_megapixels):
+    """Rasterizar a página (PNG em escala de cinza) na resolução que cabe no orçamento de megapixels"""
+    width_in, height_in = float(page.width) / 72, float(page.height) / 72
+    resolution = min(PDF_MAX_OCR_DPI, int(math.sqrt(target_megapixels * 1_000_000 / (width_in * height_in))))
+    image = page.to_image(resolution=resolution).original.convert('L')
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def iter_pdf_pages(pdf_bytes, ocr_page, executor, max_inflight=4, target_megapixels=5):
+    """Gerar {'page', 'source', 'text', 'ocr'} por página, em ordem
+
+    `ocr_page(image_bytes)` roda no `executor` para as páginas sem camada de texto
+    e deve retornar o resultado do OCR ({'text', 'confidence', ...}).
+    """
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        total_pages = len(pdf.pages)
+        if total_pages > PDF_MAX_PAGES:
+            raise PDFTooLarge(f"PDF com {total_pages} páginas excede o limite de {PDF_MAX_PAGES}")
+
+        pending = deque()  # (número da página, resultado pronto ou future do OCR)
+
+        def drain(limit):
+            while len(pending) > limit:
+                number, item = pending.popleft()
+                if isinstance(item, dict):
+                    yield item
+                else:
+                    ocr_result = item.result()
+                    yield {'page': number, 'source': PAGE_OCR, 'text': ocr_result['text'], 'ocr': ocr_result}
+
+        for number, page in enumerate(pdf.pages, 1):
+            text = page.extract_text() or ''
+            if usable_text(text):
+                pending.append((number, {'page': number, 'source': PAGE_TEXT, 'text': text, 'ocr': None}))
+            else:
+                # Renderizar só quando houver vaga: no máximo `max_inflight` páginas na memória
+                yield from drain(max_inflight - 1)
+                image_bytes = render_page(page, target_megapixels)
+                pending.append((number, executor.submit(ocr_page, image_bytes)))
+            page.close()
+            # Páginas de texto prontas saem na hora, sem esperar o OCR das seguintes
+            while pending and isinstance(pending[0][1], dict):
+                yield pending.popleft()[1]
+
+        yield from drain(0)
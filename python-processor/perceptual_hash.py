@@ -0,0 +1,90 @@
+# Detecção de notas quase duplicadas por hash perceptual (dHash)
+# A mesma nota fotografada de novo (recomprimida pelo WhatsApp, cortada de outro
+# jeito, com outra luz) não bate no hash exato, mas fica a poucos bits de
+# distância de Hamming no dHash. Um índice multi-tabela (multi-index hashing)
+# encontra os vizinhos sem comparar com todas as notas recentes.
+
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+DEFAULT_HASH_SIZE = 16  # 16×16 = 256 bits: documentos parecidos precisam de mais resolução
+# Limite para apontar candidatas: notas diferentes do mesmo modelo também ficam abaixo dele,
+# por isso a candidata só é confirmada comparando o texto (nunca reaproveitada pelo hash)
+DEFAULT_MAX_DISTANCE = 12
+
+
+def dhash(image, hash_size=DEFAULT_HASH_SIZE):
+    """dHash da imagem: gradiente horizontal da versão reduzida em escala de cinza"""
+    import numpy as np
+
+    # JPEG: decodificar direto em escala reduzida (muito mais barato que a imagem cheia)
+    image.draft('L', ((hash_size + 1) * 8, hash_size * 8))
+    image = ImageOps.exif_transpose(image)
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(a, b):
+    """Quantidade de bits diferentes entre dois hashes"""
+    return bin(a ^ b).count('1')
+
+
+class NearDuplicateIndex:
+    """Índice das notas recentes para busca por distância de Hamming
+
+    Divide o hash em `max_distance + 1` blocos: pelo princípio da casa dos
+    pombos, dois hashes a até `max_distance` bits de distância têm pelo menos
+    um bloco idêntico, então basta consultar uma tabela por bloco.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, capacity=512, hash_bits=DEFAULT_HASH_SIZE ** 2):
+        self.max_distance = max_distance
+        self.capacity = capacity
+
+        chunks = min(max_distance + 1, hash_bits)
+        bounds = [round(i * hash_bits / chunks) for i in range(chunks + 1)]
+        self._chunks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._tables = [{} for _ in self._chunks]
+        self._entries = OrderedDict()  # id -> (hash, valor)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _keys(self, value_hash):
+        return [(value_hash >> shift) & mask for shift, mask in self._chunks]
+
+    def add(self, value_hash, value):
+        """Registrar uma nota processada (remove a mais antiga se passar da capacidade)"""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (value_hash, value)
+            for table, key in zip(self._tables, self._keys(value_hash)):
+                table.setdefault(key, set()).add(entry_id)
+
+            while len(self._entries) > self.capacity:
+                old_id, (old_hash, _) = self._entries.popitem(last=False)
+                for table, key in zip(self._tables, self._keys(old_hash)):
+                    bucket = table.get(key)
+                    if bucket is not None:
+                        bucket.discard(old_id)
+                        if not bucket:
+                            del table[key]
+
+    def find(self, value_hash):
+        """Nota mais próxima dentro de `max_distance`: (distância, valor) ou None"""
+        with self._lock:
+            candidates = set()
+            for table, key in zip(self._tables, self._keys(value_hash)):
+                candidates |= table.get(key, set())
+
+            best = None
+            for entry_id in candidates:
+                entry_hash, value = self._entries[entry_id]
+                distance = hamming_distance(value_hash, entry_hash)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, value)
+            return best
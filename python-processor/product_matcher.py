@@ -0,0 +1,285 @@
+# Motor de reconhecimento de produtos Fast Sistemas
+# Compila o catálogo uma única vez: autômato Aho-Corasick para as keywords e
+# uma regex combinada (grupos nomeados) para os padrões de código.
+# A similaridade de nomes usa um índice de trigramas vetorizado (trigram_index).
+
+import re
+from collections import deque
+
+# NumPy no topo: o índice é montado ao compilar o catálogo, já na subida do processo web
+import numpy as np
+
+from trigram_index import DEFAULT_SIMILARITY_THRESHOLD, TrigramIndex, trigram_similarity
+
+# Pesos da pontuação (mesmos valores da versão original)
+KEYWORD_WEIGHT = 0.4
+CODE_PATTERN_WEIGHT = 0.6
+NAME_SIMILARITY_THRESHOLD = DEFAULT_SIMILARITY_THRESHOLD
+NAME_SIMILARITY_WEIGHT = 0.3
+CONTEXT_KEYWORD_WEIGHT = 0.1
+CONTEXT_RADIUS = 2  # Linhas vizinhas (acima e abaixo) consideradas como contexto
+MIN_MATCH_SCORE = 0.3
+
+# Keywords no formato de código do fornecedor (DW00057): identificam o produto direto
+EXACT_CODE_PATTERN = re.compile(r'^[A-Z]{2}\d{5}$')
+
+
+def similarity_score(a, b):
+    """Calcular similaridade entre duas strings"""
+    return trigram_similarity(a, b)
+
+
+def normalize_code(code):
+    """Código em maiúsculas sem espaços, pontos e hífens"""
+    return re.sub(r'[\s.\-]', '', str(code)).upper()
+
+
+def _add_repeated(score, weight, times):
+    """Somar o peso N vezes, preservando o arredondamento da soma sequencial"""
+    for _ in range(times):
+        score += weight
+    return score
+
+
+class KeywordAutomaton:
+    """Autômato Aho-Corasick para buscar todas as keywords numa única passada"""
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+        self._always = frozenset(i for i, kw in enumerate(self.keywords) if not kw)
+
+        # Trie das keywords
+        for kw_id, keyword in enumerate(self.keywords):
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(set())
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state].add(kw_id)
+
+        # Links de falha em largura (BFS), herdando as saídas dos sufixos
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+        self._output = [frozenset(out) for out in self._output]
+
+    def find(self, text):
+        """Retornar os índices das keywords presentes no texto"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set(self._always)
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class ProductMatcher:
+    """Índice compilado do catálogo para identificar produtos em linhas de OCR
+
+    `require_line_hit=True`: só pontua produtos com keyword ou padrão de código
+    na própria linha (nome parecido e contexto apenas reforçam). Usado com o
+    catálogo da tabela, onde um produto sem cadastro (ex.: guia) não pode
+    herdar a nota da linha vizinha pelo bônus de contexto.
+    """
+
+    def __init__(self, catalog, similarity_threshold=NAME_SIMILARITY_THRESHOLD, require_line_hit=False):
+        self.catalog = catalog
+        self.product_keys = list(catalog)
+        self.products = [catalog[key] for key in self.product_keys]
+        self.similarity_threshold = similarity_threshold
+        self.require_line_hit = require_line_hit
+
+        # Nome e aliases de cada produto num índice de trigramas
+        self.name_index = TrigramIndex([
+            [info['nome']] + list(info.get('aliases', [])) for info in self.products
+        ])
+
+        # Keywords únicas (maiúsculas) -> produtos que as declaram
+        keyword_products = {}
+        for idx, info in enumerate(self.products):
+            for keyword in info['keywords']:
+                keyword_products.setdefault(keyword.upper(), []).append(idx)
+        self._keyword_products = list(keyword_products.values())
+        # Sem espaços nas bordas, as keywords de uma linha não mudam com strip()
+        self._keywords_trimmed = all(kw == kw.strip() for kw in keyword_products)
+        self.automaton = KeywordAutomaton(keyword_products)
+
+        # Padrões de código: cada um vira um lookahead com grupo nomeado,
+        # assim matches sobrepostos de padrões diferentes não se escondem
+        self._code_parts = []
+        self._code_owner = []
+        for idx, info in enumerate(self.products):
+            for pattern in info['codigo_patterns']:
+                code_id = len(self._code_parts)
+                self._code_parts.append(f'(?=(?P<c{code_id}>{pattern}))')
+                self._code_owner.append(idx)
+        self._code_tails = {}
+        self._code_regex = self._code_tail(0)
+
+        # Códigos exatos (keywords com formato de código e o campo `codigo`, se houver)
+        self._exact_codes = {}
+        for idx, info in enumerate(self.products):
+            for code in [info.get('codigo')] + list(info['keywords']):
+                code = normalize_code(code or '')
+                if code and (code == normalize_code(info.get('codigo') or '') or EXACT_CODE_PATTERN.match(code)):
+                    self._exact_codes.setdefault(code, idx)
+
+    def _code_tail(self, start):
+        """Regex combinada com os padrões a partir do índice informado"""
+        if start not in self._code_tails:
+            parts = self._code_parts[start:]
+            self._code_tails[start] = re.compile('|'.join(parts)) if parts else None
+        return self._code_tails[start]
+
+    def keyword_hits(self, text_upper):
+        """Quantidade de keywords de cada produto presentes no texto"""
+        counts = [0] * len(self.products)
+        for kw_id in self.automaton.find(text_upper):
+            for idx in self._keyword_products[kw_id]:
+                counts[idx] += 1
+        return counts
+
+    def code_hits(self, text_upper):
+        """Quantidade de padrões de código de cada produto encontrados no texto"""
+        counts = [0] * len(self.products)
+        if self._code_regex is None:
+            return counts
+
+        matched = set()
+        for match in self._code_regex.finditer(text_upper):
+            position = match.start()
+            code_id = int(match.lastgroup[1:])
+            # Outros padrões podem casar na mesma posição: continuar pela cauda
+            while True:
+                if code_id not in matched:
+                    matched.add(code_id)
+                    counts[self._code_owner[code_id]] += 1
+                tail = self._code_tail(code_id + 1)
+                following = tail.match(text_upper, position) if tail else None
+                if not following:
+                    break
+                code_id = int(following.lastgroup[1:])
+        return counts
+
+    def keyword_matrix(self, lines):
+        """Matriz (linhas × produtos) com as keywords encontradas em cada linha"""
+        rows = [self.keyword_hits(line.upper()) for line in lines]
+        return np.array(rows, dtype=np.int64).reshape(len(lines), len(self.products))
+
+    @staticmethod
+    def context_window(matrix, radius=CONTEXT_RADIUS):
+        """Somar as keywords das linhas vizinhas com janela deslizante (sem a própria linha)"""
+        total_lines = matrix.shape[0]
+        prefix = np.zeros((total_lines + 1, matrix.shape[1]), dtype=np.int64)
+        np.cumsum(matrix, axis=0, out=prefix[1:])
+        rows = np.arange(total_lines)
+        upper = np.minimum(rows + radius + 1, total_lines)
+        lower = np.maximum(rows - radius, 0)
+        return prefix[upper] - prefix[lower] - matrix
+
+    def context_hits(self, context_lines):
+        """Somar as keywords de cada produto nas linhas de contexto"""
+        return self.keyword_matrix(context_lines).sum(axis=0).tolist()
+
+    def score_line(self, line, context_counts=None, keyword_counts=None):
+        """Pontuar todos os produtos do catálogo para uma linha"""
+        line_upper = line.upper()
+        if keyword_counts is None:
+            keyword_counts = self.keyword_hits(line_upper)
+        code_counts = self.code_hits(line_upper)
+        similarities = self.name_index.similarities(line).tolist()
+
+        scores = []
+        for idx in range(len(self.products)):
+            if self.require_line_hit and not (keyword_counts[idx] or code_counts[idx]):
+                scores.append(0)
+                continue
+            score = 0
+            score = _add_repeated(score, KEYWORD_WEIGHT, keyword_counts[idx])
+            score = _add_repeated(score, CODE_PATTERN_WEIGHT, code_counts[idx])
+
+            name_similarity = similarities[idx]
+            if name_similarity > self.similarity_threshold:
+                score += name_similarity * NAME_SIMILARITY_WEIGHT
+
+            if context_counts:
+                score = _add_repeated(score, CONTEXT_KEYWORD_WEIGHT, context_counts[idx])
+            scores.append(score)
+        return scores
+
+    def best_match(self, scores):
+        """Escolher o melhor produto (primeiro em caso de empate)"""
+        best_match = None
+        best_score = 0
+        for idx, score in enumerate(scores):
+            if score > best_score and score > MIN_MATCH_SCORE:
+                best_score = score
+                best_match = (self.product_keys[idx], self.products[idx], score)
+        return best_match
+
+    def identify(self, line, context_lines=()):
+        """Identificar produto Fast na linha com base no contexto"""
+        context_counts = self.context_hits(context_lines) if context_lines else None
+        return self.best_match(self.score_line(line, context_counts))
+
+    def identify_code(self, code):
+        """Produto pelo código exato do item (ex.: cProd da NF-e), ou None"""
+        idx = self._exact_codes.get(normalize_code(code or ''))
+        if idx is None:
+            return None
+        return (self.product_keys[idx], self.products[idx], 1.0)
+
+    def identify_item(self, code, description):
+        """Identificar item estruturado: código exato primeiro, depois código + descrição"""
+        return self.identify_code(code) or self.identify(f"{code or ''} {description or ''}".strip())
+
+    def scan_lines(self, lines, radius=CONTEXT_RADIUS):
+        """Preparar a varredura da nota: keywords por linha e bônus de contexto, uma única vez"""
+        keyword_matrix = self.keyword_matrix(lines)
+        context_matrix = self.context_window(keyword_matrix, radius)
+        return InvoiceScan(self, lines, keyword_matrix.tolist(), context_matrix.tolist())
+
+
+class InvoiceScan:
+    """Resultado pré-computado da varredura de keywords de uma nota"""
+
+    def __init__(self, matcher, lines, keyword_rows, context_rows):
+        self.matcher = matcher
+        self.lines = lines
+        self.keyword_rows = keyword_rows
+        self.context_rows = context_rows
+
+    def identify(self, index, line=None):
+        """Identificar o produto da linha de índice informado (opcionalmente já normalizada)"""
+        raw_line = self.lines[index]
+        line = raw_line if line is None else line
+        keyword_counts = self.keyword_rows[index]
+        if line != raw_line and not self.matcher._keywords_trimmed:
+            keyword_counts = None
+        scores = self.matcher.score_line(line, self.context_rows[index], keyword_counts)
+        return self.matcher.best_match(scores)
@@ -0,0 +1,176 @@
+# Limite de requisições por cliente (token bucket)
+# Estado O(1) por cliente: (fichas, último acesso). Com o backend SQLite o
+# balde é compartilhado entre todos os workers da máquina (o limite não se
+# multiplica pelo número de processos); o backend em memória é um LRU com
+# tamanho máximo. Nos dois, clientes ociosos são removidos.
+
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+BACKEND_MEMORY = 'memory'
+BACKEND_SQLITE = 'sqlite'
+
+
+class TokenBucket:
+    """Parâmetros do balde: `capacity` requisições de rajada, reposição de `capacity / window` por segundo"""
+
+    def __init__(self, capacity, window_seconds):
+        self.capacity = float(capacity)
+        self.rate = float(capacity) / float(window_seconds)
+        # Ocioso por uma janela inteira = balde cheio: o estado pode ser descartado
+        self.idle_seconds = float(window_seconds)
+
+    def take(self, tokens, updated, now):
+        """(permitido, fichas restantes) a partir do estado anterior (None = cliente novo)"""
+        if tokens is None:
+            tokens = self.capacity
+        else:
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            return True, tokens - 1
+        return False, tokens
+
+    def retry_after(self, tokens):
+        """Segundos até haver uma ficha disponível"""
+        return max(0.0, (1 - tokens) / self.rate)
+
+
+class MemoryBackend:
+    """Baldes por processo num LRU limitado a `max_keys` clientes"""
+
+    def __init__(self, bucket, max_keys=10000):
+        self.bucket = bucket
+        self.max_keys = max_keys
+        self._state = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._state.pop(key, (None, None))
+            allowed, tokens = self.bucket.take(tokens, updated, now)
+            self._state[key] = (tokens, now)
+            # Remover ociosos pela ponta mais antiga e manter o limite de chaves
+            while self._state:
+                oldest_key, (_, oldest_updated) = next(iter(self._state.items()))
+                if len(self._state) <= self.max_keys and now - oldest_updated < self.bucket.idle_seconds:
+                    break
+                del self._state[oldest_key]
+        return allowed, tokens
+
+    def __len__(self):
+        return len(self._state)
+
+
+class SQLiteBackend:
+    """Baldes numa tabela SQLite compartilhada entre processos (uma transação curta por requisição)"""
+
+    def __init__(self, bucket, db_path, max_keys=10000, evict_every=1000):
+        self.bucket = bucket
+        self.db_path = db_path
+        self.max_keys = max_keys
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._hits = 0
+        self._hits_lock = threading.Lock()
+
+    def _connection(self):
+        """Conexão da thread atual (aberta no primeiro uso, inclusive após fork)"""
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            # Estado descartável: perder os últimos acessos numa queda não importa
+            db.execute('PRAGMA synchronous=OFF')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS rate_buckets ('
+                'client TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS rate_buckets_updated ON rate_buckets (updated)')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute('SELECT tokens, updated FROM rate_buckets WHERE client = ?', (key,)).fetchone()
+            allowed, tokens = self.bucket.take(*(row or (None, None)), now)
+            db.execute('INSERT OR REPLACE INTO rate_buckets (client, tokens, updated) VALUES (?, ?, ?)',
+                       (key, tokens, now))
+            db.execute('COMMIT')
+        except BaseException:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+
+        with self._hits_lock:
+            self._hits += 1
+            evict = self._hits % self.evict_every == 0
+        if evict:
+            self.evict(now)
+        return allowed, tokens
+
+    def evict(self, now=None):
+        """Remover clientes ociosos e, acima de `max_keys`, os menos recentes"""
+        now = time.time() if now is None else now
+        db = self._connection()
+        db.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - self.bucket.idle_seconds,))
+        db.execute(
+            'DELETE FROM rate_buckets WHERE updated < ('
+            'SELECT updated FROM rate_buckets ORDER BY updated DESC LIMIT 1 OFFSET ?)', (self.max_keys - 1,)
+        )
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM rate_buckets').fetchone()[0]
+
+
+class RateLimiter:
+    """Limite por cliente; falhas do backend liberam a requisição (fail-open)"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def check(self, key):
+        """(permitido, segundos para tentar de novo)"""
+        try:
+            allowed, tokens = self.backend.hit(key)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Limite de requisições indisponível: {e}")
+            return True, 0.0
+        return allowed, 0.0 if allowed else self.backend.bucket.retry_after(tokens)
+
+
+def create_limiter(max_requests, window_seconds, backend=None, db_path=None, max_keys=None):
+    """RateLimiter com o backend de RATE_LIMIT_BACKEND (sqlite por padrão, compartilhado entre workers)"""
+    bucket = TokenBucket(max_requests, window_seconds)
+    backend = (backend or os.getenv('RATE_LIMIT_BACKEND', BACKEND_SQLITE)).lower()
+    max_keys = max_keys or int(os.getenv('RATE_LIMIT_MAX_CLIENTS', '10000'))
+    if backend == BACKEND_SQLITE:
+        db_path = db_path or os.getenv('RATE_LIMIT_DB', os.path.join(tempfile.gettempdir(), 'fast_rate_limit.sqlite3'))
+        return RateLimiter(SQLiteBackend(bucket, db_path, max_keys=max_keys))
+    return RateLimiter(MemoryBackend(bucket, max_keys=max_keys))
+
+
+def client_address(remote_addr, forwarded_for, trusted_proxies=0):
+    """IP do cliente: X-Forwarded-For só é considerado atrás de `trusted_proxies` proxies confiáveis
+
+    Cada proxy acrescenta o endereço que viu ao final do cabeçalho; o cliente
+    real é o endereço `trusted_proxies` posições antes do fim. O que vem antes
+    disso pode ter sido forjado pelo próprio cliente.
+    """
+    if trusted_proxies <= 0 or not forwarded_for:
+        return remote_addr
+    hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+    if len(hops) < trusted_proxies:
+        return hops[0] if hops else remote_addr
+    return hops[-trusted_proxies]
@@ -0,0 +1,117 @@
+# Cache de resultados de OCR endereçado por conteúdo
+# Chave: SHA-256 dos bytes da imagem + configuração de pré-processamento/OCR.
+# Duas camadas: LRU em memória (limite de entradas, bytes e TTL) e SQLite em
+# disco, que sobrevive a reinícios e é compartilhado entre processos.
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Cache de dois níveis (memória LRU + SQLite) para textos extraídos por OCR"""
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, ttl_seconds=86400, db_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+
+        self._memory = OrderedDict()  # chave -> (criado_em, valor)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        """Conexão SQLite do processo atual (aberta no primeiro uso, inclusive após fork)"""
+        if not self.db_path:
+            return None
+        if self._db_pid != os.getpid():
+            self._db_pid = os.getpid()
+            try:
+                self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS ocr_results ('
+                    'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)'
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Cache em disco indisponível ({self.db_path}): {e}")
+                self._db = None
+        return self._db
+
+    def _expired(self, created_at):
+        return time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key, created_at, value):
+        """Guardar na camada de memória, removendo os menos usados (chamado com o lock)"""
+        previous = self._memory.pop(key, None)
+        if previous:
+            self._memory_bytes -= len(previous[1])
+        self._memory[key] = (created_at, value)
+        self._memory_bytes += len(value)
+        while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get(self, key):
+        """Valor em cache para a chave, ou None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[0]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._memory[key]
+                self._memory_bytes -= len(entry[1])
+
+            db = self._connection()
+            if db is not None:
+                try:
+                    row = db.execute(
+                        'SELECT value, created_at FROM ocr_results WHERE key = ?', (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Erro ao ler cache em disco: {e}")
+                    row = None
+                if row and not self._expired(row[1]):
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Guardar o valor nas duas camadas"""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, value)
+            db = self._connection()
+            if db is not None:
+                try:
+                    db.execute(
+                        'INSERT OR REPLACE INTO ocr_results (key, value, created_at) VALUES (?, ?, ?)',
+                        (key, value, created_at)
+                    )
+                    db.execute(
+                        'DELETE FROM ocr_results WHERE created_at < ?', (created_at - self.ttl_seconds,)
+                    )
+                    db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Erro ao gravar cache em disco: {e}")
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
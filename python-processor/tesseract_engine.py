@@ -0,0 +1,293 @@
+# Motores Tesseract persistentes (tesserocr) com fallback para o pytesseract
+# O pytesseract abre um processo `tesseract` por chamada, grava a imagem num
+# arquivo temporário e recarrega o traineddata `por+eng` toda vez. Com o
+# tesserocr (binding da libtesseract) cada worker mantém alguns motores com o
+# modelo carregado, que recebem a imagem em memória e são reaproveitados entre
+# requisições. Motor que falha (ou atinge o limite de chamadas) é recriado.
+# Os bindings só são importados no primeiro uso (o boot do servidor não paga por eles).
+
+import importlib.util
+import json
+import logging
+import os
+import queue
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+TESSEROCR_AVAILABLE = importlib.util.find_spec('tesserocr') is not None
+PYTESSERACT_AVAILABLE = importlib.util.find_spec('pytesseract') is not None
+
+# Caminhos comuns do executável no Windows (fora do PATH)
+WINDOWS_TESSERACT_PATHS = (
+    r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+    r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
+    r'C:\Users\Public\Tesseract-OCR\tesseract.exe',
+)
+# Resultado da sonda compartilhado entre processos/boots (invalidado se o executável mudar)
+TESSERACT_PROBE_CACHE = os.getenv('TESSERACT_PROBE_CACHE',
+                                  os.path.join(tempfile.gettempdir(), 'fast_tesseract_probe.json'))
+
+ENGINE_TESSEROCR = 'tesserocr'
+ENGINE_PYTESSERACT = 'pytesseract'
+
+# Motor de OCR: 'auto' usa o tesserocr quando instalado
+OCR_ENGINE = os.getenv('OCR_ENGINE', 'auto').lower()
+# Motores por processo (uma chamada por motor de cada vez)
+OCR_ENGINES_PER_WORKER = int(os.getenv('OCR_ENGINES_PER_WORKER', os.getenv('OCR_REGION_THREADS', '4')))
+# Recriar o motor depois de tantas chamadas (limita o crescimento de memória da libtesseract)
+OCR_ENGINE_MAX_CALLS = int(os.getenv('OCR_ENGINE_MAX_CALLS', '1000'))
+
+
+def tesseract_config(psm, whitelist):
+    """Configuração do pytesseract para o modo de segmentação de página informado"""
+    # O pytesseract divide a configuração com shlex: a whitelist (com aspas) precisa ir citada
+    return f'--oem 3 --psm {psm} -c ' + shlex.quote('tessedit_char_whitelist=' + whitelist)
+
+
+def selected_engine():
+    """Motor de OCR em uso neste processo"""
+    if OCR_ENGINE == ENGINE_PYTESSERACT or not TESSEROCR_AVAILABLE:
+        return ENGINE_PYTESSERACT if PYTESSERACT_AVAILABLE else None
+    return ENGINE_TESSEROCR
+
+
+def _tesseract_candidates():
+    """Executáveis candidatos: TESSERACT_CMD, PATH e caminhos padrão do Windows"""
+    candidates = [os.getenv('TESSERACT_CMD'), shutil.which('tesseract')]
+    if os.name == 'nt':
+        candidates.extend(WINDOWS_TESSERACT_PATHS)
+    seen = []
+    for path in candidates:
+        if path and os.path.isfile(path) and path not in seen:
+            seen.append(path)
+    return seen
+
+
+def _probe_signature(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+def _read_probe_cache():
+    try:
+        with open(TESSERACT_PROBE_CACHE, encoding='utf-8') as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_probe_cache(entries):
+    try:
+        temporary = f"{TESSERACT_PROBE_CACHE}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as cache_file:
+            json.dump(entries, cache_file)
+        os.replace(temporary, TESSERACT_PROBE_CACHE)
+    except OSError as e:
+        logger.debug(f"Cache da sonda do Tesseract não gravado: {e}")
+
+
+_probe_result = None
+_probe_lock = threading.Lock()
+
+
+def probe_tesseract():
+    """Localizar o executável do Tesseract com `--version` (uma vez; resultado em cache)
+
+    Retorna {'cmd': caminho, 'version': versão} ou None.
+    """
+    global _probe_result
+    with _probe_lock:
+        if _probe_result is not None:
+            return _probe_result or None
+
+        cache = _read_probe_cache()
+        for path in _tesseract_candidates():
+            signature = _probe_signature(path)
+            if signature in cache:
+                _probe_result = cache[signature]
+                return _probe_result or None
+            try:
+                completed = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=10)
+            except (OSError, subprocess.SubprocessError):
+                continue
+            output = (completed.stdout or completed.stderr).strip()
+            if completed.returncode == 0 and output:
+                _probe_result = {'cmd': path, 'version': output.splitlines()[0]}
+                cache[signature] = _probe_result
+                _write_probe_cache(cache)
+                return _probe_result
+
+        _probe_result = {}
+        return None
+
+
+class TesseractEngine:
+    """Um motor tesserocr com o modelo de idiomas carregado"""
+
+    def __init__(self, lang, variables=None):
+        import tesserocr
+        self.lang = lang
+        self.variables = dict(variables or {})
+        self.calls = 0
+        self._api = tesserocr.PyTessBaseAPI(lang=lang, oem=tesserocr.OEM.DEFAULT)
+        for name, value in self.variables.items():
+            self._api.SetVariable(name, value)
+
+    def healthy(self):
+        """Motor inicializado com os idiomas esperados"""
+        try:
+            return self._api.GetInitLanguagesAsString() == self.lang
+        except Exception:
+            return False
+
+    def image_to_data(self, image, psm):
+        """OCR da imagem PIL no mesmo formato de `pytesseract.image_to_data(output_type=DICT)`"""
+        import tesserocr
+        self.calls += 1
+        api = self._api
+        api.SetPageSegMode(psm)
+        api.SetImage(image)
+        try:
+            api.Recognize()
+            data = {key: [] for key in ('level', 'block_num', 'par_num', 'line_num', 'word_num',
+                                        'left', 'top', 'width', 'height', 'conf', 'text')}
+            iterator = api.GetIterator()
+            if iterator is None:
+                return data
+
+            block = par = line = word = 0
+            level = tesserocr.RIL.WORD
+            for result in tesserocr.iterate_level(iterator, level):
+                if result.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                    block, par, line, word = block + 1, 0, 0, 0
+                if result.IsAtBeginningOf(tesserocr.RIL.PARA):
+                    par, line, word = par + 1, 0, 0
+                if result.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line, word = line + 1, 0
+                word += 1
+
+                box = result.BoundingBox(level)
+                if box is None:
+                    continue
+                x1, y1, x2, y2 = box
+                data['level'].append(5)
+                data['block_num'].append(block)
+                data['par_num'].append(par)
+                data['line_num'].append(line)
+                data['word_num'].append(word)
+                data['left'].append(x1)
+                data['top'].append(y1)
+                data['width'].append(x2 - x1)
+                data['height'].append(y2 - y1)
+                data['conf'].append(result.Confidence(level))
+                data['text'].append(result.GetUTF8Text(level) or '')
+            return data
+        finally:
+            api.Clear()
+
+    def close(self):
+        try:
+            self._api.End()
+        except Exception:
+            pass
+
+
+class EnginePool:
+    """Motores tesserocr reutilizáveis do processo atual, com verificação e reinício"""
+
+    def __init__(self, lang, variables=None, size=OCR_ENGINES_PER_WORKER, max_calls=OCR_ENGINE_MAX_CALLS):
+        self.lang = lang
+        self.variables = dict(variables or {})
+        self.size = max(1, size)
+        self.max_calls = max_calls
+        self.restarts = 0
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        """Motor livre (criado sob demanda até `size`; depois espera um ser devolvido)"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return TesseractEngine(self.lang, self.variables)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def _checkin(self, engine, failed=False):
+        """Devolver o motor; motores com falha, sem saúde ou gastos são recriados"""
+        if failed or engine.calls >= self.max_calls or not engine.healthy():
+            engine.close()
+            self.restarts += 1
+            if failed:
+                logger.warning("♻️ Motor Tesseract reiniciado após falha")
+            try:
+                engine = TesseractEngine(self.lang, self.variables)
+            except Exception as e:
+                logger.error(f"❌ Não foi possível recriar o motor Tesseract: {e}")
+                with self._lock:
+                    self._created -= 1
+                return
+        self._idle.put(engine)
+
+    def image_to_data(self, image, psm):
+        """OCR com um motor do pool (uma nova tentativa com motor novo se o motor falhar)"""
+        for attempt in range(2):
+            engine = self._checkout()
+            try:
+                data = engine.image_to_data(image, psm)
+            except Exception:
+                self._checkin(engine, failed=True)
+                if attempt:
+                    raise
+                continue
+            self._checkin(engine)
+            return data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_engine_pool(lang, variables=None):
+    """Pool de motores do processo atual (criado no primeiro uso, inclusive após fork)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = EnginePool(lang, variables)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def image_to_data(image, lang, psm, whitelist, timeout=0):
+    """OCR por palavra (dict no formato do pytesseract) com o motor configurado"""
+    if selected_engine() == ENGINE_TESSEROCR:
+        # Sem timeout por chamada: o timeout da tarefa no pool de OCR cobre travamentos
+        return get_engine_pool(lang, {'tessedit_char_whitelist': whitelist}).image_to_data(image, psm)
+
+    import pytesseract
+    return pytesseract.image_to_data(image, lang=lang, config=tesseract_config(psm, whitelist), timeout=timeout,
+                                     output_type=pytesseract.Output.DICT)
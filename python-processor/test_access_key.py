@@ -0,0 +1,142 @@
+# Chave de acesso da NF-e: dígito verificador, leitura do CODE-128/QR e atalho
+# do armazenamento local em /process-order. Só XMLs enviados com a API key (ou
+# do diretório do operador) são gravados e servidos pelo código de barras.
+#
+# Uso: python -m pytest -q test_access_key.py
+
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+import app_complete
+from access_key import _CODE128_PATTERNS, _CODE128_STOP, check_digit, is_valid_access_key, read_access_key
+from document_store import DocumentStore
+
+# UF 35, 06/2025, CNPJ 12.345.678/0001-90, modelo 55, série 1, nº 123456, tpEmis 1, código 00000123
+NFE_KEY = '35250612345678000190550010001234561000001230'
+NFCE_KEY = '35250612345678000190650010000001231000001232'
+
+NFE_XML = f'''<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe><infNFe Id="NFe{NFE_KEY}" versao="4.00">
+<ide><nNF>123456</nNF><dhEmi>2025-06-30T10:00:00-03:00</dhEmi></ide><dest><xNome>CONSTRUCOES ABC LTDA</xNome></dest>
+<det nItem="1"><prod><cProd>DW00057</cProd><xProd>PLACA ST 12,5MM</xProd><qCom>10</qCom><vUnCom>45.90</vUnCom>
+<vProd>459.00</vProd></prod></det><total><ICMSTot><vNF>459.00</vNF></ICMSTot></total></infNFe></NFe></nfeProc>'''.encode()
+
+
+def test_check_digit():
+    # Módulo 11 com pesos 2..9 da direita para a esquerda
+    assert check_digit(NFCE_KEY[:43]) == 2
+    # Resto 0 ou 1 vira dígito 0 (soma ponderada da chave NF-e: 550 = 50 × 11)
+    assert check_digit(NFE_KEY[:43]) == 0
+    assert check_digit('0' * 42 + '1') == 9
+
+
+@pytest.mark.parametrize('key, valid', [
+    (NFE_KEY, True),
+    (NFCE_KEY, True),
+    (NFE_KEY[:43] + '3', False),                 # Dígito verificador errado
+    (NFE_KEY[:-1], False),                       # 43 dígitos
+    ('99' + NFE_KEY[2:], False),                 # UF inexistente
+    (NFE_KEY[:20] + '57' + NFE_KEY[22:], False), # Modelo que não é NF-e/NFC-e
+    ('3525061234567800019055001000123456100000123A', False),
+])
+def test_is_valid_access_key(key, valid):
+    assert is_valid_access_key(key) is valid
+
+
+def code128c(digits, module=5, height=160, quiet=60):
+    """Imagem (página branca) com o CODE-128 subconjunto C dos dígitos"""
+    values = [105] + [int(digits[i:i + 2]) for i in range(0, len(digits), 2)]
+    values.append((values[0] + sum(i * value for i, value in enumerate(values[1:], 1))) % 103)
+    widths = [int(w) for value in values for w in _CODE128_PATTERNS[value]] + [int(w) for w in _CODE128_STOP]
+
+    page = Image.new('L', (sum(widths) * module + 2 * quiet + 200, height + 400), 255)
+    draw = ImageDraw.Draw(page)
+    x = quiet + 100
+    for i, width in enumerate(widths):
+        if i % 2 == 0:
+            draw.rectangle((x, 200, x + width * module - 1, 200 + height), fill=0)
+        x += width * module
+    return png(page)
+
+
+def qr_code(payload, scale=8):
+    import cv2
+    code = cv2.QRCodeEncoder.create().encode(payload)
+    code = Image.fromarray(code).resize((code.shape[1] * scale, code.shape[0] * scale), Image.NEAREST)
+    page = Image.new('L', (code.width + 400, code.height + 400), 255)
+    page.paste(code, (200, 200))
+    return png(page)
+
+
+def png(image):
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return output.getvalue()
+
+
+needs_cv2 = pytest.mark.skipif(not app_complete.CV2_AVAILABLE, reason='OpenCV indisponível')
+
+
+@needs_cv2
+def test_reads_access_key_from_code128():
+    assert read_access_key(code128c(NFE_KEY)) == NFE_KEY
+
+
+@needs_cv2
+def test_reads_access_key_from_nfce_qr():
+    url = f'https://www.nfce.fazenda.sp.gov.br/qrcode?p={NFCE_KEY}|2|1|1|A1B2C3'
+    assert read_access_key(qr_code(url)) == NFCE_KEY
+
+
+@needs_cv2
+def test_code128_with_wrong_check_digit_is_ignored():
+    assert read_access_key(code128c(NFE_KEY[:43] + '3')) is None
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = DocumentStore(db_path=str(tmp_path / 'nfe.sqlite3'))
+    monkeypatch.setattr(app_complete, 'DOCUMENT_STORE', store)
+    monkeypatch.setitem(app_complete.API_SECURITY, 'api_key', 'segredo')
+    return store
+
+
+def upload_nfe(headers=None):
+    client = app_complete.app.test_client()
+    return client.post('/process-nfe', data=NFE_XML, content_type='application/xml', headers=headers or {})
+
+
+def test_anonymous_upload_is_not_stored(store):
+    response = upload_nfe()
+    assert response.status_code == 200
+    assert response.json['results'][0]['stored'] is False
+    assert store.get(NFE_KEY) is None
+
+
+def test_authenticated_upload_is_stored(store):
+    response = upload_nfe({'X-Api-Key': 'segredo'})
+    assert response.json['results'][0]['stored'] is True
+    assert store.get(NFE_KEY)['numero'] == '123456'
+
+
+@needs_cv2
+def test_barcode_finds_stored_document(store):
+    upload_nfe({'X-Api-Key': 'segredo'})
+
+    result = app_complete.process_order_image(code128c(NFE_KEY))
+
+    assert result['data']['accessKey'] == NFE_KEY
+    assert result['data']['processedBy'] == 'python-nfe-access-key'
+    assert result['data']['orderNumber'] == 'NF-123456'
+    assert result['data']['totalPoints'] == 229  # 459,00 × 0,5 ponto por real
+
+
+@needs_cv2
+def test_barcode_of_anonymous_upload_falls_back_to_ocr(store):
+    upload_nfe()
+
+    result = app_complete.process_order_image(code128c(NFE_KEY))
+
+    assert result['data']['processedBy'] != 'python-nfe-access-key'
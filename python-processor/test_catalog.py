@@ -0,0 +1,58 @@
+# Catálogo carregado da tabela produtos_elegiveis (linhas do seed em sql/)
+# Sem Guia/Montante na tabela, as linhas de guia e montante da nota simulada
+# não podem pontuar como outro produto só pelo bônus de contexto.
+#
+# Uso: python -m pytest -q test_catalog.py
+
+import os
+import re
+
+import pytest
+
+import app_complete
+from catalog import SOURCE_BUILTIN, SOURCE_SNAPSHOT, SOURCE_SUPABASE, CatalogIndex, catalog_from_rows
+
+SEED_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql', 'init_produtos_elegiveis.sql')
+SEED_ROW = re.compile(r"\('([^']*)', '([^']*)', ([\d.]+), '([^']*)', '([^']*)', (true|false)\)")
+
+
+def seed_rows():
+    with open(SEED_SQL, encoding='utf-8') as f:
+        return [{'codigo': code, 'nome': name, 'pontos_por_real': float(points), 'categoria': category,
+                 'descricao': description, 'ativo': active == 'true'}
+                for code, name, points, category, description, active in SEED_ROW.findall(f.read())]
+
+
+def process_simulated_invoice(monkeypatch, index):
+    monkeypatch.setattr(app_complete.CATALOG, '_index', index)
+    text = app_complete.clean_ocr_text(app_complete.generate_realistic_simulated_text())
+    return app_complete.process_invoice_text(text)
+
+
+def scored_lines(result, word):
+    return [p for p in result['eligible_products'] if word in p['source_line']]
+
+
+def test_seed_has_no_guia_or_montante():
+    catalog = catalog_from_rows(seed_rows(), app_complete.PRODUTOS_FAST_DATABASE)
+    assert len(catalog) == 19
+    assert not any('GUIA' in key or 'MONTANTE' in key for key in catalog)
+
+
+@pytest.mark.parametrize('source', [SOURCE_SNAPSHOT, SOURCE_SUPABASE])
+def test_seed_catalog_needs_keyword_on_the_line(monkeypatch, source):
+    catalog = catalog_from_rows(seed_rows(), app_complete.PRODUTOS_FAST_DATABASE)
+    result = process_simulated_invoice(monkeypatch, CatalogIndex(catalog, 'seed', source, 0.62))
+
+    assert scored_lines(result, 'GUIA DRYWALL') == []
+    assert scored_lines(result, 'MONTANTE DRYWALL') == []
+    # 5084 do catálogo embutido menos Guia (187) e Montante (453), ausentes da tabela
+    assert result['total_eligible_points'] == 4444
+
+
+def test_builtin_catalog_keeps_context_bonus(monkeypatch):
+    index = CatalogIndex(app_complete.PRODUTOS_FAST_DATABASE, SOURCE_BUILTIN, SOURCE_BUILTIN, 0.62)
+    result = process_simulated_invoice(monkeypatch, index)
+
+    assert [p['name'] for p in scored_lines(result, 'GUIA DRYWALL')] == ['Guia Drywall']
+    assert result['total_eligible_points'] == 5084
@@ -0,0 +1,85 @@
+# Comparação do tokenizador de linhas com a saída do extract_numeric_values antigo
+# Os valores esperados (golden) foram gravados rodando a implementação anterior
+# (regex de quantidade + três regex monetárias por linha) sobre a nota simulada.
+#
+# Uso: python -m pytest -q test_comparison.py
+
+import pytest
+
+import app_complete
+from line_tokenizer import parse_line
+
+SIMULATED_TEXT = app_complete.generate_realistic_simulated_text()
+
+# Linha -> (valor_unitario, valor_total) da implementação anterior
+LEGACY_ITEM_VALUES = {
+    '01': (45.9, 688.5),
+    '02': (32.5, 650.0),
+    '03': (89.9, 719.2),
+    '04': (15.6, 187.2),
+    '05': (18.9, 453.6),
+    '06': (125.0, 375.0),
+    '07': (45.8, 229.0),
+}
+
+# Quantidade da coluna da nota. A implementação anterior pegava o primeiro número
+# seguido de algo parecido com unidade: 12 de "12MM", 5 de "05  MONTANTE"...
+ITEM_QUANTITIES = {'01': 15.0, '02': 20.0, '03': 8.0, '04': 12.0, '05': 24.0, '06': 3.0, '07': 5.0}
+ITEM_UNITS = {'01': 'UN', '02': 'UN', '03': 'SC', '04': 'UN', '05': 'UN', '06': 'RL', '07': 'SC'}
+
+# Pontos por produto elegível da implementação anterior (ordem das linhas)
+LEGACY_POINTS = [0, 0, 1377, 650, 1438, 187, 453, 750, 229, 0]
+LEGACY_TOTAL_POINTS = 5084
+
+
+def item_lines():
+    lines = {}
+    for line in SIMULATED_TEXT.split('\n'):
+        line = line.strip()
+        if line[:2] in LEGACY_ITEM_VALUES:
+            lines[line[:2]] = line
+    return lines
+
+
+@pytest.mark.parametrize('item', sorted(LEGACY_ITEM_VALUES))
+def test_item_line_matches_legacy_values(item):
+    line = item_lines()[item]
+    unit_price, total = LEGACY_ITEM_VALUES[item]
+
+    values = app_complete.extract_numeric_values(line)
+    assert values['valor_unitario'] == unit_price
+    assert values['valor_total'] == total
+
+    fields = parse_line(line)
+    assert fields['unit_price'] == unit_price
+    assert fields['total'] == total
+    assert fields['quantity'] == ITEM_QUANTITIES[item]
+    assert fields['unit'] == ITEM_UNITS[item]
+    assert fields['code'] is None
+    assert fields['description'] == line[2:line.index(f" {ITEM_UNITS[item]} ")].strip()
+
+
+def test_amounts_are_counted_once():
+    # Antes: as três regex se sobrepunham e "3.302,50" virava [3302.5, 3302.5, 330.0, 2.5]
+    assert app_complete.extract_numeric_values('VALOR TOTAL: R$ 3.302,50') == {'valor_total': 3302.5}
+    assert app_complete.extract_numeric_values('DESCONTO: R$ 0,00') == {'valor_total': 0.0}
+    # Pedaços de CNPJ não são valores monetários
+    assert app_complete.extract_numeric_values('CNPJ: 12.345.678/0001-90') == {}
+
+
+def test_product_code():
+    assert parse_line('DW00057 PLACA ST 12,5MM UN 10 R$ 45,90 R$ 459,00')['code'] == 'DW00057'
+    assert parse_line('123456 GUIA DRYWALL 48MM PC 10 45.90 459.00')['code'] == '123456'
+    assert app_complete.extract_product_code('PLACA GLASROC X 12MM') == 'N/A'
+
+
+def test_invoice_matches_legacy_points():
+    result = app_complete.process_invoice_text(SIMULATED_TEXT)
+
+    assert [product['points'] for product in result['eligible_products']] == LEGACY_POINTS
+    assert result['total_eligible_points'] == LEGACY_TOTAL_POINTS
+    assert result['order_info']['valor_total_nota'] == 3302.5
+
+    items = [product for product in result['all_products'] if product['description'][:2] in LEGACY_ITEM_VALUES]
+    assert [(p['unit_price'], p['value']) for p in items] == [LEGACY_ITEM_VALUES[k] for k in sorted(LEGACY_ITEM_VALUES)]
+    assert [p['quantity'] for p in items] == [ITEM_QUANTITIES[k] for k in sorted(ITEM_QUANTITIES)]
@@ -0,0 +1,74 @@
+# Campos do cabeçalho (extract_header): valor e confiança de cada campo
+# Cabeçalho limpo, rótulos/datas embaralhados pelo OCR (padrões de menor
+# confiança ou campo descartado) e campos ausentes (None com confiança 0.0).
+#
+# Uso: python -m pytest -q test_header_fields.py
+
+from header_fields import OUT_OF_BAND_FACTOR, extract_header
+
+HEADER = """FAST SISTEMAS CONSTRUTIVOS LTDA
+CNPJ: 12.345.678/0001-90
+NOTA FISCAL DE VENDA Nº 000123456
+DATA: 30/06/2025
+
+CLIENTE: CONSTRUÇÕES ABC LTDA
+CNPJ: 98.765.432/0001-10
+
+01  PLACA RU 15MM                  UN    20    R$ 32,50    R$ 650,00
+02  PLACOMIX 20KG                  SC     5    R$ 45,80    R$ 229,00
+
+VALOR TOTAL: R$ 879,00
+VALOR LÍQUIDO: R$ 879,00
+"""
+
+
+def test_clear_header():
+    fields, confidence = extract_header(HEADER)
+
+    assert fields == {'numero_nota': 'NF-000123456', 'data_emissao': '2025-06-30',
+                      'cliente': 'CONSTRUÇÕES ABC LTDA', 'valor_total_nota': 879.0}
+    assert confidence == {'numero_nota': 0.9, 'data_emissao': 0.9, 'cliente': 0.9, 'valor_total_nota': 0.9}
+
+
+def test_garbled_labels_fall_back_to_weaker_patterns():
+    # "NOTA" lido como "N0TA" e a data com letras O no lugar de zeros
+    text = (HEADER.replace('NOTA FISCAL', 'N0TA FISCAI')
+            .replace('DATA: 30/06/2025', 'DATA: 3O/O6/2025\nVENCIMENTO: 30/07/2025'))
+    fields, confidence = extract_header(text)
+
+    assert fields['numero_nota'] == 'NF-000123456'
+    assert confidence['numero_nota'] == 0.6  # Só pelo "Nº"
+    assert fields['data_emissao'] == '2025-07-30'
+    assert confidence['data_emissao'] == 0.6  # Data solta, sem rótulo
+    assert confidence['cliente'] == 0.9
+
+
+def test_impossible_date_is_discarded():
+    fields, confidence = extract_header(HEADER.replace('30/06/2025', '31/02/2025'))
+
+    assert fields['data_emissao'] is None
+    assert confidence['data_emissao'] == 0.0
+
+
+def test_missing_fields():
+    text = HEADER.replace('CLIENTE: CONSTRUÇÕES ABC LTDA\n', '').replace('VALOR TOTAL: R$ 879,00\n', '')
+    fields, confidence = extract_header(text)
+
+    assert fields['cliente'] is None
+    assert confidence['cliente'] == 0.0
+    # Sem "VALOR TOTAL", o valor líquido assume com menos confiança
+    assert fields['valor_total_nota'] == 879.0
+    assert confidence['valor_total_nota'] == 0.8
+
+    fields, confidence = extract_header('')
+    assert set(fields.values()) == {None}
+    assert set(confidence.values()) == {0.0}
+
+
+def test_header_field_in_footer_is_discounted():
+    items = [f'{i:02d}  PLACA RU 15MM  UN  1  R$ 32,50  R$ 32,50' for i in range(1, 61)]
+    text = '\n'.join(['FAST SISTEMAS CONSTRUTIVOS LTDA'] + items + ['NOTA FISCAL Nº 000123456'])
+    fields, confidence = extract_header(text)
+
+    assert fields['numero_nota'] == 'NF-000123456'
+    assert confidence['numero_nota'] == round(0.9 * OUT_OF_BAND_FACTOR, 2)
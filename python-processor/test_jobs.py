@@ -0,0 +1,106 @@
+# Jobs assíncronos compartilhados entre workers (JobStore sobre SQLite)
+# O POST /jobs e o GET /jobs/<id> podem cair em workers diferentes do gunicorn:
+# cada teste cria o job numa instância e lê em outra (ou em outro processo).
+#
+# Uso: python -m pytest -q test_jobs.py
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from jobs import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobStore
+
+
+def wait_finished(store, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job and job['status'] not in (JOB_QUEUED, JOB_RUNNING):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} não terminou em {timeout}s")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.sqlite3')
+
+
+def process_invoice(value, timings=None):
+    timings['ocr'] = 1.0
+    return {'success': True, 'data': {'totalPoints': value}}
+
+
+def failing_invoice(value, timings=None):
+    raise ValueError(f'nota {value} ilegível')
+
+
+def test_job_created_in_one_worker_is_read_by_another(db_path):
+    writer = JobStore(db_path=db_path)
+    reader = JobStore(db_path=db_path)
+
+    job_id = writer.submit(process_invoice, 650)
+    job = wait_finished(reader, job_id)
+
+    assert job['status'] == JOB_DONE
+    assert job['result'] == {'success': True, 'data': {'totalPoints': 650}}
+    assert job['timings']['ocr'] == 1.0 and 'queue' in job['timings']
+    assert JobStore.describe(job)['jobId'] == job_id
+
+
+def test_failed_job_keeps_its_error_response(db_path):
+    writer = JobStore(db_path=db_path, error_response=lambda e: ({'success': False, 'error': str(e)}, 422))
+    reader = JobStore(db_path=db_path)
+
+    job = wait_finished(reader, writer.submit(failing_invoice, 7))
+
+    assert job['status'] == JOB_FAILED
+    assert job['error'] == 'nota 7 ilegível'
+    assert job['error_response'] == [{'success': False, 'error': 'nota 7 ilegível'}, 422]
+
+
+def test_job_is_read_from_another_process(db_path):
+    job_id = JobStore(db_path=db_path).submit(process_invoice, 1377)
+    wait_finished(JobStore(db_path=db_path), job_id)
+
+    script = (
+        'import json, sys\n'
+        'from jobs import JobStore\n'
+        'job = JobStore(db_path=sys.argv[1]).get(sys.argv[2])\n'
+        'print(json.dumps([job["status"], job["result"]]))\n'
+    )
+    output = subprocess.run([sys.executable, '-c', script, db_path, job_id], check=True, capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert json.loads(output) == [JOB_DONE, {'success': True, 'data': {'totalPoints': 1377}}]
+
+
+def test_job_of_a_dead_worker_is_reported_failed(db_path):
+    store = JobStore(db_path=db_path)
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+
+    job_id = store.submit(lambda timings=None: None)
+    wait_finished(store, job_id)
+    with store._lock:
+        store._connection().execute(
+            'UPDATE jobs SET status = ?, finished_at = NULL, owner = ? WHERE id = ?',
+            (JOB_RUNNING, f"{JobStore.owner().rpartition(':')[0]}:{dead.pid}", job_id)
+        )
+
+    job = JobStore(db_path=db_path).get(job_id)
+    assert job['status'] == JOB_FAILED
+    assert job['error_response'][1] == 503
+    assert store.get(job_id)['status'] == JOB_FAILED
+
+
+def test_finished_jobs_expire(db_path):
+    store = JobStore(db_path=db_path, ttl_seconds=0)
+    job_id = store.submit(process_invoice, 1)
+    deadline = time.time() + 5
+    while store.get(job_id) is not None and time.time() < deadline:
+        time.sleep(0.01)
+    assert store.get(job_id) is None
@@ -0,0 +1,99 @@
+# Métricas somadas entre processos (workers do gunicorn) via SQLite
+# Cada processo grava os próprios valores; o /metrics de qualquer um deles
+# exporta a soma, inclusive de processos já encerrados (reciclados).
+#
+# Uso: python -m pytest -q test_metrics.py
+
+import os
+import subprocess
+import sys
+
+from metrics import MetricsRegistry
+
+WORKER_SCRIPT = '''
+import sys
+from metrics import MetricsRegistry
+
+registry = MetricsRegistry(db_path=sys.argv[1])
+requests = registry.counter('fast_requests_total', 'Requisições', labels=('status',))
+latency = registry.histogram('fast_request_duration_seconds', 'Latência', buckets=(0.1, 1.0))
+registry.gauge('fast_ocr_queue_depth', 'Fila', lambda: 3)
+for _ in range(int(sys.argv[2])):
+    requests.inc(status='200')
+    latency.observe(0.5)
+requests.inc(status='503')
+registry.flush()
+if len(sys.argv) > 3:
+    print('ok', flush=True)
+    sys.stdin.read()  # Worker vivo até o teste fechar a entrada
+'''
+
+
+def make_registry(db_path):
+    registry = MetricsRegistry(db_path=db_path)
+    requests = registry.counter('fast_requests_total', 'Requisições', labels=('status',))
+    latency = registry.histogram('fast_request_duration_seconds', 'Latência', buckets=(0.1, 1.0))
+    registry.gauge('fast_ocr_queue_depth', 'Fila', lambda: 1)
+    return registry, requests, latency
+
+
+def run_worker(db_path, count, keep_alive=False):
+    args = [sys.executable, '-c', WORKER_SCRIPT, db_path, str(count)] + (['alive'] if keep_alive else [])
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    if not keep_alive:
+        subprocess.run(args, check=True, cwd=cwd)
+        return None
+    worker = subprocess.Popen(args, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    assert worker.stdout.readline().strip() == 'ok'
+    return worker
+
+
+def samples(text):
+    return dict(line.rsplit(' ', 1) for line in text.splitlines() if line and not line.startswith('#'))
+
+
+def test_counters_from_two_processes_are_summed(tmp_path):
+    db_path = str(tmp_path / 'metrics.sqlite3')
+    run_worker(db_path, 2)
+    run_worker(db_path, 3)
+
+    registry, requests, latency = make_registry(db_path)
+    requests.inc(status='200')
+    latency.observe(0.05)
+    values = samples(registry.render())
+
+    assert values['fast_requests_total{status="200"}'] == '6'
+    assert values['fast_requests_total{status="503"}'] == '2'
+    assert values['fast_request_duration_seconds_count'] == '6'
+    assert values['fast_request_duration_seconds_bucket{le="0.1"}'] == '1'
+    assert values['fast_request_duration_seconds_bucket{le="1"}'] == '6'
+    assert values['fast_request_duration_seconds_bucket{le="+Inf"}'] == '6'
+    # Gauge só dos processos vivos: os dois workers já encerraram
+    assert values['fast_ocr_queue_depth'] == '1'
+
+
+def test_live_worker_gauge_is_summed_and_counters_stay_monotonic(tmp_path):
+    db_path = str(tmp_path / 'metrics.sqlite3')
+    registry, requests, _ = make_registry(db_path)
+    worker = run_worker(db_path, 4, keep_alive=True)
+    try:
+        values = samples(registry.render())
+        assert values['fast_ocr_queue_depth'] == '4'
+        assert values['fast_requests_total{status="200"}'] == '4'
+    finally:
+        worker.communicate('')
+
+    # Worker reciclado: o gauge sai, o contador continua somado
+    requests.inc(status='200')
+    values = samples(registry.render())
+    assert values['fast_ocr_queue_depth'] == '1'
+    assert values['fast_requests_total{status="200"}'] == '5'
+
+
+def test_without_db_path_only_local_values():
+    registry, requests, _ = make_registry(None)
+    requests.inc(status='200')
+    values = samples(registry.render())
+    assert values['fast_requests_total{status="200"}'] == '1'
+    assert values['fast_ocr_queue_depth'] == '1'
+    assert 'fast_request_duration_seconds_count' not in values
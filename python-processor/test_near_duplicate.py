@@ -0,0 +1,100 @@
+# Notas quase duplicadas: o dHash aponta candidatas, mas nunca substitui o OCR
+# Duas notas diferentes no mesmo modelo ficam a poucos bits de distância; cada
+# uma precisa do próprio OCR. Só a mesma nota (mesmo número e valor) é marcada.
+#
+# Uso: python -m pytest -q test_near_duplicate.py
+
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+import app_complete
+from perceptual_hash import DEFAULT_MAX_DISTANCE, NearDuplicateIndex, dhash, hamming_distance
+from result_cache import ResultCache
+
+
+def invoice_image(number, items, rotate=0.0):
+    """Nota no mesmo modelo (cabeçalho e quadro de itens) com número e itens próprios"""
+    image = Image.new('L', (800, 1100), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((20, 20, 780, 140), outline=0, width=3)
+    draw.text((40, 40), 'FAST SISTEMAS CONSTRUTIVOS - DANFE', fill=0)
+    draw.text((40, 80), f'NOTA FISCAL Nº {number}', fill=0)
+    draw.rectangle((20, 180, 780, 900), outline=0, width=3)
+    for i, (description, total) in enumerate(items):
+        draw.text((40, 200 + i * 30), f'{i + 1:02d}  {description}  R$ {total}', fill=0)
+    if rotate:
+        image = image.rotate(rotate, fillcolor=255)
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return output.getvalue()
+
+
+def invoice_text(number, items):
+    lines = [f'NOTA FISCAL Nº {number}', 'DATA: 30/06/2025']
+    lines += [f'{i + 1:02d}  {description}  UN  1  R$ {total}  R$ {total}' for i, (description, total) in enumerate(items)]
+    total = sum(float(value.replace('.', '').replace(',', '.')) for _, value in items)
+    lines.append(f"VALOR TOTAL: R$ {total:.2f}".replace('.', ','))
+    return '\n'.join(lines)
+
+
+FIRST = ('000123456', [('PLACA RU 15MM', '650,00'), ('GUIA DRYWALL 48MM', '120,00')])
+SECOND = ('000987654', [('PLACA ST 12,5MM', '459,00'), ('MONTANTE DRYWALL 48MM', '310,00')])
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    """OCR simulado por imagem; conta as execuções"""
+    texts = {}
+    calls = []
+
+    def fake_tiered_ocr(image_bytes, timings=None):
+        calls.append(image_bytes)
+        return {'text': texts[image_bytes], 'confidence': 90.0, 'words': 20, 'tier': 'fast'}, None
+
+    monkeypatch.setattr(app_complete, 'TESSERACT_AVAILABLE', True)
+    monkeypatch.setattr(app_complete, 'RESULT_CACHE', ResultCache(db_path=None))
+    monkeypatch.setattr(app_complete, 'NEAR_DUPLICATE_INDEX', NearDuplicateIndex())
+    monkeypatch.setattr(app_complete, 'NEAR_DUPLICATE_MODE', 'flag')
+    monkeypatch.setattr(app_complete, 'run_tiered_ocr', fake_tiered_ocr)
+    return texts, calls
+
+
+def extract(image_bytes):
+    ocr_info = {}
+    text = app_complete.extract_text_with_ocr(image_bytes, {}, ocr_info)
+    return text, ocr_info
+
+
+def test_same_template_invoices_are_within_hash_distance():
+    first = dhash(Image.open(io.BytesIO(invoice_image(*FIRST))))
+    second = dhash(Image.open(io.BytesIO(invoice_image(*SECOND))))
+    assert hamming_distance(first, second) <= DEFAULT_MAX_DISTANCE
+
+
+def test_same_template_invoice_is_not_reused(ocr):
+    texts, calls = ocr
+    first, second = invoice_image(*FIRST), invoice_image(*SECOND)
+    texts[first], texts[second] = invoice_text(*FIRST), invoice_text(*SECOND)
+
+    extract(first)
+    text, ocr_info = extract(second)
+
+    assert len(calls) == 2
+    assert '000987654' in text and 'MONTANTE' in text and '000123456' not in text
+    assert ocr_info['nearDuplicate'] is None
+    points = app_complete.process_invoice_text(text)['total_eligible_points']
+    assert points == app_complete.process_invoice_text(app_complete.clean_ocr_text(texts[second]))['total_eligible_points']
+
+
+def test_same_invoice_photographed_again_is_flagged(ocr):
+    texts, calls = ocr
+    first, again = invoice_image(*FIRST), invoice_image(*FIRST, rotate=0.3)
+    texts[first] = texts[again] = invoice_text(*FIRST)
+
+    extract(first)
+    _, ocr_info = extract(again)
+
+    assert len(calls) == 2
+    assert ocr_info['nearDuplicate']['reviewRequired'] is True
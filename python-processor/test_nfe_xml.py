@@ -0,0 +1,133 @@
+# Leitura do XML da NF-e sem OCR (iter_nfe / iter_nfe_sources / invoice_from_nfe)
+# XML avulso, pacote ZIP com um membro corrompido (erro só daquele documento)
+# e infNFe com e sem o namespace do portal fiscal.
+#
+# Uso: python -m pytest -q test_nfe_xml.py
+
+import io
+import zipfile
+
+import pytest
+
+import app_complete
+from nfe_xml import InvalidNFe, invoice_from_nfe, iter_nfe, iter_nfe_sources
+from product_matcher import ProductMatcher
+
+NAMESPACE = ' xmlns="http://www.portalfiscal.inf.br/nfe"'
+KEY = '35250612345678000190550010001234561000001230'
+
+
+def nfe_xml(number='123456', namespace=NAMESPACE, key=KEY):
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc{namespace} versao="4.00"><NFe><infNFe Id="NFe{key}" versao="4.00">
+<ide><nNF>{number}</nNF><dhEmi>2025-06-30T10:00:00-03:00</dhEmi></ide>
+<emit><xNome>FAST SISTEMAS CONSTRUTIVOS LTDA</xNome></emit>
+<dest><CNPJ>98765432000110</CNPJ><xNome>CONSTRUCOES ABC LTDA</xNome></dest>
+<det nItem="1"><prod><cProd>DW00057</cProd><xProd>PLACA ST 12,5MM</xProd><uCom>UN</uCom><qCom>10.0000</qCom>
+<vUnCom>45.90</vUnCom><vProd>459.00</vProd></prod></det>
+<det nItem="2"><prod><cProd>7891234</cProd><xProd>PLACA RU 15MM</xProd><uCom>UN</uCom><qCom>20</qCom>
+<vUnCom>32.50</vUnCom><vProd>650.00</vProd></prod></det>
+<det nItem="3"><prod><cProd>PF001</cProd><xProd>PARAFUSO 25MM</xProd><uCom>CX</uCom><qCom>2</qCom>
+<vUnCom>20.00</vUnCom><vProd>40.00</vProd></prod></det>
+<total><ICMSTot><vProd>1149.00</vProd><vNF>1149.00</vNF></ICMSTot></total>
+</infNFe></NFe></nfeProc>'''.encode()
+
+
+def zip_bundle(members):
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w') as bundle:
+        for name, data in members:
+            bundle.writestr(name, data)
+    output.seek(0)
+    return output
+
+
+@pytest.fixture
+def matcher():
+    return ProductMatcher(app_complete.PRODUTOS_FAST_DATABASE)
+
+
+def test_single_xml(matcher):
+    [document] = list(iter_nfe(io.BytesIO(nfe_xml())))
+
+    assert document['access_key'] == KEY
+    assert document['numero'] == '123456'
+    assert document['data_emissao'] == '2025-06-30'
+    assert document['cliente'] == 'CONSTRUCOES ABC LTDA'
+    assert document['cliente_documento'] == '98765432000110'
+    assert document['valor_total'] == 1149.0
+    assert [item['code'] for item in document['items']] == ['DW00057', '7891234', 'PF001']
+    assert document['items'][0]['quantity'] == 10.0
+
+    invoice = invoice_from_nfe(document, matcher)
+    assert invoice['processing_method'] == 'nfe_xml'
+    assert invoice['order_info']['numero_nota'] == 'NF-123456'
+    assert invoice['order_info']['field_confidence']['cliente'] == 1.0
+    # Placa ST pelo código exato (0,5 ponto/real), Placa RU pela descrição; parafuso não é elegível
+    assert [(p['name'], p['points']) for p in invoice['eligible_products']] == [('Placa ST', 229), ('Placa RU', 650)]
+    assert invoice['total_eligible_points'] == 879
+    assert len(invoice['all_products']) == 3
+
+
+def test_single_xml_source_from_unseekable_stream():
+    class Unseekable(io.RawIOBase):
+        def __init__(self, data):
+            self._data = io.BytesIO(data)
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            return self._data.readinto(buffer)
+
+    [(name, document)] = list(iter_nfe_sources(Unseekable(nfe_xml()), 'nota.xml'))
+    assert name == 'nota.xml'
+    assert document['numero'] == '123456'
+
+
+def test_zip_with_one_malformed_member():
+    bundle = zip_bundle([
+        ('lote/nota1.xml', nfe_xml('1001')),
+        ('lote/nota2.xml', nfe_xml('1002')[:-40]),  # Truncado
+        ('lote/leia-me.txt', b'ignorado'),
+        ('lote/evento.xml', b'<procEventoNFe><evento/></procEventoNFe>'),
+        ('lote/nota3.xml', nfe_xml('1003')),
+    ])
+
+    results = list(iter_nfe_sources(bundle, 'lote.zip'))
+
+    assert [name for name, _ in results] == ['lote/nota1.xml', 'lote/nota2.xml', 'lote/evento.xml', 'lote/nota3.xml']
+    assert results[0][1]['numero'] == '1001'
+    assert isinstance(results[1][1], InvalidNFe) and 'XML inválido' in str(results[1][1])
+    assert isinstance(results[2][1], InvalidNFe) and 'infNFe' in str(results[2][1])
+    assert results[3][1]['numero'] == '1003'
+
+
+def test_zip_document_limit(monkeypatch):
+    monkeypatch.setattr('nfe_xml.NFE_MAX_DOCUMENTS', 2)
+    bundle = zip_bundle([(f'nota{i}.xml', nfe_xml(str(i))) for i in range(3)])
+
+    results = list(iter_nfe_sources(bundle, 'lote.zip'))
+
+    assert [document['numero'] for _, document in results[:2]] == ['0', '1']
+    assert isinstance(results[2][1], InvalidNFe)
+
+
+def test_namespaced_and_plain_infnfe_are_read_the_same(matcher):
+    [namespaced] = list(iter_nfe(io.BytesIO(nfe_xml(namespace=NAMESPACE))))
+    [plain] = list(iter_nfe(io.BytesIO(nfe_xml(namespace=''))))
+
+    assert namespaced == plain
+    assert invoice_from_nfe(namespaced, matcher)['total_eligible_points'] == \
+        invoice_from_nfe(plain, matcher)['total_eligible_points'] == 879
+
+
+def test_missing_header_fields_get_defaults(matcher):
+    xml = b'<NFe><infNFe Id="NFe1"><det><prod><cProd>DW00057</cProd><vProd>10.00</vProd></prod></det></infNFe></NFe>'
+    [document] = list(iter_nfe(io.BytesIO(xml)))
+
+    order_info = invoice_from_nfe(document, matcher)['order_info']
+    assert order_info['numero_nota'].startswith('PYTHON-')
+    assert order_info['cliente'] == 'Cliente Python'
+    assert order_info['field_confidence'] == {'numero_nota': 0.0, 'data_emissao': 0.0, 'cliente': 0.0,
+                                              'valor_total_nota': 1.0}
@@ -0,0 +1,52 @@
+# Correções de OCR (OCRCorrector) compiladas a partir do catálogo embutido
+# Códigos e números recebem a troca letra -> dígito; palavras do catálogo são
+# corrigidas pelo vocabulário; o resto do texto fica intacto.
+#
+# Uso: python -m pytest -q test_ocr_corrections.py
+
+import pytest
+
+import app_complete
+from ocr_corrections import OCRCorrector
+
+CORRECTOR = OCRCorrector(app_complete.PRODUTOS_FAST_DATABASE)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('DW0O057 PLACA ST', 'DW00057 PLACA ST'),
+    ('DWOO074 GUIA', 'DW00074 GUIA'),
+    ('PLAGA GLASROG X', 'PLACA GLASROC X'),
+    ('UN 2O R$ 32,5O R$ 65O,OO', 'UN 20 R$ 32,50 R$ 650,00'),
+    ('R$ 1.377,OO', 'R$ 1.377,00'),
+    ('DATA DE EMISSAO: 3O/O6/2O25', 'DATA DE EMISSAO: 30/06/2025'),
+    ('NF-OOO123456', 'NF-000123456'),
+])
+def test_corrects_codes_words_and_numbers(text, expected):
+    assert CORRECTOR.correct(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    'NOTA FISCAL ELETRONICA',
+    'DWELL GRANDE',            # Prefixo de código sem dígito é palavra comum
+    'CP II 50KG O IO',         # O/I soltos, sem dígito real
+    'TINTA 18L BALDE 3D',      # L e D colados ao número são unidade
+    'PLACA ST 12,5MM',
+])
+def test_keeps_ordinary_text(text):
+    assert CORRECTOR.correct(text) == text
+
+
+def test_misread_item_line_keeps_points():
+    line = '01 PLACA RU 15MM UN 2O R$ 32,5O R$ 65O,OO'
+    result = app_complete.process_invoice_text(app_complete.clean_ocr_text(line))
+    assert result['total_eligible_points'] == 650
+
+
+def test_misread_invoice_matches_clean_invoice():
+    text = app_complete.generate_realistic_simulated_text()
+    clean = app_complete.process_invoice_text(text)
+    misread = app_complete.process_invoice_text(app_complete.clean_ocr_text(text.replace('0', 'O')))
+
+    assert [p['points'] for p in misread['eligible_products']] == [p['points'] for p in clean['eligible_products']]
+    assert misread['order_info']['data_emissao'] == '2025-06-30'
+    assert misread['order_info']['valor_total_nota'] == clean['order_info']['valor_total_nota']
@@ -0,0 +1,93 @@
+# Limite de requisições (token bucket): reposição no tempo, rajada esgotada
+# com 429 + Retry-After e balde compartilhado entre workers via SQLite.
+#
+# Uso: python -m pytest -q test_rate_limiter.py
+
+import pytest
+from flask import Flask
+
+import app_complete
+from rate_limiter import BACKEND_MEMORY, BACKEND_SQLITE, MemoryBackend, SQLiteBackend, TokenBucket, create_limiter
+
+
+@pytest.fixture(params=[BACKEND_MEMORY, BACKEND_SQLITE])
+def backend(request, tmp_path):
+    # 2 requisições de rajada, reposição de uma ficha a cada 5 s
+    bucket = TokenBucket(2, 10)
+    if request.param == BACKEND_SQLITE:
+        return SQLiteBackend(bucket, str(tmp_path / 'rate.sqlite3'))
+    return MemoryBackend(bucket)
+
+
+def test_bucket_refills_over_time(backend):
+    assert backend.hit('cliente', now=100.0)[0] is True
+    assert backend.hit('cliente', now=100.0)[0] is True
+    allowed, tokens = backend.hit('cliente', now=100.0)
+    assert allowed is False
+    assert backend.bucket.retry_after(tokens) == pytest.approx(5.0)
+
+    # Meia ficha ainda não basta; 5 s repõem uma
+    assert backend.hit('cliente', now=102.5)[0] is False
+    assert backend.hit('cliente', now=105.0)[0] is True
+    assert backend.hit('cliente', now=105.0)[0] is False
+
+    # Ocioso por muito tempo: volta só até a capacidade
+    assert backend.hit('cliente', now=1000.0) == (True, pytest.approx(1.0))
+    assert backend.hit('cliente', now=1000.0)[0] is True
+    assert backend.hit('cliente', now=1000.0)[0] is False
+
+
+def test_clients_have_separate_buckets(backend):
+    for _ in range(2):
+        backend.hit('a', now=0.0)
+    assert backend.hit('a', now=0.0)[0] is False
+    assert backend.hit('b', now=0.0)[0] is True
+
+
+@pytest.fixture
+def limited_client(tmp_path, monkeypatch):
+    """App mínima com o decorator do processador: 3 requisições por minuto"""
+    monkeypatch.setenv('RATE_LIMIT_BACKEND', BACKEND_SQLITE)
+    monkeypatch.setenv('RATE_LIMIT_DB', str(tmp_path / 'rate.sqlite3'))
+    monkeypatch.setattr(app_complete, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setattr(app_complete, '_rate_limiters', {})
+
+    app = Flask(__name__)
+
+    @app.route('/ping')
+    @app_complete.rate_limit(max_requests=3, window_seconds=60)
+    def ping():
+        return {'ok': True}
+
+    return app.test_client()
+
+
+def test_burst_exhaustion_returns_429_with_retry_after(limited_client):
+    statuses = [limited_client.get('/ping').status_code for _ in range(3)]
+    assert statuses == [200, 200, 200]
+
+    response = limited_client.get('/ping')
+    assert response.status_code == 429
+    assert response.json == {'error': 'Taxa de requisições excedida'}
+    # Uma ficha a cada 20 s, arredondado para cima em segundos inteiros
+    assert 1 <= int(response.headers['Retry-After']) <= 20
+
+    other = limited_client.get('/ping', environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert other.status_code == 200
+
+
+def test_two_limiters_share_one_sqlite_file(tmp_path):
+    db_path = str(tmp_path / 'rate.sqlite3')
+    first = create_limiter(3, 60, backend=BACKEND_SQLITE, db_path=db_path)
+    second = create_limiter(3, 60, backend=BACKEND_SQLITE, db_path=db_path)
+
+    assert first.check('10.0.0.1')[0] is True
+    assert second.check('10.0.0.1')[0] is True
+    assert first.check('10.0.0.1')[0] is True
+
+    # O limite vale para o serviço inteiro, não para cada worker
+    allowed, retry_after = second.check('10.0.0.1')
+    assert allowed is False
+    assert 0 < retry_after <= 20
+    assert first.check('10.0.0.1')[0] is False
+    assert len(first.backend) == len(second.backend) == 1
@@ -0,0 +1,73 @@
+# Índice de trigramas de caracteres para similaridade de nomes de produtos
+# Cada nome/alias do catálogo vira uma linha de uma matriz binária (NumPy) de
+# trigramas; uma linha de OCR é comparada com todos os nomes numa única
+# operação vetorizada usando o coeficiente de Dice (2·|A∩B| / (|A|+|B|)).
+# A forma lembra a razão do SequenceMatcher, mas os valores não são iguais: o
+# limiar foi recalibrado contra o corte antigo (0.6 no SequenceMatcher) com
+# benchmarks/bench_similarity.py --calibrate.
+
+import re
+
+# NumPy no topo: o índice é montado ao compilar o catálogo, já na subida do processo web
+import numpy as np
+
+# Calibrado no corpus do bench_similarity (2000 linhas): 90,8% das linhas com a
+# mesma decisão de corte do SequenceMatcher a 0.6 (0.6 aqui dava 89,5%) e 454
+# linhas acima do limiar contra 448 (eram 505). O melhor nome coincide em 68%.
+DEFAULT_SIMILARITY_THRESHOLD = 0.62
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def trigrams(text):
+    """Conjunto de trigramas de caracteres do texto normalizado"""
+    normalized = f" {_WHITESPACE_RE.sub(' ', text.lower()).strip()} "
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+
+def trigram_similarity(a, b):
+    """Similaridade de Dice entre os trigramas de duas strings"""
+    grams_a = trigrams(a)
+    grams_b = trigrams(b)
+    total = len(grams_a) + len(grams_b)
+    if total == 0:
+        return 1.0
+    return 2 * len(grams_a & grams_b) / total
+
+
+class TrigramIndex:
+    """Matriz binária (nomes × trigramas) agrupada por produto"""
+
+    def __init__(self, names_by_group):
+        self.group_count = len(names_by_group)
+        self._vocabulary = {}
+
+        rows = []
+        owners = []
+        for group, names in enumerate(names_by_group):
+            for name in names:
+                rows.append([self._vocabulary.setdefault(gram, len(self._vocabulary))
+                             for gram in trigrams(name)])
+                owners.append(group)
+
+        self._matrix = np.zeros((len(rows), max(len(self._vocabulary), 1)), dtype=np.uint8)
+        for row, gram_ids in enumerate(rows):
+            self._matrix[row, gram_ids] = 1
+        self._sizes = self._matrix.sum(axis=1, dtype=np.int64)
+        self._owners = np.array(owners, dtype=np.int64)
+
+    def similarities(self, text):
+        """Similaridade do texto com cada grupo (melhor nome/alias do grupo)"""
+        grams = trigrams(text)
+        gram_ids = [self._vocabulary[gram] for gram in grams if gram in self._vocabulary]
+        if gram_ids:
+            shared = self._matrix[:, gram_ids].sum(axis=1, dtype=np.int64)
+        else:
+            shared = np.zeros(len(self._sizes), dtype=np.int64)
+
+        totals = len(grams) + self._sizes
+        name_scores = np.where(totals > 0, 2 * shared / np.maximum(totals, 1), 1.0)
+
+        scores = np.zeros(self.group_count)
+        np.maximum.at(scores, self._owners, name_scores)
+        return scores